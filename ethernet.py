@@ -2,16 +2,30 @@
 # -*- coding: UTF-8 -*-
 
 import os
-import copy
+import time
+import zlib
 import logging
 from sanji.core import Sanji
 from sanji.core import Route
-from sanji.connection.mqtt import Mqtt
 from sanji.model_initiator import ModelInitiator
 from voluptuous import Schema
 from voluptuous import Required, Optional, Extra, Range, Any, REMOVE_EXTRA
-import ipcalc
+from voluptuous import All, Invalid
 import ip.addr as ip
+from ip import ipv4
+from ip import route
+from ip.cache import IfaddrCache
+from lib.store import IndexedStore
+from lib.executor import KeyedExecutor
+from lib import channel
+from lib import provision
+from lib import metrics
+from lib import profiler
+from lib import lease
+from lib.stats import StatsSampler
+from lib.coalesce import Coalescer
+from lib.journal import Journal
+from lib.delta import DeltaPublisher
 
 
 logging.basicConfig(level=logging.INFO)
@@ -36,13 +50,92 @@ def merge(dest, src, path=None):
     return dest
 
 
+def merged(dest, src):
+    """
+    Returns a copy of dest merged with src, dest is not modified.
+
+    Only the dicts along the merged paths are copied, the other values are
+    shared with dest (copy-on-write) and must not be modified in place.
+    """
+    result = dict(dest)
+    for key in src:
+        if key in result and isinstance(result[key], dict) and \
+           isinstance(src[key], dict):
+            result[key] = merged(result[key], src[key])
+        else:
+            result[key] = src[key]
+    return result
+
+
+def IPv4Address(value):
+    """Validates a dotted-quad IPv4 address, empty for not set."""
+    if value:
+        try:
+            ipv4.aton(value)
+        except ValueError:
+            raise Invalid("invalid IP address \"%s\"" % value)
+    return value
+
+
+def IPv4Netmask(value):
+    """Validates a dotted-quad IPv4 netmask, empty for not set."""
+    if value:
+        try:
+            if not ipv4.is_netmask(ipv4.aton(value)):
+                raise ValueError
+        except ValueError:
+            raise Invalid("invalid netmask \"%s\"" % value)
+    return value
+
+
+def diff(dest, src, path=None):
+    """Lists the fields of src which would change dest by merge()."""
+    if path is None:
+        path = []
+    changes = []
+    for key in src:
+        if key in dest and isinstance(dest[key], dict) and \
+           isinstance(src[key], dict):
+            changes += diff(dest[key], src[key], path + [str(key)])
+        elif key not in dest or dest[key] != src[key]:
+            changes.append(".".join(path + [str(key)]))
+    return changes
+
+
 class Ethernet(Sanji):
     """
     A model to handle Ethernet interfaces' configuration.
 
     Attributes:
         model: Ethernet interfaces' database with json format.
+        store: Index of the interfaces in model.db by id and name.
+        journal: Changed records since the last snapshot of model.db, None
+            if the journal is disabled.
+        ifcache: Cache of the interfaces' live status.
+        executor: Applies the settings to the kernel off the message
+            handling threads, one task at a time per interface.
+        events: Publishes the interfaces' events, as the changed fields
+            only in the delta mode.
+        metrics: Latency histograms of the routes and primitives, None if
+            disabled.
+        profiler: The running or last profiler, None if never profiled.
+        lease_watcher: Takes the leases from dhclient's lease files, None
+            if the leases are sent by the dhclient-script.
+        stats: Samples the interfaces' traffic counters, None if disabled.
     """
+
+    # Fields to be applied to the kernel, the others are stored only.
+    KERNEL_FIELDS = ("enable", "enableDhcp", "ip", "netmask")
+
+    # Served by their own routes instead of "/network/ethernets/:id", by
+    # the methods they have handlers for
+    SUB_RESOURCES = {
+        "metrics": ("get",),
+        "profile": ("get", "put"),
+        "dhclients": ("get",),
+        "resync": ("post",)
+    }
+
     def init(self, *args, **kwargs):
         try:  # pragma: no cover
             bundle_env = kwargs["bundle_env"]
@@ -53,9 +146,44 @@ class Ethernet(Sanji):
         if bundle_env == "debug":  # pragma: no cover
             self.path_root = "%s/tests" % self.path_root
 
+        # Live interface status, expired by TTL or link/address changes
+        if getattr(self, "ifcache", None) is None:
+            self.ifcache = IfaddrCache(
+                ttl=float(os.getenv("IFCACHE_TTL", 5)))
+
+        # Kernel changes don't hold the message handling threads
+        if getattr(self, "executor", None) is None:
+            self.executor = KeyedExecutor(
+                workers=int(os.getenv("APPLY_WORKERS", 4)), name="apply")
+
+        # Only the changed fields are published in the delta mode
+        if getattr(self, "events", None) is None:
+            self.events = DeltaPublisher(
+                lambda resource, data: self.publish.event.put(
+                    resource, data=data),
+                mode=os.getenv("ETHERNET_EVENT_MODE", "full"))
+
+        # A flapping link is published once settled
+        if getattr(self, "link_coalescer", None) is None:
+            self.link_coalescer = Coalescer(
+                float(os.getenv("LINK_DEBOUNCE", 1)), self.publish_link,
+                name="link-coalescer")
+
+        # Nothing is timed unless enabled
+        self.metrics = None
+        if os.getenv("ETHERNET_METRICS") == "1":
+            self.instrument(metrics.REGISTRY)
+
+        self.profiler = None
+        self._profile_hooks = None
+        if os.getenv("ETHERNET_PROFILE"):
+            self.start_profiling(
+                os.getenv("ETHERNET_PROFILE"),
+                float(os.getenv("ETHERNET_PROFILE_DURATION", 60)))
+
         # Find all ethernet interfaces and load the configuration
         ifaces = ip.interfaces()
-        ifaces = [x for x in ifaces if x.startswith("eth")]
+        ifaces = [x for x in ifaces if provision.is_ethernet(x)]
         if 0 == len(ifaces):
             _logger.info("No interfaces to be configured.")
             self.stop()
@@ -67,17 +195,213 @@ class Ethernet(Sanji):
             self.stop()
             raise IOError("Cannot load any configuration.")
 
-        # Apply the configuration
-        for iface in self.model.db:
-            self.apply(iface)
+        # Take the leases from the lease files written by dhclient, instead
+        # of the round trip through the dhclient-script
+        if getattr(self, "lease_watcher", None) is None:
+            self.lease_watcher = None
+            path = os.getenv("ETHERNET_LEASE_DIR", lease.DEFAULT_PATH)
+            if bundle_env == "debug":  # pragma: no cover
+                path = "%s/data" % self.path_root
+            if os.getenv("ETHERNET_LEASE_WATCH", "1") != "1":
+                pass
+            elif os.path.isdir(path):
+                self.lease_watcher = lease.LeaseWatcher(path, self.on_lease)
+                self.lease_watcher.start()
+            else:
+                _logger.info("Cannot watch the leases in %s." % path)
+
+        # Apply the configuration, in fast-start mode the requests are
+        # answered by the loaded configuration in the meantime
+        workers = int(os.getenv("BRINGUP_WORKERS", 4))
+        if os.getenv("ETHERNET_FAST_START") == "1":
+            self.bring_up(workers, background=True)
+        else:
+            self.bring_up(workers)
+
+        self.ifcache.watch()
+
+        # The requests of the statistics are served by the samples, the
+        # counters' files are kept open so it is not sampled unless enabled
+        if getattr(self, "stats", None) is None:
+            self.stats = None
+            interval = float(os.getenv("ETHERNET_STATS_INTERVAL", 0))
+            if interval > 0:
+                counters = os.getenv("ETHERNET_STATS_COUNTERS")
+                self.stats = StatsSampler(
+                    [self.ifname(x) for x in self.model.db], interval,
+                    int(os.getenv("ETHERNET_STATS_SAMPLES", 60)),
+                    counters=counters.split(",") if counters else None)
+                self.stats.start()
+
+        # Receive the hooks' events without going through the broker
+        self.channel = None
+        path = os.getenv("ETHERNET_EVENT_SOCKET", channel.DEFAULT_PATH)
+        if bundle_env == "debug":  # pragma: no cover
+            path = "%s/data/ethernet.sock" % self.path_root
+        try:
+            self.channel = channel.EventChannel(path, self.on_channel_event)
+            self.channel.start()
+        except Exception as e:
+            _logger.info("Cannot listen to the hooks' events: %s" % e)
+
+    def instrument(self, registry):
+        """
+        Record the latency of the routes, the applies and the ip.addr and
+        ip.route primitives into the registry.
+        """
+        self.metrics = registry
+        metrics.instrument(
+            ip, [x for x in metrics.functions(ip)
+                 if not x.endswith("_backend")], "ip.addr", registry)
+        metrics.instrument(route, metrics.functions(route), "ip.route",
+                           registry)
+        metrics.instrument(route.RouteTable, ("load", "add", "delete"),
+                           "ip.route.RouteTable", registry)
+        metrics.instrument_routes(self.router, registry)
+        self.apply = metrics.timed(self.apply, metrics.PRIMITIVE,
+                                   ("ethernet.apply",), registry)
+
+    def start_profiling(self, mode, duration=60):
+        """
+        Profile the routes and the applies, or sample all threads, for a
+        while. The results are written into the "data" directory.
+
+        Args:
+            mode: "cprofile" or "sample".
+            duration: Seconds to profile, at most profiler.MAX_DURATION.
+
+        Raises:
+            ValueError: Unknown mode, invalid duration, or profiling is in
+                progress.
+        """
+        if self.profiler and self.profiler.running:
+            raise ValueError("Profiling is in progress.")
+        self.profiler = profiler.Profiler(
+            os.path.join(self.path_root, "data"), mode, duration,
+            on_stop=self._unhook_profiler)
+
+        if mode == profiler.MODE_CPROFILE:
+            handlers = []
+            for item in self.router.routes.values():
+                for handler in item.handlers:
+                    handlers.append((handler, handler["callback"]))
+                    handler["callback"] = \
+                        self.profiler.wrap(handler["callback"])
+            self._profile_hooks = (handlers, self.__dict__.get("apply"))
+            self.apply = self.profiler.wrap(self.apply)
+        self.profiler.start()
+
+    def _unhook_profiler(self):
+        if self._profile_hooks is None:
+            return
+        handlers, apply = self._profile_hooks
+        self._profile_hooks = None
+        for handler, callback in handlers:
+            handler["callback"] = callback
+        if apply is None:
+            del self.apply
+        else:
+            self.apply = apply
+
+    def stop_profiling(self):
+        """
+        Stop profiling and write the results.
+
+        Returns:
+            A list of the written files.
+        """
+        if self.profiler is None:
+            return []
+        return self.profiler.stop()
+
+    def bring_up(self, workers=4, background=False):
+        """
+        Apply the configuration of all interfaces, at most "workers"
+        interfaces are brought up concurrently.
+
+        Args:
+            workers: Number of interfaces brought up concurrently.
+            background: Bring up the interfaces by the executor without
+                waiting, ahead of the settings put afterwards.
+
+        Returns:
+            The bring-up timings in seconds, for example:
+
+            {"total": 0.52, "interfaces": {"eth0": 0.31, "eth1": 0.5}}
+
+            Or a Task with the timings as its result in background.
+
+        Raises:
+            The first error raised while applying.
+        """
+        start = time.time()
+        if background:
+            executor = self.executor
+        else:
+            executor = KeyedExecutor(workers=min(workers, len(self.store)),
+                                     name="bring-up")
+        tasks = [executor.submit(self.ifname(iface), self.apply, iface)
+                 for iface in self.store]
+
+        def finish():
+            error = None
+            timings = {"interfaces": {}}
+            for task in tasks:
+                timings["interfaces"][task.key] = task.elapsed
+                if task.error is not None:
+                    _logger.info("%s: bring-up failed: %s" %
+                                 (task.key, task.error))
+                    error = error or task.error
+                else:
+                    _logger.info("%s: brought up in %.3fs" %
+                                 (task.key, task.elapsed))
+            timings["total"] = time.time() - start
+            _logger.info("%d interface(s) brought up in %.3fs" %
+                         (len(tasks), timings["total"]))
+
+            self.bringup_timings = timings
+            if error is not None:
+                raise error
+            return timings
+
+        if background:
+            return executor.after(tasks, finish)
+        for task in tasks:
+            task.wait()
+        executor.shutdown()
+        return finish()
+
+    def before_stop(self):
+        self.ifcache.unwatch()
+        if getattr(self, "executor", None):
+            self.executor.shutdown()
+            self.executor = None
+        if getattr(self, "link_coalescer", None):
+            self.link_coalescer.stop()
+            self.link_coalescer = None
+        if getattr(self, "journal", None):
+            self.compact()
+            self.journal.close()
+            self.journal = None
+        if getattr(self, "channel", None):
+            self.channel.stop()
+        if getattr(self, "profiler", None):
+            self.stop_profiling()
+        if getattr(self, "lease_watcher", None):
+            self.lease_watcher.stop()
+            self.lease_watcher = None
+        if getattr(self, "stats", None):
+            self.stats.stop()
+            self.stats = None
 
     def run(self):
-        for iface in self.model.db:
-            iface["type"] = "eth"
-            iface["mode"] = "dhcp" if iface["enableDhcp"] else "static"
+        for record in list(self.model.db):
+            iface = merged(self.merge_info({
+                "id": record["id"], "type": "eth",
+                "mode": "dhcp" if record["enableDhcp"] else "static"}), {})
             if iface["enableDhcp"] is not True:
-                self.publish.event.put(
-                    "/network/interfaces/{}".format(iface["name"]), data=iface)
+                self.events.put(
+                    "/network/interfaces/{}".format(iface["name"]), iface)
 
     def load(self, path, ifaces):
         """
@@ -89,59 +413,157 @@ class Ethernet(Sanji):
                 under "data" directory.
             ifaces: A list of interfaces name.
         """
+        if getattr(self, "journal", None):
+            self.journal.close()
+        self.journal = None
         self.model = ModelInitiator("ethernet", path, backup_interval=-1)
         if not self.model.db:
             raise IOError("Cannot load any configuration.")
+        self.store = IndexedStore(self.model)
+        # the versions of the previous stores are not to be matched
+        self.epoch = "%x" % int(time.time() * 1000)
 
         # Initialise the interfaces
         # TODO: 2nd iface's type is "LAN"; another is "WAN"
         if 1 == len(self.model.db) and "id" not in self.model.db[0]:
             _logger.debug("factory install")
             default_db = self.model.db.pop()
-            ip_3_def = int(default_db["ip"].split(".")[2]) - 1
+            pool = provision.AddressPool.from_template(
+                default_db, os.getenv("ETHERNET_ADDRESS_POOL"))
+
+            # retrieve all interfaces with one dump instead of one by one
+            try:
+                links = ip.links()
+            except Exception as e:
+                _logger.info("Cannot dump the interfaces: %s" % e)
+                links = {}
             for iface in ifaces:
-                ifaddr = ip.ifaddresses(iface)
-                db = copy.deepcopy(default_db)
-                db["name"] = iface
-                db["id"] = int(iface.replace("eth", "")) + 1
-
-                ip_3 = ip_3_def + db["id"]
-                db["ip"] = "192.168.%d.127" % ip_3
-                db["subnet"] = "192.168.%d.0" % ip_3
-                db["gateway"] = "192.168.%d.254" % ip_3
-
-                db["status"] = True if ifaddr["link"] == 1 else False
-                db["mac"] = ifaddr["mac"]
-                self.model.db.append(db)
+                if iface not in links:
+                    links[iface] = ip.ifaddresses(iface)
+
+            for db in provision.provision(default_db, ifaces, links, pool):
+                self.store.append(db)
             self.save()
 
-    def save(self):
+        # Replay the changes made after the last snapshot
+        if os.getenv("ETHERNET_JOURNAL") == "1":
+            self.journal = Journal(
+                "%s.journal" % self.model.json_db_path,
+                max_bytes=int(os.getenv("ETHERNET_JOURNAL_MAX_BYTES", 65536)),
+                max_age=float(os.getenv("ETHERNET_JOURNAL_MAX_AGE", 3600)))
+            records = self.journal.replay()
+            for record in records:
+                self.store.replace(record)
+            if self.journal.size:
+                _logger.info("%d record(s) replayed from the journal." %
+                             len(records))
+                self.compact()
+
+    def save(self, backup=True):
+        """
+        Save and backup the configuration. If the journal is enabled, only
+        the changed records are appended to the journal, and the snapshot
+        is written once the journal is due for compaction.
+        """
+        # not to dump the records while they are changed by other threads
+        with self.store.lock:
+            changed = self.store.changed()
+            if self.journal is None:
+                self.model.save_db()
+                if backup:
+                    self.model.backup_db()
+                return
+
+            records = [self.store.by_id(x) for x in sorted(changed)]
+            self.journal.append([x for x in records if x is not None])
+            if self.journal.due():
+                self.compact()
+
+    def compact(self):
+        """
+        Write the snapshot with its backup, then drop the journal.
+        """
+        with self.store.lock:
+            self.store.changed()
+            self.model.save_db()
+            self.model.backup_db()
+            if self.journal:
+                self.journal.truncate()
+
+    def changes(self, applied, data):
+        """
+        List the changed fields which need to be applied to the kernel.
+
+        Args:
+            applied: Settings applied to the interface previously.
+            data: New settings for the interface.
+        """
+        changes = [x for x in diff(applied, data) if x in self.KERNEL_FIELDS]
+        if "enable" in changes:
+            return changes
+        # the interface stays down
+        if not data["enable"]:
+            return []
+        # the address is maintained by dhclient
+        if data["enableDhcp"] and "enableDhcp" not in changes:
+            return []
+        return changes
+
+    def applied_settings(self, id):
+        """
+        Snapshot the kernel fields of an interface's stored settings, which
+        are the settings applied to the kernel.
+        """
+        record = self.store.by_id(id)
+        if record is None:
+            return None
+        return dict((k, record[k]) for k in self.KERNEL_FIELDS if k in record)
+
+    def ifname(self, data):
         """
-        Save and backup the configuration.
+        Interface name of the settings, "eth(id-1)" if not named.
         """
-        self.model.save_db()
-        self.model.backup_db()
+        return data.get("name") or "eth%d" % (data["id"]-1)
 
-    def apply(self, data):
+    def apply(self, data, applied=None):
         """
         Apply the configuration to an interface.
 
         Args:
             data: Information for the interface to be applied (with dictionary
                 format)
+            applied: Settings applied to the interface previously; if given,
+                only the operations required by the changed fields are
+                performed.
         """
-        iface = "eth%d" % (data["id"]-1)
-
-        ip.ifupdown(iface, True if data["enable"] else False)
+        iface = self.ifname(data)
+
+        if applied is not None:
+            changes = self.changes(applied, data)
+            if not changes:
+                _logger.debug("%s: nothing to be applied." % iface)
+                return
+            _logger.debug("%s: apply %s." % (iface, ", ".join(changes)))
+
+        # the link is already up if only the address is changed
+        if applied is None or "enable" in changes:
+            ip.ifupdown(iface, True if data["enable"] else False)
         if not data["enable"]:
+            self.ifcache.invalidate(iface)
             return
 
         if data["enableDhcp"]:
+            kwargs = {}
+            if getattr(self, "lease_watcher", None):
+                # the script leaves the lease to the watcher
+                kwargs = {"lease_file": self.lease_watcher.lease_file(iface),
+                          "env": {"ETHERNET_LEASE_WATCH": "1"}}
             ip.ifconfig(iface, True, script="%s/hooks/dhclient-script" %
-                        self.path_root)
+                        self.path_root, **kwargs)
         else:
             ip.ifconfig(iface, False, data["ip"], data["netmask"],
                         data["gateway"])
+        self.ifcache.invalidate(iface)
 
     def read(self, id, restart=False, config=True):
         """
@@ -150,20 +572,19 @@ class Ethernet(Sanji):
         Args:
             id: Interface id, interface name will be eth(id+1).
         """
-        for data in self.model.db:
-            if data["id"] == id:
-                break
-        else:
+        data = self.store.by_id(id)
+        if data is None:
             return None
 
-        # deepcopy to prevent settings be modified
-        data = copy.deepcopy(data)
+        # copy-on-write view: the overlays below don't touch the settings,
+        # the nested values are shared and must not be modified
+        data = merged(data, {})
 
         if not restart and "restart" in data:
             data.pop("restart")
 
-        iface = "eth%d" % (data["id"]-1)
-        ifaddr = ip.ifaddresses(iface)
+        iface = self.ifname(data)
+        ifaddr = self.ifcache.get(iface)
         data["status"] = True if ifaddr["link"] == 1 else False
         data["mac"] = ifaddr["mac"]
 
@@ -190,41 +611,52 @@ class Ethernet(Sanji):
         # """
         return data
 
-    @staticmethod
-    def schema_validate(message):
+    put_schema = Schema({
+        Required("id"): Range(min=1),
+        Required("enable"): bool,
+        Required("enableDhcp"): bool,
+        Optional("wan"): bool,
+        Optional("ip"): All(Any(str, unicode), IPv4Address),
+        Optional("netmask"): All(Any(str, unicode), IPv4Netmask),
+        Optional("gateway"): All(Any(str, unicode), IPv4Address),
+        Optional("dns"): [All(Any(str, unicode), IPv4Address)],
+        Extra: object
+    }, extra=REMOVE_EXTRA)
+
+    # Validation timings in seconds
+    validate_stats = {"count": 0, "total": 0.0, "max": 0.0}
+
+    @classmethod
+    def schema_validate(cls, message):
         """
         Validate the received data, ensure the schema is correct.
         """
-        # TODO: ip validation
-        schema = Schema({
-            Required("id"): Range(min=1),
-            Required("enable"): bool,
-            Required("enableDhcp"): bool,
-            Optional("wan"): bool,
-            Optional("ip"): Any(str, unicode),
-            Optional("netmask"): Any(str, unicode),
-            Optional("gateway"): Any(str, unicode),
-            Optional("dns"): [Any(str, unicode)],
-            Extra: object
-        }, extra=REMOVE_EXTRA)
-
+        start = time.time()
         if not hasattr(message, "data"):
             raise KeyError("Invalid input: \"data\" attribute is required.")
 
-        if type(message.data) is list:
-            if 0 == len(message.data):
-                raise KeyError("Invalid input: empty \"data\".")
-            for item in message.data:
-                try:
-                    schema(item)
-                except Exception, e:
-                    raise KeyError("Invalid input: %s." % e)
-
-        if type(message.data) is dict:
-            try:
-                schema(message.data)
-            except Exception, e:
-                raise KeyError("Invalid input: %s." % e)
+        # the interface is chosen by "id", and cannot be renamed
+        try:
+            if type(message.data) is dict:
+                message.data = cls.put_schema(message.data)
+                message.data.pop("name", None)
+            elif type(message.data) is list:
+                if 0 == len(message.data):
+                    raise KeyError("Invalid input: empty \"data\".")
+                message.data = [cls.put_schema(x) for x in message.data]
+                for item in message.data:
+                    item.pop("name", None)
+        except KeyError:
+            raise
+        except Exception, e:
+            raise KeyError("Invalid input: %s." % e)
+        finally:
+            elapsed = time.time() - start
+            stats = cls.validate_stats
+            stats["count"] += 1
+            stats["total"] += elapsed
+            stats["max"] = max(stats["max"], elapsed)
+            _logger.debug("Validated in %dus." % (elapsed * 1000000))
 
     def _get_by_id(self, message, response):
         """
@@ -236,27 +668,51 @@ class Ethernet(Sanji):
             return response(data=ifinfo)
         return response(code=404, data={"message": "No such device."})
 
+    def etag(self):
+        """
+        Version of the interfaces' settings and the live status read with
+        them, changed by any change of them.
+        """
+        live = []
+        for iface in self.model.db:
+            ifaddr = self.ifcache.get(self.ifname(iface))
+            live.append((ifaddr["link"] == 1, ifaddr["mac"]))
+        return "%s-%d-%08x" % (self.epoch, self.store.version,
+                               zlib.crc32(repr(live)) & 0xffffffff)
+
     @Route(methods="get", resource="/network/ethernets")
     def get(self, message, response):
         """
         collection: /network/ethernets
         id: /network/ethernets?id=#
+        conditional: /network/ethernets?etag=<etag>
+            304 with {"etag": "<etag>"} if nothing is changed, otherwise
+            {"etag": "<new etag>", "collection": [...]}
         """
-        collection = []
+        # the tag is taken by the query, or the "If-None-Match" header
+        headers = getattr(message, "headers", None) or {}
+        tag = message.query.get("etag", headers.get("If-None-Match"))
+        etag = None
+        if tag is not None:
+            etag = self.etag()
+            if tag == etag:
+                return response(code=304, data={"etag": etag})
 
+        collection = []
         if "id" in message.query:
             for id in message.query["id"].split(","):
                 data = self.read(int(id))
                 if data:
                     collection.append(data)
-            collection = sorted(collection, key=lambda k: k["id"])
-            return response(data=collection)
-
-        for iface in self.model.db:
-            data = self.read(iface["id"])
-            if data:
-                collection.append(data)
+        else:
+            for iface in self.model.db:
+                data = self.read(iface["id"])
+                if data:
+                    collection.append(data)
         collection = sorted(collection, key=lambda k: k["id"])
+
+        if etag is not None:
+            return response(data={"etag": etag, "collection": collection})
         return response(data=collection)
 
     @Route(methods="get", resource="/network/ethernets/:id")
@@ -264,18 +720,228 @@ class Ethernet(Sanji):
         """
         /network/ethernets/1
         """
+        if self._sub_resource(message, response, "get"):
+            return
         return self._get_by_id(message=message, response=response)
 
+    def _sub_resource(self, message, response, method):
+        """
+        Tell if the ":id" of a request is a sub-resource; if it has no
+        handler of the method, the request is answered by 405.
+        """
+        methods = self.SUB_RESOURCES.get(message.param["id"])
+        if methods is None:
+            return False
+        if method not in methods:
+            response(code=405, data={"message": "Method not allowed."})
+        return True
+
+    @Route(methods="get", resource="/network/ethernets/:id/stats")
+    def get_stats(self, message, response):
+        """
+        /network/ethernets/1/stats
+        "data": {
+            "id": 1,
+            "name": "eth0",
+            "timestamp": 1760000000.0,
+            "interval": 1.0,
+            "counters": {
+                "rx_bytes": 1024,
+                ...
+            },
+            "rates": {
+                "rxBps": 8192.0,
+                "txBps": 0.0,
+                "rxPps": 1.0,
+                "txPps": 0.0
+            }
+        }
+        """
+        if self.stats is None:
+            return response(code=404,
+                            data={"message": "Statistics are disabled."})
+        try:
+            data = self.store.by_id(int(message.param["id"]))
+        except ValueError:
+            data = None
+        if data is None:
+            return response(code=404, data={"message": "No such device."})
+
+        stats = self.stats.stats(self.ifname(data))
+        if stats is None:
+            return response(code=404,
+                            data={"message": "No statistics yet."})
+        stats["id"] = data["id"]
+        stats["name"] = self.ifname(data)
+        return response(data=stats)
+
+    @Route(methods="get", resource="/network/ethernets/metrics")
+    def get_metrics(self, message, response):
+        """
+        /network/ethernets/metrics
+        "data": "# HELP ethernet_route_duration_seconds ..."
+        """
+        if self.metrics is None:
+            return response(code=404,
+                            data={"message": "Metrics are disabled."})
+        return response(data=self.metrics.render())
+
+    @Route(methods="get", resource="/network/ethernets/dhclients")
+    def get_dhclients(self, message, response):
+        """
+        /network/ethernets/dhclients
+        "data": [
+            {
+                "name": "eth0",
+                "state": "running",
+                "pid": 1234,
+                "started": 1760000000,
+                "restarts": 0,
+                "returncode": null
+            }
+        ]
+        """
+        return response(data=ip.get_supervisor().state())
+
+    profile_schema = Schema({
+        Required("enable"): bool,
+        Optional("mode"): Any(*profiler.MODES),
+        Optional("duration"): All(Any(int, float),
+                                  Range(min=1, max=profiler.MAX_DURATION)),
+        Extra: object
+    }, extra=REMOVE_EXTRA)
+
+    def profile_status(self):
+        status = {"enable": False, "files": []}
+        if self.profiler:
+            status["enable"] = self.profiler.running
+            status["mode"] = self.profiler.mode
+            status["duration"] = self.profiler.duration
+            status["files"] = [os.path.basename(x)
+                               for x in self.profiler.files]
+        return status
+
+    @Route(methods="get", resource="/network/ethernets/profile")
+    def get_profile(self, message, response):
+        """
+        /network/ethernets/profile
+        """
+        return response(data=self.profile_status())
+
+    @Route(methods="put", resource="/network/ethernets/profile")
+    def put_profile(self, message, response):
+        """
+        /network/ethernets/profile
+        "data": {
+            "enable": true,
+            "mode": "cprofile",
+            "duration": 60
+        }
+        """
+        try:
+            data = self.profile_schema(getattr(message, "data", None))
+            if data["enable"]:
+                self.start_profiling(data.get("mode", profiler.MODE_CPROFILE),
+                                     data.get("duration", 60))
+            else:
+                self.stop_profiling()
+        except Exception as e:
+            _logger.debug(e, exc_info=True)
+            return response(code=400, data={"message": str(e)})
+        return response(data=self.profile_status())
+
+    def stage(self, record, data):
+        """
+        Stage the settings of an interface without storing them.
+
+        Args:
+            record: The stored record of the interface.
+            data: The validated settings.
+
+        Returns:
+            A tuple of the changes to be stored, including the derived
+            fields, and the record merged with them.
+        """
+        changes = dict(data, type="eth")
+        staged = merged(record, changes)
+        changes["mode"] = "dhcp" if staged["enableDhcp"] else "static"
+        if staged["enableDhcp"] is False and \
+                ("ip" in staged and "netmask" in staged):
+            changes["subnet"], changes["broadcast"], _ = \
+                ipv4.network(staged["ip"], staged["netmask"])
+        return changes, merged(record, changes)
+
     def merge_info(self, iface):
         """
         Merge the given interface information into database.
         """
-        for item in self.model.db:
-            if item["id"] == iface["id"]:
-                return merge(item, iface)
-        else:
+        try:
+            return self.store.update(iface["id"], merge, iface)
+        except KeyError:
             raise ValueError("No such device.")
 
+    def _apply_item(self, item):
+        record = self.store.by_id(item["id"])
+        changes, data = self.stage(record, item)
+        self.apply(data, record)
+        return merged(self.merge_info(changes), {})
+
+    def submit_bulk(self, items):
+        """
+        Schedule the settings of several interfaces as one transaction.
+
+        Each item is merged into a staged copy of its record and applied
+        by the executor, then the applied ones are committed into the
+        database with a single save and backup.
+
+        Args:
+            items: A list of validated interface settings.
+
+        Returns:
+            A Task, its result is a list of results in the order of items,
+            for example:
+
+            [{"id": 1, "code": 200},
+             {"id": 3, "code": 404, "message": "No such device."}]
+        """
+        results = [None] * len(items)
+        staged = []
+        for idx, item in enumerate(items):
+            record = self.store.by_id(item["id"])
+            if record is None:
+                results[idx] = {"id": item["id"], "code": 404,
+                                "message": "No such device."}
+                continue
+            staged.append((idx, item, self.executor.submit(
+                self.ifname(record), self._apply_item, item)))
+
+        def commit():
+            committed = []
+            for idx, item, task in staged:
+                if task.error is not None:
+                    results[idx] = {"id": item["id"], "code": 500,
+                                    "message": str(task.error)}
+                    continue
+                committed.append(task.result())
+                results[idx] = {"id": item["id"], "code": 200}
+
+            for result in results:
+                if result["code"] != 200:
+                    _logger.info("Cannot update interface %s: %s" %
+                                 (result["id"], result["message"]))
+            if not committed:
+                return results
+
+            self.save()
+            for info in committed:
+                if info["enableDhcp"] is not True:
+                    self.events.put(
+                        "/network/interfaces/{}".format(info["name"]),
+                        info)
+            return results
+
+        return self.executor.after([x[2] for x in staged], commit)
+
     def _put_by_id(self, message, response):
         """
         /network/ethernets/1
@@ -295,40 +961,54 @@ class Ethernet(Sanji):
                             data={"message": e.message})
 
         try:
-            info = self.merge_info(message.data)
-            if info["enableDhcp"] is False and \
-                    ("ip" in info and "netmask" in info):
-                net = ipcalc.Network("%s/%s" % (info["ip"], info["netmask"]))
-                info["subnet"] = str(net.network())
-                info["broadcast"] = str(net.broadcast())
-            resp = copy.deepcopy(info)
+            record = self.store.by_id(message.data["id"])
+            if record is None:
+                raise ValueError("No such device.")
+            _, staged = self.stage(record, message.data)
+            resp = merged(staged, {})
 
             restart = False
-            if "restart" in info:
-                restart = info["restart"]
+            if "restart" in staged:
+                restart = staged["restart"]
 
-            current = self.read(info["id"], config=False)
-            if restart is True and current["ip"] != info["ip"]:
+            current = self.read(staged["id"], config=False)
+            if restart is True and current["ip"] != staged["ip"]:
                 resp["restart"] = True
             else:
                 resp["restart"] = False
 
             if resp["restart"] is True:
                 response(data=resp)
+        except Exception, e:
+            return response(code=404, data={"message": e.message})
 
-            self.apply(info)
-            self.save()
-            info["type"] = "eth"
-            info["mode"] = "dhcp" if info["enableDhcp"] else "static"
-            if info["enableDhcp"] is not True:
-                self.publish.event.put(
-                    "/network/interfaces/{}".format(info["name"]), data=info)
+        # the settings are stored once applied, and the response is sent by
+        # the executor unless it is sent before restarting
+        def commit():
+            try:
+                # staged again, after the previous settings are applied
+                applied = self.applied_settings(staged["id"])
+                changes, data = self.stage(self.store.by_id(staged["id"]),
+                                           message.data)
+                self.apply(data, applied)
+                info = merged(self.merge_info(changes), {})
+                self.save()
+                if info["enableDhcp"] is not True:
+                    self.events.put(
+                        "/network/interfaces/{}".format(info["name"]),
+                        info)
+            except Exception, e:
+                _logger.info("Cannot update interface %s: %s" %
+                             (staged["id"], e))
+                if resp["restart"] is False:
+                    response(code=404, data={"message": e.message})
+                raise
 
             if resp["restart"] is False:
                 # time.sleep(2)
-                return response(data=resp)
-        except Exception, e:
-            return response(code=404, data={"message": e.message})
+                response(data=merged(data, {"restart": False}))
+
+        self.executor.submit(self.ifname(staged), commit)
 
     @Route(methods="put", resource="/network/ethernets")
     def put(self, message, response):
@@ -344,6 +1024,11 @@ class Ethernet(Sanji):
                 ...
             }
         ]
+        response, once applied (207 if any item failed):
+        [
+            {"id": 1, "code": 200},
+            {"id": 2, "code": 500, "message": "..."}
+        ]
         """
         # TODO: status code should be added into error message
         # 1. no "data"
@@ -359,24 +1044,19 @@ class Ethernet(Sanji):
         if "id" in message.param:
             return self._put_by_id(message=message, response=response)
 
-        response(data=message.data)
+        items = message.data
+        if type(items) is dict:
+            items = [items]
 
-        # error = None
-        for iface in message.data:
-            try:
-                info = self.merge_info(iface)
-                self.apply(info)
-                self.model.save_db()
-                info["type"] = "eth"
-                info["mode"] = "dhcp" if iface["enableDhcp"] else "static"
-                if iface["enableDhcp"] is not True:
-                    self.publish.event.put(
-                        "/network/interfaces/{}".format(info["name"]),
-                        data=info)
-            except Exception, e:
-                # error = e.message
-                pass
-        self.model.backup_db()
+        # the response is sent once applied, with the result of each item
+        def respond(task):
+            if task.error is not None:
+                return response(code=500, data={"message": str(task.error)})
+            results = task.result()
+            failed = [x for x in results if x["code"] != 200]
+            response(code=207 if failed else 200, data=results)
+
+        self.submit_bulk(items).add_done_callback(respond)
 
     @Route(methods="put", resource="/network/ethernets/:id")
     def put_by_id(self, message, response):
@@ -387,6 +1067,8 @@ class Ethernet(Sanji):
             ...
         }
         """
+        if self._sub_resource(message, response, "put"):
+            return
         if hasattr(message, "data"):
             message.data["id"] = int(message.param["id"])
         return self._put_by_id(message=message, response=response)
@@ -402,24 +1084,133 @@ class Ethernet(Sanji):
         Extra: object
     }, extra=REMOVE_EXTRA)
 
+    def link_changed(self, name):
+        """
+        Publish the status of an interface after its link is changed, the
+        changes within the debounce window are published once.
+
+        Args:
+            name: Interface name.
+        """
+        self.ifcache.invalidate(name)
+        if self.store.by_name(name) is None:
+            return
+        self.link_coalescer.trigger(name)
+
+    def publish_link(self, name, suppressed=0):
+        """
+        Publish the status of an interface.
+
+        Args:
+            name: Interface name.
+            suppressed: Number of link changes coalesced into this event.
+        """
+        self.ifcache.invalidate(name)
+        iface = self.store.by_name(name)
+        if iface is None:
+            return
+
+        data = self.read(iface["id"])
+        if data:
+            data["type"] = "eth"
+            data["suppressed"] = suppressed
+            if suppressed:
+                _logger.info("%s: %d link change(s) coalesced." %
+                             (name, suppressed))
+            self.events.put(
+                "/network/interfaces/{}".format(name), data)
+
+    def resync(self, name=None):
+        """
+        Publish the whole status of the interfaces, for the subscribers
+        missing any event in the delta mode.
+
+        Args:
+            name: Interface name, all interfaces by default.
+
+        Returns:
+            A list of the published interfaces' names.
+
+        Raises:
+            KeyError: No such interface.
+        """
+        if name is None:
+            ifaces = list(self.store)
+        else:
+            ifaces = [self.store.by_name(name)]
+            if ifaces[0] is None:
+                raise KeyError(name)
+
+        names = []
+        for iface in ifaces:
+            data = self.read(iface["id"])
+            data["type"] = "eth"
+            data["mode"] = "dhcp" if data["enableDhcp"] else "static"
+            self.events.resync(
+                "/network/interfaces/{}".format(iface["name"]), data)
+            names.append(iface["name"])
+        return names
+
+    @Route(methods="post", resource="/network/ethernets/resync")
+    def post_resync(self, message, response):
+        """
+        /network/ethernets/resync
+        "data": {
+            "name": "eth0"
+        }
+        """
+        name = None
+        if isinstance(getattr(message, "data", None), dict):
+            name = message.data.get("name")
+        try:
+            names = self.resync(name)
+        except KeyError:
+            return response(code=404, data={"message": "No such device."})
+        return response(data={"interfaces": names})
+
     @Route(methods="put", resource="/network/ethernets")
     def event_link_changed(self, message):
         if "name" not in message.query:
             return
+        self.link_changed(message.query["name"])
 
-        for iface in self.model.db:
-            if iface["name"] == message.query["name"]:
-                data = self.read(iface["id"])
-                if data:
-                    data["type"] = "eth"
-                    self.publish.event.put(
-                        "/network/interfaces/{}".format(
-                            message.query["name"]),
-                        data=data)
-                    return
-        else:
+    def dhcp_info(self, name, info):
+        """
+        Merge the lease information of an interface into database.
+
+        Args:
+            name: Interface name.
+            info: Lease information, see event_dhcp_info().
+
+        Raises:
+            ValueError
+        """
+        self.ifcache.invalidate(name)
+        iface = self.store.by_name(name)
+        if iface is None:
+            raise ValueError("Invalid input: No such device.")
+        info["id"] = iface["id"]
+        info["name"] = name
+
+        try:
+            subnet, info["broadcast"], _ = \
+                ipv4.network(info["ip"], info["netmask"])
+            if not info.get("subnet"):
+                info["subnet"] = subnet
+        except Exception as e:
+            raise ValueError("Cannot calculate broadcast: {}.".format(e))
+
+        # lease renewed without any change
+        if not diff(iface, info):
             return
 
+        try:
+            self.merge_info(info)
+            _logger.debug(self.model.db)
+            self.save(backup=False)
+        except Exception, e:
+            raise ValueError("Invalid input: %s.", str(e))
+
     @Route(methods="put", resource="/network/interfaces/:iface",
            schema=put_dhcp_schema)
     def event_dhcp_info(self, message):
@@ -440,27 +1231,77 @@ class Ethernet(Sanji):
         message.data["name"] = message.param["iface"]
         if message.data["type"] != "eth":
             return
-
-        message.data["id"] = int(message.data["name"].replace("eth", "")) + 1
         message.data.pop("type")
+        self.dhcp_info(message.data["name"], message.data)
 
-        try:
-            net = ipcalc.Network(
-                "%s/%s" % (message.data["ip"], message.data["netmask"]))
-            message.data["broadcast"] = str(net.broadcast())
-        except Exception as e:
-            raise ValueError("Cannot calculate broadcast: {}.".format(e))
+    def on_channel_event(self, event):
+        """
+        Handle the events sent by the hooks through the event channel.
 
-        try:
+        Args:
+            event: A dict parsed from the hook's message, for example:
 
-            self.merge_info(message.data)
-            _logger.debug(self.model.db)
-            self.model.save_db()
-        except Exception, e:
-            raise ValueError("Invalid input: %s.", str(e))
+            {"event": "link", "name": "eth0", "link": "1"}
+            {"event": "dhcp", "name": "eth0", "ip": "", "netmask": "",
+             "subnet": "", "gateway": "", "dns": "8.8.8.8 8.8.4.4"}
+        """
+        name = event.get("name")
+        if not name:
+            return
+
+        if "link" == event.get("event"):
+            self.link_changed(name)
+        elif "dhcp" == event.get("event"):
+            info = {
+                "ip": event.get("ip", ""),
+                "netmask": event.get("netmask", ""),
+                "gateway": event.get("gateway", ""),
+                "dns": event.get("dns", "").split()
+            }
+            if event.get("subnet"):
+                info["subnet"] = event["subnet"]
+            self.lease_changed(name, info)
+
+    def on_lease(self, name, lease):
+        """
+        Handle a lease written into the lease file by dhclient.
+
+        Args:
+            name: Interface name.
+            lease: A lease parsed from the lease file, see lib.lease.parse().
+        """
+        info = {
+            "ip": lease["ip"],
+            "netmask": lease["netmask"],
+            "gateway": lease["gateway"],
+            "dns": lease["dns"]
+        }
+        self.lease_changed(name, info)
+
+    def lease_changed(self, name, info):
+        """
+        Merge the lease information into database and publish it.
+
+        Args:
+            name: Interface name.
+            info: Lease information, see event_dhcp_info().
+
+        Raises:
+            ValueError
+        """
+        self.dhcp_info(name, info)
+
+        # other bundles still expect the lease information
+        data = {"type": "eth", "mode": "dhcp", "name": name}
+        for key in ("ip", "netmask", "subnet", "gateway", "dns"):
+            data[key] = info[key]
+        self.events.put(
+            "/network/interfaces/{}".format(name), data)
 
 
 if __name__ == "__main__":
+    from sanji.connection.mqtt import Mqtt
+
     FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
     logging.basicConfig(level=0, format=FORMAT)
     _logger = logging.getLogger("sanji.ethernet")
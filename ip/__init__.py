@@ -1,2 +1,7 @@
 import addr
+import cache
+import dhcp
+import ipv4
+import netlink
 import route
+import sysfs
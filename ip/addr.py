@@ -1,10 +1,11 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
-import sh
-import netifaces
-import ipcalc
-import copy
+import os
 import logging
+import ipv4
+import netlink
+import dhcp
+import sysfs
 
 # https://www.kernel.org/doc/Documentation/ABI/testing/sysfs-class-net
 
@@ -12,9 +13,6 @@ import logging
 # setuptools
 #   https://pypi.python.org/pypi/setuptools
 #
-# ipcalc.py
-#   https://github.com/tehmaze/ipcalc/
-#
 # sh.py
 #   https://pypi.python.org/pypi/sh
 
@@ -22,6 +20,126 @@ import logging
 _logger = logging.getLogger("sanji.ethernet.ip.addr")
 
 
+class _LazyModule(object):
+    """Import a module on its first use, for the modules which are slow to
+    be imported and not used by every start."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = __import__(self._name)
+        return getattr(self._module, attr)
+
+
+# only used by the "sh" backend
+sh = _LazyModule("sh")
+# a C extension, imported by the first lookup of the interfaces rather than
+# by every import of the bundle (e.g. the hooks and the tools)
+netifaces = _LazyModule("netifaces")
+
+
+class ShBackend(object):
+    """Configure the interfaces by forking the "ip" command."""
+
+    name = "sh"
+
+    def exists(self, iface):
+        try:
+            sh.ip("addr", "show", iface)
+        except sh.ErrorReturnCode_1:
+            return False
+        except Exception:
+            raise ValueError("Unknown error for \"%s\"." % iface)
+        return True
+
+    def link(self, iface, up):
+        sh.ip("link", "set", iface, "up" if up else "down")
+
+    def configure(self, iface, address=None):
+        sh.ip("-4", "addr", "flush", "label", iface)
+        if address:
+            ip, prefix, broadcast = address
+            sh.ip("addr", "add", "%s/%s" % (ip, prefix), "broadcast",
+                  broadcast, "dev", iface)
+
+
+class NetlinkBackend(object):
+    """Configure the interfaces through a RTNETLINK socket.
+
+    The flush and address add of `configure` are sent to the kernel as one
+    batch. As "ip -4 addr flush label <iface>" of the "sh" backend, only
+    the addresses labelled by the interface's name are flushed.
+    """
+
+    name = "netlink"
+
+    def __init__(self):
+        self._nl = netlink.Netlink()
+
+    def exists(self, iface):
+        return netlink.ifindex(iface) is not None
+
+    def _index(self, iface):
+        index = netlink.ifindex(iface)
+        if index is None:
+            raise ValueError("Device \"%s\" does not exist." % iface)
+        return index
+
+    def link(self, iface, up):
+        self._nl.link(self._index(iface), up)
+
+    def configure(self, iface, address=None):
+        index = self._index(iface)
+        flush = self._nl.addresses(index, label=iface)
+        self._nl.configure(index, flush, address, False, label=iface)
+
+
+BACKENDS = {
+    ShBackend.name: ShBackend,
+    NetlinkBackend.name: NetlinkBackend
+}
+
+_backend = None
+
+
+def set_backend(name):
+    """Select the backend used to configure the interfaces.
+
+    Args:
+        name: "netlink" or "sh".
+
+    Raises:
+        ValueError: unknown backend, or the backend is not available.
+    """
+    global _backend
+    if name not in BACKENDS:
+        raise ValueError("Unknown backend \"%s\"." % name)
+    try:
+        _backend = BACKENDS[name]()
+    except Exception as e:
+        raise ValueError("Backend \"%s\" is not available: %s" % (name, e))
+    return _backend
+
+
+def get_backend():
+    """Retrieve the backend in use.
+
+    The backend is chosen by the environment variable "IP_BACKEND"
+    (netlink by default), and falls back to "sh" if netlink socket is not
+    available.
+    """
+    if _backend is None:
+        try:
+            set_backend(os.getenv("IP_BACKEND", NetlinkBackend.name))
+        except ValueError as e:
+            _logger.info("%s, fall back to \"sh\"." % e)
+            set_backend(ShBackend.name)
+    return _backend
+
+
 def interfaces():
     """List all interfaces.
 
@@ -45,6 +163,24 @@ def interfaces():
         raise e
 
 
+# the sysfs files of the link state are kept open between the reads
+_link_state = sysfs.LinkState()
+
+
+def link_states(ifaces=None):
+    """Retrieve the link status of several interfaces at once.
+
+    Args:
+        ifaces: a list of interfaces name, all interfaces if None.
+
+    Returns:
+        A dict keyed by interface name. For example:
+
+        {"eth0": True, "eth1": False}
+    """
+    return _link_state.links(ifaces)
+
+
 def ifaddresses(iface):
     """Retrieve the detail information for an interface.
 
@@ -73,31 +209,59 @@ def ifaddresses(iface):
     except:
         info["mac"] = ""
 
-    try:
-        info["link"] = open("/sys/class/net/%s/operstate" % iface).read()
-        if "down" == info["link"][:-1]:
-            info["link"] = False
-        else:
-            info["link"] = open("/sys/class/net/%s/carrier" % iface).read()
-            info["link"] = True if int(info["link"][:-1]) == 1 else False
-    except:
-        info["link"] = False
+    info["link"] = _link_state.link(iface)
 
     info["inet"] = []
     if netifaces.AF_INET not in full:
         return info
 
-    for ip in full[netifaces.AF_INET]:
-        item = copy.deepcopy(ip)
+    # netifaces returns new objects for every call, no need to copy them
+    for item in full[netifaces.AF_INET]:
         if "addr" in item:
             item["ip"] = item.pop("addr")
-            net = ipcalc.Network("%s/%s" % (item["ip"], item["netmask"]))
-            item["subnet"] = str(net.network())
+            item["subnet"] = ipv4.network(item["ip"], item["netmask"])[0]
         info["inet"].append(item)
 
     return info
 
 
+def links():
+    """Retrieve the MAC address and link status of all interfaces at once.
+
+    All interfaces are retrieved by one RTNETLINK dump, instead of reading
+    them one by one as ifaddresses().
+
+    Returns:
+        A dict keyed by interface name. For example:
+
+        {"eth0": {"mac": "78:ac:c0:c1:a8:fe", "link": True}}
+
+    Raises:
+        NetlinkError, socket.error
+    """
+    nl = netlink.Netlink()
+    try:
+        replies = nl.dump(netlink.RTM_GETLINK, netlink.ifinfomsg(0))
+    finally:
+        nl.close()
+
+    info = {}
+    for payload in replies:
+        _, _, attrs = netlink.parse_ifinfomsg(payload)
+        if netlink.IFLA_IFNAME not in attrs:
+            continue
+        name = attrs[netlink.IFLA_IFNAME].rstrip("\0")
+        mac = ":".join("%02x" % ord(x)
+                       for x in attrs.get(netlink.IFLA_ADDRESS, ""))
+        operstate = ord(attrs.get(netlink.IFLA_OPERSTATE, "\0")[0])
+        carrier = ord(attrs.get(netlink.IFLA_CARRIER, "\0")[0])
+        info[name] = {
+            "mac": mac,
+            "link": operstate != netlink.IF_OPER_DOWN and carrier == 1
+        }
+    return info
+
+
 def ifupdown(iface, up):
     """Set an interface to up or down status.
 
@@ -111,31 +275,45 @@ def ifupdown(iface, up):
     if not up:
         dhclient(iface, False)
     try:
-        sh.ip("link", "set", iface, "up" if up else "down")
-    except:
+        get_backend().link(iface, up)
+    except Exception:
         raise ValueError("Cannot update the link status for \"%s\"."
                          % iface)
 
 
-def dhclient(iface, enable, script=None):
-    # Enable/0Disable the dhcp client and flush interface
-    # dhclient -pf /var/run/dhclient-<iface>.pid <iface>
-    # dhclient -r -pf /var/run/dhclient-<iface>.pid <iface>
-    pid_file = "/var/run/dhclient-{}.pid".format(iface)
-    try:
-        sh.dhclient("-r", "-pf", pid_file, iface)
-    except Exception as e:
-        _logger.info("Failed to stop dhclient: %s" % e)
-        pass
+_supervisor = None
+
+
+def get_supervisor():
+    """Retrieve the supervisor of the dhclient processes."""
+    global _supervisor
+    if _supervisor is None:
+        _supervisor = dhcp.Supervisor()
+    return _supervisor
 
+
+def dhclient(iface, enable, script=None, lease_file=None, env=None):
+    """Enable or disable the dhcp client of an interface.
+
+    A running client with the same configuration is kept instead of being
+    restarted, see `dhcp.Supervisor`.
+
+    Args:
+        iface: interface name.
+        enable: True to start the client and False to release the lease and
+            stop it.
+        script: dhclient-script for dhclient.
+        lease_file: lease file for dhclient.
+        env: environment variables for the dhclient-script.
+    """
     if enable:
-        if script:
-            sh.dhclient("-pf", pid_file, "-nw", "-sf", script, iface)
-        else:
-            sh.dhclient("-pf", pid_file, "-nw", iface)
+        get_supervisor().start(iface, script, lease_file, env)
+    else:
+        get_supervisor().stop(iface)
 
 
-def ifconfig(iface, dhcpc, ip="", netmask="24", gateway="", script=None):
+def ifconfig(iface, dhcpc, ip="", netmask="24", gateway="", script=None,
+             lease_file=None, env=None):
     """Set the interface to static IP or dynamic IP (by dhcpclient).
 
     Args:
@@ -144,34 +322,40 @@ def ifconfig(iface, dhcpc, ip="", netmask="24", gateway="", script=None):
         ip: IP address for static IP
         netmask:
         gateway:
+        script: dhclient-script for dhclient.
+        lease_file: lease file for dhclient.
+        env: environment variables for the dhclient-script.
 
     Raises:
         ValueError
     """
     # TODO(aeluin) catch the exception?
     # Check if interface exist
-    try:
-        sh.ip("addr", "show", iface)
-    except sh.ErrorReturnCode_1:
+    backend = get_backend()
+    if not backend.exists(iface):
         raise ValueError("Device \"%s\" does not exist." % iface)
-    except:
-        raise ValueError("Unknown error for \"%s\"." % iface)
+
+    # Keep the lease of a running client
+    if dhcpc and get_supervisor().running(iface, script, lease_file, env):
+        _logger.debug("%s: dhclient is running." % iface)
+        return
 
     # Disable the dhcp client and flush interface
     dhclient(iface, False)
 
+    address = None
+    if not dhcpc and ip:
+        _, broadcast, prefix = ipv4.network(ip, netmask)
+        address = (ip, prefix, broadcast)
+
+    # Flush the interface and add the static IP
     try:
-        sh.ip("-4", "addr", "flush", "label", iface)
-    except:
+        backend.configure(iface, address)
+    except Exception:
         raise ValueError("Unknown error for \"%s\"." % iface)
 
     if dhcpc:
-        dhclient(iface, True, script)
-    else:
-        if ip:
-            net = ipcalc.Network("%s/%s" % (ip, netmask))
-            sh.ip("addr", "add", "%s/%s" % (ip, net.netmask()), "broadcast",
-                  net.broadcast(), "dev", iface)
+        dhclient(iface, True, script, lease_file, env)
 
 
 if __name__ == "__main__":
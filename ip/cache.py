@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import time
+import threading
+import logging
+import addr
+import netlink
+
+
+_logger = logging.getLogger("sanji.ethernet.ip.cache")
+
+
+class IfaddrCache(object):
+    """Cache the results of `addr.ifaddresses` per interface.
+
+    An entry expires after `ttl` seconds, or as soon as the kernel notifies
+    a link or IPv4 address change for the interface (see `watch`).
+
+    The cached dict is shared by all the callers and must not be modified.
+    """
+
+    def __init__(self, ttl=5):
+        self.ttl = ttl
+        self._entries = {}
+        # increased by `invalidate`, for all and per interface
+        self._generation = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    def get(self, iface):
+        """Retrieve the detail information for an interface.
+
+        Raises:
+            ValueError: You must specify a valid interface name.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(iface)
+            generation = self._generation, self._generations.get(iface, 0)
+        if entry and now - entry[0] < self.ttl:
+            return entry[1]
+
+        info = addr.ifaddresses(iface)
+        with self._lock:
+            # read before an invalidation, it may be stale already
+            if generation == (self._generation,
+                              self._generations.get(iface, 0)):
+                self._entries[iface] = (now, info)
+        return info
+
+    def invalidate(self, iface=None):
+        """Drop the entry of an interface, or all entries if iface is None.
+        """
+        with self._lock:
+            if iface is None:
+                self._entries.clear()
+                self._generation += 1
+            else:
+                self._entries.pop(iface, None)
+                self._generations[iface] = \
+                    self._generations.get(iface, 0) + 1
+
+    def watch(self):
+        """Invalidate the entries by netlink notifications.
+
+        Returns:
+            True if the notifications are available, otherwise only the
+            TTL and explicit `invalidate` calls expire the entries.
+        """
+        if self._monitor:
+            return True
+        try:
+            self._monitor = netlink.Monitor(
+                netlink.RTMGRP_LINK | netlink.RTMGRP_IPV4_IFADDR,
+                self._on_notify)
+        except Exception as e:
+            _logger.info("Cannot watch the interfaces: %s" % e)
+            return False
+        self._monitor.start()
+        return True
+
+    def unwatch(self):
+        if self._monitor:
+            self._monitor.stop()
+            self._monitor = None
+
+    def _on_notify(self, type, payload):
+        if type is None:
+            self.invalidate()
+            return
+        if type in (netlink.RTM_NEWLINK, netlink.RTM_DELLINK):
+            _, _, attrs = netlink.parse_ifinfomsg(payload)
+            name = attrs.get(netlink.IFLA_IFNAME)
+        elif type in (netlink.RTM_NEWADDR, netlink.RTM_DELADDR):
+            _, _, _, attrs = netlink.parse_ifaddrmsg(payload)
+            name = attrs.get(netlink.IFA_LABEL)
+        else:
+            return
+
+        if name is None:
+            self.invalidate()
+        else:
+            # strip the terminating NUL and the alias, e.g. "eth0:0"
+            self.invalidate(name.rstrip("\0").split(":")[0])
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import time
+import errno
+import signal
+import logging
+import threading
+import subprocess
+
+
+_logger = logging.getLogger("sanji.ethernet.ip.dhcp")
+
+PID_FILE = "/var/run/dhclient-%s.pid"
+
+STATE_RUNNING = "running"
+STATE_EXITED = "exited"
+STATE_STOPPED = "stopped"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def _cmdline(pid):
+    try:
+        with open("/proc/%d/cmdline" % pid) as f:
+            return f.read().rstrip("\0").split("\0")
+    except (IOError, OSError):
+        return None
+
+
+class Client(object):
+    """A dhclient process of an interface.
+
+    Attributes:
+        iface: Interface name.
+        args: Command line of the process.
+        pid: Process id.
+        process: The subprocess.Popen of the process, None if it was
+            started before the supervisor (adopted).
+        state: "running", "exited" or "stopped".
+        started: Time when the process was started or adopted.
+        restarts: Number of times restarted after an unexpected exit.
+        returncode: Exit status of the process, None if still running.
+    """
+
+    def __init__(self, iface, args, pid, process=None, restarts=0):
+        self.iface = iface
+        self.args = args
+        self.pid = pid
+        self.process = process
+        self.state = STATE_RUNNING
+        self.started = time.time()
+        self.restarts = restarts
+        self.returncode = None
+        self.timer = None
+
+    @property
+    def healthy(self):
+        if self.state != STATE_RUNNING:
+            return False
+        # the exit of an adopted process is not reaped by the supervisor
+        return self.process is not None or _alive(self.pid)
+
+    def status(self):
+        return {
+            "name": self.iface,
+            "state": self.state,
+            "pid": self.pid,
+            "started": int(self.started),
+            "restarts": self.restarts,
+            "returncode": self.returncode
+        }
+
+
+class Supervisor(object):
+    """Run a dhclient per interface as a child process.
+
+    A running client is reused as long as it is started with the same
+    configuration, instead of releasing the lease and starting another one.
+    The clients are reaped by their own threads without blocking the
+    callers, and restarted after `restart_delay` seconds if they exit
+    unexpectedly. A client left by a previous supervisor (see `PID_FILE`)
+    is adopted if its command line is the expected one.
+
+    Args:
+        command: The dhclient executable.
+        restart_delay: Seconds before restarting an exited client, None for
+            not restarting.
+    """
+
+    def __init__(self, command="dhclient", restart_delay=5):
+        self.command = command
+        self.restart_delay = restart_delay
+        self._clients = {}
+        self._lock = threading.RLock()
+
+    def args(self, iface, script=None, lease_file=None, env=None):
+        """The command line of the client for an interface."""
+        # stay in the foreground to be reaped, but don't wait for a lease
+        args = [self.command, "-d", "-nw", "-pf", PID_FILE % iface]
+        if script:
+            args += ["-sf", script]
+        if lease_file:
+            args += ["-lf", lease_file]
+        for key, value in sorted((env or {}).items()):
+            args += ["-e", "%s=%s" % (key, value)]
+        return args + [iface]
+
+    def _pid(self, iface):
+        """The pid of a live client of an interface from its pid file."""
+        try:
+            with open(PID_FILE % iface) as f:
+                pid = int(f.read().strip())
+        except (IOError, OSError, ValueError):
+            return None
+        return pid if _alive(pid) else None
+
+    def _adopt(self, iface, args):
+        pid = self._pid(iface)
+        if pid is None or _cmdline(pid) != args:
+            return None
+        _logger.debug("%s: adopt dhclient (%d)." % (iface, pid))
+        client = Client(iface, args, pid)
+        self._clients[iface] = client
+        return client
+
+    def running(self, iface, script=None, lease_file=None, env=None):
+        """Tell if a healthy client of an interface is running with the
+        given configuration."""
+        args = self.args(iface, script, lease_file, env)
+        with self._lock:
+            client = self._clients.get(iface) or self._adopt(iface, args)
+            return client is not None and client.args == args and \
+                client.healthy
+
+    def start(self, iface, script=None, lease_file=None, env=None):
+        """Start the client of an interface, or reuse the running one.
+
+        Args:
+            iface: Interface name.
+            script: dhclient-script for dhclient.
+            lease_file: lease file for dhclient.
+            env: environment variables for the dhclient-script.
+
+        Returns:
+            True if a client is started, False if the running one is
+            reused.
+        """
+        with self._lock:
+            if self.running(iface, script, lease_file, env):
+                _logger.debug("%s: dhclient is running." % iface)
+                return False
+            self.stop(iface)
+            self._spawn(iface, self.args(iface, script, lease_file, env))
+            return True
+
+    def _spawn(self, iface, args, restarts=0):
+        with open(os.devnull, "r+") as devnull:
+            process = subprocess.Popen(args, stdin=devnull, stdout=devnull,
+                                       stderr=devnull, close_fds=True)
+        client = Client(iface, args, process.pid, process, restarts)
+        self._clients[iface] = client
+        reaper = threading.Thread(target=self._reap, args=(client,),
+                                  name="dhclient-%s" % iface)
+        reaper.daemon = True
+        reaper.start()
+        _logger.info("%s: dhclient started (%d)." % (iface, client.pid))
+        return client
+
+    def _reap(self, client):
+        returncode = client.process.wait()
+        with self._lock:
+            client.returncode = returncode
+            if client.state != STATE_RUNNING:
+                return
+            client.state = STATE_EXITED
+            _logger.info("%s: dhclient exited (%s)." %
+                         (client.iface, returncode))
+            if self.restart_delay is None or \
+                    self._clients.get(client.iface) is not client:
+                return
+            client.timer = threading.Timer(self.restart_delay, self._restart,
+                                           args=(client,))
+            client.timer.daemon = True
+            client.timer.start()
+
+    def _restart(self, client):
+        with self._lock:
+            if self._clients.get(client.iface) is not client or \
+                    client.state != STATE_EXITED:
+                return
+            self._spawn(client.iface, client.args, client.restarts + 1)
+
+    def stop(self, iface, release=True):
+        """Stop the client of an interface.
+
+        Args:
+            iface: Interface name.
+            release: Release the lease (dhclient -r), otherwise the client
+                is terminated only.
+
+        Returns:
+            True if a client is stopped, False if there was none.
+        """
+        with self._lock:
+            client = self._clients.pop(iface, None)
+            if client:
+                if client.timer:
+                    client.timer.cancel()
+                healthy = client.healthy
+                client.state = STATE_STOPPED
+                if not healthy:
+                    client = None
+            pid = client.pid if client else self._pid(iface)
+            if pid is None:
+                return False
+
+            if release:
+                try:
+                    subprocess.call(
+                        [self.command, "-r", "-pf", PID_FILE % iface, iface])
+                except OSError as e:
+                    _logger.info("Failed to stop dhclient: %s" % e)
+            # the child is reaped by its thread
+            if _alive(pid):
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            _logger.info("%s: dhclient stopped (%d)." % (iface, pid))
+            return True
+
+    def state(self, iface=None):
+        """The status of the clients, or of the client of an interface
+        (None if there is no client).
+
+        For example:
+
+            {"name": "eth0", "state": "running", "pid": 1234,
+             "started": 1760000000, "restarts": 0, "returncode": None}
+        """
+        with self._lock:
+            if iface is not None:
+                client = self._clients.get(iface)
+                return client.status() if client else None
+            return [self._clients[x].status() for x in sorted(self._clients)]
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import functools
+import threading
+from collections import OrderedDict
+
+# Integer based IPv4 helpers, much cheaper than building ipcalc objects.
+# The results are identical to ipcalc.Network for valid dotted-quad inputs.
+
+
+def memoize(maxsize=1024):
+    """LRU-memoize a function with hashable arguments.
+
+    functools.lru_cache is not available in python 2. Exceptions are not
+    cached.
+    """
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            with lock:
+                if args in cache:
+                    result = cache.pop(args)
+                    cache[args] = result
+                    return result
+            result = func(*args)
+            with lock:
+                cache[args] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+def aton(address):
+    """Convert a dotted-quad IPv4 address to an integer.
+
+    Raises:
+        ValueError: Invalid IPv4 address.
+    """
+    parts = address.split(".")
+    if len(parts) != 4:
+        raise ValueError("Invalid IPv4 address \"%s\"." % address)
+    value = 0
+    for part in parts:
+        if not part.isdigit() or len(part) > 3 or int(part) > 255:
+            raise ValueError("Invalid IPv4 address \"%s\"." % address)
+        value = (value << 8) | int(part)
+    return value
+
+
+def ntoa(value):
+    """Convert an integer to a dotted-quad IPv4 address."""
+    return "%d.%d.%d.%d" % ((value >> 24) & 0xff, (value >> 16) & 0xff,
+                            (value >> 8) & 0xff, value & 0xff)
+
+
+def is_netmask(value):
+    """Check if an integer is a netmask (contiguous leading 1 bits)."""
+    inverted = ~value & 0xffffffff
+    return inverted & (inverted + 1) == 0
+
+
+def mask(prefix):
+    """Convert a prefix length to a netmask integer."""
+    return (0xffffffff >> (32 - prefix)) << (32 - prefix)
+
+
+@memoize()
+def prefixlen(netmask):
+    """Convert a netmask to its prefix length.
+
+    Args:
+        netmask: dotted-quad netmask, or prefix length (int or digits).
+
+    Raises:
+        ValueError: Invalid netmask.
+    """
+    if isinstance(netmask, (int, long)) or netmask.isdigit():
+        prefix = int(netmask)
+    else:
+        # same as ipcalc: count the trailing 0 bits
+        inverted = ~aton(netmask) & 0xffffffff
+        prefix = 32
+        while prefix and inverted & (1 << (32 - prefix)):
+            prefix -= 1
+    if not 0 <= prefix <= 32:
+        raise ValueError("IPv4 subnet size must be between 0 and 32")
+    return prefix
+
+
+@memoize()
+def network(address, netmask):
+    """Calculate the network of an address.
+
+    Args:
+        address: dotted-quad IPv4 address.
+        netmask: dotted-quad netmask, or prefix length (int or digits).
+
+    Returns:
+        (network, broadcast, prefix), for example:
+
+        ("192.168.31.0", "192.168.31.255", 24)
+
+    Raises:
+        ValueError: Invalid address or netmask.
+    """
+    prefix = prefixlen(netmask)
+    value = aton(address) & mask(prefix)
+    return ntoa(value), ntoa(value | (~mask(prefix) & 0xffffffff)), prefix
+
+
+def netmask(prefix):
+    """Convert a prefix length to a dotted-quad netmask."""
+    return ntoa(mask(prefix))
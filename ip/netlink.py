@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import errno
+import socket
+import struct
+import threading
+import logging
+
+# A minimal RTNETLINK client, only the messages used by this bundle are
+# supported.
+#
+# http://man7.org/linux/man-pages/man7/rtnetlink.7.html
+# http://man7.org/linux/man-pages/man7/netlink.7.html
+
+
+_logger = logging.getLogger("sanji.ethernet.ip.netlink")
+
+NETLINK_ROUTE = 0
+
+# netlink message types
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_SETLINK = 19
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+
+# netlink message flags
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+# multicast groups
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+
+# ifaddrmsg attributes
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_LABEL = 3
+IFA_BROADCAST = 4
+
+# ifinfomsg attributes
+IFLA_ADDRESS = 1
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IFLA_CARRIER = 33
+
+# rtmsg attributes
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_TABLE = 15
+
+# rtmsg fields
+RT_TABLE_MAIN = 254
+RTPROT_KERNEL = 2
+RTPROT_BOOT = 3
+RT_SCOPE_UNIVERSE = 0
+RT_SCOPE_LINK = 253
+RT_SCOPE_NOWHERE = 255
+RTN_UNSPEC = 0
+RTN_UNICAST = 1
+
+IFF_UP = 0x1
+
+# operational states (IFLA_OPERSTATE)
+IF_OPER_DOWN = 2
+
+_NLMSGHDR = struct.Struct("=LHHLL")
+_NLMSGERR = struct.Struct("=i")
+_RTATTR = struct.Struct("=HH")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_IFINFOMSG = struct.Struct("=BxHiII")
+_RTMSG = struct.Struct("=BBBBBBBBI")
+
+
+class NetlinkError(OSError):
+    """An error acknowledgement returned by the kernel."""
+    pass
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def rtattr(type, data):
+    """Pack a routing attribute (with padding)."""
+    length = _RTATTR.size + len(data)
+    return _RTATTR.pack(length, type) + data + \
+        "\0" * (_align(length) - length)
+
+
+def parse_rtattrs(data):
+    """Unpack routing attributes into a dict keyed by attribute type."""
+    attrs = {}
+    offset = 0
+    while offset + _RTATTR.size <= len(data):
+        length, type = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attrs[type] = data[offset + _RTATTR.size:offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def ifindex(iface):
+    """Retrieve the interface index without forking any process.
+
+    Returns:
+        The interface index, or None if the interface does not exist.
+    """
+    try:
+        with open("/sys/class/net/%s/ifindex" % iface) as f:
+            return int(f.read())
+    except (IOError, ValueError):
+        return None
+
+
+def ifnames():
+    """Map the interface indexes to names without forking any process.
+
+    Returns:
+        A dict keyed by interface index.
+    """
+    names = {}
+    for name in os.listdir("/sys/class/net"):
+        index = ifindex(name)
+        if index is not None:
+            names[index] = name
+    return names
+
+
+def ifaddrmsg(index, address, prefixlen, broadcast=None, label=None):
+    """Build the payload of a RTM_NEWADDR/RTM_DELADDR message."""
+    local = socket.inet_aton(address)
+    payload = _IFADDRMSG.pack(socket.AF_INET, prefixlen, 0, 0, index)
+    payload += rtattr(IFA_LOCAL, local)
+    payload += rtattr(IFA_ADDRESS, local)
+    if broadcast:
+        payload += rtattr(IFA_BROADCAST, socket.inet_aton(broadcast))
+    if label:
+        payload += rtattr(IFA_LABEL, label + "\0")
+    return payload
+
+
+def ifinfomsg(index, flags=0, change=0):
+    """Build the payload of a RTM_SETLINK/RTM_GETLINK message."""
+    return _IFINFOMSG.pack(socket.AF_UNSPEC, 0, index, flags, change)
+
+
+def rtmsg(dest=None, prefixlen=0, index=None, gateway=None, prefsrc=None,
+          protocol=RTPROT_BOOT, scope=RT_SCOPE_UNIVERSE, type=RTN_UNICAST):
+    """Build the payload of a RTM_NEWROUTE/RTM_DELROUTE/RTM_GETROUTE message
+    for the main table."""
+    payload = _RTMSG.pack(socket.AF_INET, prefixlen, 0, 0, RT_TABLE_MAIN,
+                          protocol, scope, type, 0)
+    if dest:
+        payload += rtattr(RTA_DST, socket.inet_aton(dest))
+    if index is not None:
+        payload += rtattr(RTA_OIF, struct.pack("=I", index))
+    if gateway:
+        payload += rtattr(RTA_GATEWAY, socket.inet_aton(gateway))
+    if prefsrc:
+        payload += rtattr(RTA_PREFSRC, socket.inet_aton(prefsrc))
+    return payload
+
+
+class Netlink(object):
+    """A RTNETLINK socket.
+
+    Requests sent by one call of `transaction` are packed into a single
+    buffer, so the kernel handles all of them in one round trip.
+    """
+
+    def __init__(self, groups=0, timeout=5):
+        self._sock = socket.socket(
+            socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self._sock.settimeout(timeout)
+        self._sock.bind((0, groups))
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def close(self):
+        self._sock.close()
+
+    def recv(self):
+        """Receive and unpack the netlink messages of one datagram.
+
+        Returns:
+            A list of (type, flags, seq, payload) tuples.
+        """
+        data = self._sock.recv(65536)
+        msgs = []
+        offset = 0
+        while offset + _NLMSGHDR.size <= len(data):
+            length, type, flags, seq, _ = \
+                _NLMSGHDR.unpack_from(data, offset)
+            if length < _NLMSGHDR.size:
+                break
+            msgs.append((type, flags, seq,
+                         data[offset + _NLMSGHDR.size:offset + length]))
+            offset += _align(length)
+        return msgs
+
+    def transaction(self, requests):
+        """Send requests in one batch and collect the replies.
+
+        Args:
+            requests: a list of (type, flags, payload). NLM_F_REQUEST is
+                always set; requests other than dumps are acknowledged.
+
+        Returns:
+            A list with one entry per request: a list of (type, payload)
+            replies, or a NetlinkError if the kernel rejected the request.
+        """
+        with self._lock:
+            buf = ""
+            seqs = []
+            for type, flags, payload in requests:
+                self._seq += 1
+                flags |= NLM_F_REQUEST
+                # NLM_F_DUMP shares its bits with NLM_F_EXCL/NLM_F_REPLACE,
+                # it only means a dump for the RTM_GET* requests
+                if type & 3 != 2 or flags & NLM_F_DUMP != NLM_F_DUMP:
+                    flags |= NLM_F_ACK
+                length = _NLMSGHDR.size + len(payload)
+                buf += _NLMSGHDR.pack(length, type, flags, self._seq, 0)
+                buf += payload + "\0" * (_align(length) - length)
+                seqs.append(self._seq)
+            self._sock.sendto(buf, (0, 0))
+
+            results = dict((seq, []) for seq in seqs)
+            pending = set(seqs)
+            while pending:
+                for type, flags, seq, payload in self.recv():
+                    if seq not in pending:
+                        continue
+                    if type == NLMSG_DONE:
+                        pending.discard(seq)
+                    elif type == NLMSG_ERROR:
+                        code = -_NLMSGERR.unpack_from(payload)[0]
+                        if code:
+                            results[seq] = NetlinkError(
+                                code, os.strerror(code))
+                        pending.discard(seq)
+                    else:
+                        results[seq].append((type, payload))
+            return [results[seq] for seq in seqs]
+
+    def dump(self, type, payload):
+        """Dump the kernel objects, such as all links by RTM_GETLINK.
+
+        Returns:
+            A list of the replied payloads.
+
+        Raises:
+            NetlinkError
+        """
+        result = self.transaction([(type, NLM_F_DUMP, payload)])[0]
+        if isinstance(result, NetlinkError):
+            raise result
+        return [reply for _, reply in result]
+
+    def addresses(self, index, label=None):
+        """List the IPv4 addresses of an interface by one RTM_GETADDR dump.
+
+        Args:
+            index: interface index.
+            label: only the addresses with this label (IFA_LABEL), e.g.
+                "eth0" leaves out the aliases such as "eth0:1".
+
+        Returns:
+            A list of (ip, prefixlen).
+
+        Raises:
+            NetlinkError
+        """
+        replies = self.dump(RTM_GETADDR,
+                            _IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0))
+        addresses = []
+        for payload in replies:
+            family, prefixlen, idx, attrs = parse_ifaddrmsg(payload)
+            if family != socket.AF_INET or idx != index:
+                continue
+            if label is not None and \
+                    attrs.get(IFA_LABEL, "").rstrip("\0") != label:
+                continue
+            local = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+            if local:
+                addresses.append((socket.inet_ntoa(local), prefixlen))
+        return addresses
+
+    def configure(self, index, addresses=None, address=None, up=True,
+                  label=None):
+        """Flush IPv4 addresses, add a new one and set the link up.
+
+        Args:
+            index: interface index.
+            addresses: a list of (ip, prefixlen) to be flushed.
+            address: (ip, prefixlen, broadcast) to be added, or None.
+            up: set the link up.
+            label: address label, usually the interface name.
+
+        Raises:
+            NetlinkError
+        """
+        requests = []
+        for ip, prefixlen in addresses or []:
+            requests.append(
+                (RTM_DELADDR, 0, ifaddrmsg(index, ip, prefixlen)))
+        if address:
+            ip, prefixlen, broadcast = address
+            requests.append(
+                (RTM_NEWADDR, NLM_F_CREATE | NLM_F_EXCL,
+                 ifaddrmsg(index, ip, prefixlen, broadcast, label)))
+        if up:
+            requests.append(
+                (RTM_SETLINK, 0, ifinfomsg(index, IFF_UP, IFF_UP)))
+        if not requests:
+            return
+
+        flushed = len(addresses or [])
+        for idx, result in enumerate(self.transaction(requests)):
+            if not isinstance(result, NetlinkError):
+                continue
+            # secondary addresses are removed along with the primary one
+            if idx < flushed and result.errno == errno.EADDRNOTAVAIL:
+                continue
+            raise result
+
+    def link(self, index, up):
+        """Set the link up or down.
+
+        Raises:
+            NetlinkError
+        """
+        result = self.transaction(
+            [(RTM_SETLINK, 0, ifinfomsg(index, IFF_UP if up else 0, IFF_UP))])
+        if isinstance(result[0], NetlinkError):
+            raise result[0]
+
+
+def parse_ifinfomsg(payload):
+    """Unpack a RTM_NEWLINK/RTM_DELLINK message.
+
+    Returns:
+        (index, flags, attrs)
+    """
+    _, _, index, flags, _ = _IFINFOMSG.unpack_from(payload)
+    return index, flags, parse_rtattrs(payload[_IFINFOMSG.size:])
+
+
+def parse_ifaddrmsg(payload):
+    """Unpack a RTM_NEWADDR/RTM_DELADDR message.
+
+    Returns:
+        (family, prefixlen, index, attrs)
+    """
+    family, prefixlen, _, _, index = _IFADDRMSG.unpack_from(payload)
+    return family, prefixlen, index, parse_rtattrs(payload[_IFADDRMSG.size:])
+
+
+def parse_rtmsg(payload):
+    """Unpack a RTM_NEWROUTE/RTM_DELROUTE message.
+
+    Returns:
+        (family, prefixlen, table, scope, type, attrs), the table is
+        RTA_TABLE if given.
+    """
+    family, prefixlen, _, _, table, _, scope, type, _ = \
+        _RTMSG.unpack_from(payload)
+    attrs = parse_rtattrs(payload[_RTMSG.size:])
+    if RTA_TABLE in attrs:
+        table = struct.unpack("=I", attrs[RTA_TABLE])[0]
+    return family, prefixlen, table, scope, type, attrs
+
+
+class Monitor(threading.Thread):
+    """Listen to the RTNETLINK multicast groups in background.
+
+    Args:
+        groups: RTMGRP_* bitmask.
+        callback: called with (type, payload) for every notification, and
+            with (None, None) if notifications were lost (socket overrun).
+    """
+
+    def __init__(self, groups, callback):
+        super(Monitor, self).__init__(name="netlink-monitor")
+        self.daemon = True
+        self._nl = Netlink(groups=groups, timeout=0.5)
+        self._callback = callback
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                msgs = self._nl.recv()
+            except socket.timeout:
+                continue
+            except socket.error as e:
+                if e.errno != errno.ENOBUFS:
+                    _logger.info("Netlink monitor stopped: %s" % e)
+                    return
+                self._callback(None, None)
+                continue
+            for type, _, _, payload in msgs:
+                try:
+                    self._callback(type, payload)
+                except Exception as e:
+                    _logger.debug(e, exc_info=True)
+        self._nl.close()
+
+    def stop(self):
+        # netlink sockets can't be shut down to wake up recv(), wait for its
+        # timeout instead
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(1)
@@ -1,6 +1,309 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
-import sh
+import errno
+import socket
+import struct
+import logging
+import threading
+from collections import OrderedDict
+import netlink
+
+
+_logger = logging.getLogger("sanji.ethernet.ip.route")
+
+
+def _destination(dest):
+    """Split a destination into (address, prefixlen).
+
+    Args:
+        dest: "default", "192.168.3.0/24" or "192.168.3.1".
+    """
+    if "default" == dest:
+        return None, 0
+    if "/" in dest:
+        address, prefixlen = dest.split("/")
+        return address, int(prefixlen)
+    return dest, 32
+
+
+def _key(dest, prefixlen):
+    """The destination as indexed, e.g. "default", "192.168.3.0/24" or
+    "192.168.3.1" for a /32 one."""
+    if not prefixlen:
+        return "default"
+    if 32 == prefixlen:
+        return dest
+    return "%s/%d" % (dest, prefixlen)
+
+
+class RouteTable(object):
+    """The IPv4 routes of the main table, indexed by device, destination
+    and default route.
+
+    The table is loaded by one RTNETLINK dump on the first lookup, then
+    only changed by `add` and `delete`, or kept up to date by the route
+    notifications once `watch` is called. The routes flushed by the kernel
+    along with a link or an address are not notified, so the table is
+    loaded again before the next lookup after such changes.
+
+    The routes are in the format of `show`, the dicts are shared and must
+    not be modified.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._nl = None
+        self._monitor = None
+        self._names = {}
+        self._routes = OrderedDict()
+        self._by_dev = {}
+        self._by_dest = {}
+        self._stale = True
+
+    def _netlink(self):
+        if self._nl is None:
+            self._nl = netlink.Netlink()
+        return self._nl
+
+    def close(self):
+        self.unwatch()
+        with self._lock:
+            if self._nl:
+                self._nl.close()
+                self._nl = None
+
+    def load(self):
+        """Load all routes by one RTNETLINK dump.
+
+        Raises:
+            NetlinkError, socket.error
+        """
+        with self._lock:
+            replies = self._netlink().dump(
+                netlink.RTM_GETROUTE, netlink.rtmsg(protocol=0, type=0))
+            self._names = netlink.ifnames()
+            self._routes = OrderedDict()
+            self._by_dev = {}
+            self._by_dest = {}
+            for payload in replies:
+                self._update(netlink.RTM_NEWROUTE, payload)
+            self._stale = False
+        return self
+
+    def _ensure(self):
+        if self._stale:
+            self.load()
+
+    def _ifname(self, index):
+        if index not in self._names:
+            self._names = netlink.ifnames()
+        return self._names.get(index, "")
+
+    def _update(self, type, payload):
+        family, prefixlen, table, _, rtype, attrs = \
+            netlink.parse_rtmsg(payload)
+        if family != socket.AF_INET or table != netlink.RT_TABLE_MAIN or \
+                rtype != netlink.RTN_UNICAST:
+            return
+
+        dest = _key(socket.inet_ntoa(attrs.get(netlink.RTA_DST, "\0" * 4)),
+                    prefixlen)
+        metric = 0
+        if netlink.RTA_PRIORITY in attrs:
+            metric = struct.unpack(
+                "=I", attrs[netlink.RTA_PRIORITY])[0]
+        key = (dest, metric)
+
+        if type == netlink.RTM_DELROUTE:
+            self._remove(key)
+            return
+
+        rule = {}
+        gateway = ""
+        if netlink.RTA_GATEWAY in attrs:
+            gateway = socket.inet_ntoa(attrs[netlink.RTA_GATEWAY])
+        if "default" == dest:
+            rule["default"] = gateway
+        else:
+            rule["dest"] = dest
+            if netlink.RTA_PREFSRC in attrs:
+                rule["src"] = socket.inet_ntoa(attrs[netlink.RTA_PREFSRC])
+            elif gateway:
+                rule["src"] = gateway
+        if netlink.RTA_OIF in attrs:
+            rule["dev"] = self._ifname(struct.unpack(
+                "=I", attrs[netlink.RTA_OIF])[0])
+
+        self._remove(key)
+        self._routes[key] = rule
+        self._by_dest.setdefault(dest, []).append(key)
+        self._by_dest[dest].sort(key=lambda x: x[1])
+        if rule.get("dev"):
+            self._by_dev.setdefault(rule["dev"], []).append(key)
+
+    def _remove(self, key):
+        rule = self._routes.pop(key, None)
+        if rule is None:
+            return
+        self._by_dest[key[0]].remove(key)
+        if not self._by_dest[key[0]]:
+            self._by_dest.pop(key[0])
+        if rule.get("dev"):
+            self._by_dev[rule["dev"]].remove(key)
+            if not self._by_dev[rule["dev"]]:
+                self._by_dev.pop(rule["dev"])
+
+    def update(self, type, payload):
+        """Apply a RTNETLINK notification to the table.
+
+        Args:
+            type: message type, None if notifications were lost.
+            payload: message payload.
+        """
+        with self._lock:
+            if type is None or type in (netlink.RTM_NEWLINK,
+                                        netlink.RTM_DELLINK,
+                                        netlink.RTM_DELADDR):
+                self._stale = True
+            elif type in (netlink.RTM_NEWROUTE, netlink.RTM_DELROUTE):
+                if not self._stale:
+                    self._update(type, payload)
+
+    def watch(self):
+        """Keep the table up to date by netlink notifications.
+
+        Returns:
+            True if the notifications are available, otherwise the table is
+            only changed by `add`, `delete` and `load`.
+        """
+        if self._monitor:
+            return True
+        try:
+            self._monitor = netlink.Monitor(
+                netlink.RTMGRP_IPV4_ROUTE | netlink.RTMGRP_LINK |
+                netlink.RTMGRP_IPV4_IFADDR, self.update)
+        except Exception as e:
+            _logger.info("Cannot watch the routes: %s" % e)
+            return False
+        self._monitor.start()
+        with self._lock:
+            self._stale = True
+        return True
+
+    def unwatch(self):
+        if self._monitor:
+            self._monitor.stop()
+            self._monitor = None
+
+    def routes(self):
+        """List all routing rules, see `show`."""
+        with self._lock:
+            self._ensure()
+            return list(self._routes.values())
+
+    def _lookup(self, index, key):
+        with self._lock:
+            self._ensure()
+            return [self._routes[x] for x in getattr(self, index).get(key, [])]
+
+    def by_dev(self, dev):
+        """List the routing rules of a device."""
+        return self._lookup("_by_dev", dev)
+
+    def by_dest(self, dest):
+        """List the routing rules of a destination, lowest metric first.
+
+        Args:
+            dest: e.g. "192.168.3.0/24", or "default".
+        """
+        return self._lookup("_by_dest", _key(*_destination(dest)))
+
+    def default(self):
+        """Retrieve the default route in use, None if not found."""
+        rules = self.by_dest("default")
+        return rules[0] if rules else None
+
+    def add(self, routes):
+        """Add routing rules in one batch.
+
+        Args:
+            routes: a list of dict with "dest", "dev" and "src", see `add`.
+
+        Raises:
+            ValueError: device does not exist.
+            NetlinkError: the first rule rejected by the kernel, the others
+                are added.
+        """
+        requests = []
+        for route in routes:
+            dest, prefixlen = _destination(route["dest"])
+            index = None
+            if route.get("dev"):
+                index = netlink.ifindex(route["dev"])
+                if index is None:
+                    raise ValueError(
+                        "Device \"%s\" does not exist." % route["dev"])
+            src = route.get("src", "")
+            if "" == src:
+                payload = netlink.rtmsg(dest, prefixlen, index,
+                                        scope=netlink.RT_SCOPE_LINK)
+            elif dest is None:
+                payload = netlink.rtmsg(dest, prefixlen, index, gateway=src)
+            else:
+                payload = netlink.rtmsg(dest, prefixlen, index, prefsrc=src,
+                                        protocol=netlink.RTPROT_KERNEL,
+                                        scope=netlink.RT_SCOPE_LINK)
+            requests.append((netlink.RTM_NEWROUTE,
+                             netlink.NLM_F_CREATE | netlink.NLM_F_EXCL,
+                             payload))
+        if not requests:
+            return
+
+        error = None
+        with self._lock:
+            results = self._netlink().transaction(requests)
+            for request, result in zip(requests, results):
+                if isinstance(result, netlink.NetlinkError):
+                    error = error or result
+                elif not self._stale:
+                    self._update(netlink.RTM_NEWROUTE, request[2])
+        if error:
+            raise error
+
+    def delete(self, networks):
+        """Delete routing rules in one batch, the ones not found are
+        ignored.
+
+        Args:
+            networks: a list of destinations, see `delete`.
+
+        Raises:
+            NetlinkError: the first rule rejected by the kernel, the others
+                are deleted.
+        """
+        requests = []
+        for network in networks:
+            dest, prefixlen = _destination(network)
+            requests.append((netlink.RTM_DELROUTE, 0, netlink.rtmsg(
+                dest, prefixlen, protocol=0,
+                scope=netlink.RT_SCOPE_NOWHERE, type=netlink.RTN_UNSPEC)))
+        if not requests:
+            return
+
+        error = None
+        with self._lock:
+            results = self._netlink().transaction(requests)
+            for network, result in zip(networks, results):
+                if isinstance(result, netlink.NetlinkError):
+                    if result.errno != errno.ESRCH:
+                        error = error or result
+                    continue
+                # the kernel deletes the one with the lowest metric
+                keys = self._by_dest.get(_key(*_destination(network)))
+                if keys and not self._stale:
+                    self._remove(keys[0])
+        if error:
+            raise error
 
 
 def show():
@@ -17,29 +320,11 @@ def show():
                 "dev": ""}
         ]
     """
-    rules = []
-    routes = sh.ip("route", "show")
-    for route in routes:
-        rule = dict()
-        route = route.split()
-        if "default" == route[0]:
-            rule["default"] = ""
-            if "via" in route:
-                rule["default"] = route[route.index("via")+1]
-            rule["dev"] = route[route.index("dev")+1]
-        else:
-            rule["dest"] = route[0]
-            rule["dev"] = route[route.index("dev")+1]
-            if "src" in route:
-                src = route.index("src")
-            elif "via" in route:
-                src = route.index("via")
-            else:
-                src = -1
-            if -1 != src:
-                rule["src"] = route[src+1]
-        rules.append(rule)
-    return rules
+    table = RouteTable()
+    try:
+        return table.load().routes()
+    finally:
+        table.close()
 
 
 def add(dest, dev="", src=""):
@@ -51,18 +336,13 @@ def add(dest, dev="", src=""):
         src: source for the routing rule, fill "gateway" if dest is "default"
 
     Raises:
-        FIXME
+        ValueError, NetlinkError
     """
-    if "" == src:
-        sh.ip("route", "add", dest, "dev", dev)
-    elif "default" == dest:
-        if dev:
-            sh.ip("route", "add", dest, "dev", dev, "via", src)
-        else:
-            sh.ip("route", "add", dest, "via", src)
-    else:
-        sh.ip("route", "add", dest, "dev", dev, "proto", "kernel", "scope",
-              "link", "src", src)
+    table = RouteTable()
+    try:
+        table.add([{"dest": dest, "dev": dev, "src": src}])
+    finally:
+        table.close()
 
 
 def delete(network="default"):
@@ -72,12 +352,13 @@ def delete(network="default"):
         network: destination of the routing rule to be delete
 
     Raises:
-        FIXME
+        NetlinkError
     """
+    table = RouteTable()
     try:
-        sh.ip("route", "del", network)
-    except sh.ErrorReturnCode_2:
-        pass
+        table.delete([network])
+    finally:
+        table.close()
 
 
 if __name__ == "__main__":
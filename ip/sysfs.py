@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import errno
+import logging
+import threading
+
+# https://www.kernel.org/doc/Documentation/ABI/testing/sysfs-class-net
+
+
+_logger = logging.getLogger("sanji.ethernet.ip.sysfs")
+
+SYSFS_NET = "/sys/class/net"
+
+# an attribute of sysfs is at most a page
+_SIZE = 4096
+
+
+if hasattr(os, "pread"):  # pragma: no cover
+    def pread(fd, size=_SIZE, offset=0):
+        return os.pread(fd, size, offset)
+else:
+    def pread(fd, size=_SIZE, offset=0):
+        """Read from an offset of a file, the sysfs attributes are
+        regenerated by reading from the beginning."""
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, size)
+
+
+class Attributes(object):
+    """Keep the attribute files of a sysfs directory open, to be re-read
+    without opening them again.
+
+    The files are opened on the first `read`, and reopened after the
+    directory disappears and comes back (e.g. the interface is renamed or
+    the driver is reloaded).
+
+    Args:
+        path: The directory, e.g. "/sys/class/net/eth0/statistics".
+        names: The attributes to be read, all files of the directory if
+            None.
+    """
+
+    def __init__(self, path, names=None):
+        self.path = path
+        self.names = names
+        self._fds = None
+        # the offset of a file is shared without pread
+        self._lock = threading.Lock()
+
+    def open(self):
+        names = self.names
+        if names is None:
+            names = sorted(os.listdir(self.path))
+        fds = {}
+        try:
+            for name in names:
+                fds[name] = os.open(os.path.join(self.path, name),
+                                    os.O_RDONLY)
+        except OSError:
+            for fd in fds.values():
+                os.close(fd)
+            raise
+        self._fds = fds
+
+    def read(self):
+        """Read all attributes.
+
+        Returns:
+            A dict of the attributes' values, as integers if they are
+            numbers. The attributes which cannot be read are left out.
+
+        Raises:
+            OSError: the directory does not exist, or is removed.
+        """
+        with self._lock:
+            if self._fds is None:
+                self.open()
+            values = {}
+            for name, fd in self._fds.items():
+                try:
+                    value = pread(fd).strip()
+                except (IOError, OSError) as e:
+                    # the interface is gone, or the attribute is not
+                    # available in the current state (e.g. the carrier of a
+                    # down interface)
+                    if e.errno == errno.ENODEV:
+                        self._close()
+                        raise
+                    continue
+                try:
+                    values[name] = int(value)
+                except ValueError:
+                    values[name] = value
+            return values
+
+    def _close(self):
+        if self._fds:
+            for fd in self._fds.values():
+                os.close(fd)
+        self._fds = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+class LinkState(object):
+    """Read the link state of the interfaces from sysfs, by the operstate
+    and carrier files kept open per interface.
+
+    The files of a removed interface are closed, and opened again once an
+    interface of the same name is created.
+
+    Args:
+        root: The sysfs directory of the interfaces.
+    """
+
+    NAMES = ("operstate", "carrier")
+
+    def __init__(self, root=SYSFS_NET):
+        self.root = root
+        self._attrs = {}
+        self._lock = threading.Lock()
+
+    def _read(self, iface):
+        with self._lock:
+            attrs = self._attrs.get(iface)
+            if attrs is None:
+                attrs = Attributes(os.path.join(self.root, iface), self.NAMES)
+                self._attrs[iface] = attrs
+        try:
+            return attrs.read()
+        except OSError as e:
+            if e.errno != errno.ENODEV:
+                raise
+        # removed, and maybe created again since the last read
+        return attrs.read()
+
+    def link(self, iface):
+        """Tell if the link of an interface is up.
+
+        Returns:
+            True if the interface is not down and has a carrier, False
+            otherwise or if there is no such interface.
+        """
+        try:
+            values = self._read(iface)
+        except (IOError, OSError):
+            self.forget(iface)
+            return False
+        return values.get("operstate") != "down" and \
+            values.get("carrier") == 1
+
+    def links(self, ifaces=None):
+        """Read the link state of several interfaces at once.
+
+        Args:
+            ifaces: The interfaces' names, all interfaces if None.
+
+        Returns:
+            A dict of the link state by interface name, see `link`.
+        """
+        if ifaces is None:
+            try:
+                ifaces = os.listdir(self.root)
+            except OSError:
+                ifaces = []
+            # the files of the removed interfaces are not kept
+            with self._lock:
+                gone = [x for x in self._attrs if x not in ifaces]
+            for iface in gone:
+                self.forget(iface)
+        return dict((x, self.link(x)) for x in ifaces)
+
+    def forget(self, iface):
+        """Close the files of an interface."""
+        with self._lock:
+            attrs = self._attrs.pop(iface, None)
+        if attrs:
+            attrs.close()
+
+    def close(self):
+        with self._lock:
+            attrs, self._attrs = self._attrs.values(), {}
+        for item in attrs:
+            item.close()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import socket
+import logging
+import threading
+
+
+_logger = logging.getLogger("sanji.ethernet.channel")
+
+DEFAULT_PATH = "/var/run/sanji-ethernet.sock"
+
+
+def parse(data):
+    """Parse an event message, one "key=value" per line.
+
+    Returns:
+        A dict, for example:
+
+        {"event": "link", "name": "eth0", "link": "1"}
+    """
+    event = {}
+    for line in data.splitlines():
+        key, sep, value = line.partition("=")
+        if sep:
+            event[key.strip()] = value.strip()
+    return event
+
+
+class EventChannel(threading.Thread):
+    """Receive the hooks' events from a local unix datagram socket.
+
+    The hooks (dhclient-script, ifplugd) write one datagram per event
+    through "hooks/ethernet-event", so the events reach the bundle without
+    starting a python interpreter or a round trip to the broker.
+
+    Args:
+        path: Socket path.
+        callback: Called with the parsed event, see parse().
+    """
+
+    def __init__(self, path, callback):
+        super(EventChannel, self).__init__(name="event-channel")
+        self.daemon = True
+        self.path = path
+        self._callback = callback
+        self._stop_event = threading.Event()
+
+        if os.path.exists(path):
+            os.remove(path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.settimeout(1)
+        self._sock.bind(path)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                data = self._sock.recv(4096)
+            except socket.timeout:
+                continue
+            except socket.error as e:
+                if not self._stop_event.is_set():
+                    _logger.info("Event channel stopped: %s" % e)
+                return
+            if not data:
+                continue
+
+            try:
+                self._callback(parse(data))
+            except Exception as e:
+                _logger.info("Cannot handle the event: %s" % e)
+                _logger.debug(e, exc_info=True)
+
+    def stop(self):
+        self._stop_event.set()
+        # wake up recv() by an empty datagram
+        try:
+            send({}, self.path)
+        except socket.error:
+            pass
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(1)
+        self._sock.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def send(event, path=DEFAULT_PATH):
+    """Send an event to the channel.
+
+    Args:
+        event: A dict of strings.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        sock.sendto("".join("%s=%s\n" % (k, v) for k, v in event.items()),
+                    path)
+    finally:
+        sock.close()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import time
+import logging
+import threading
+
+
+_logger = logging.getLogger("sanji.ethernet.coalesce")
+
+
+class Coalescer(object):
+    """Coalesce the bursts of triggers per key into one callback.
+
+    The callback is called once a key has not been triggered for `window`
+    seconds (the state is settled), or at most `max_delay` seconds after
+    the first trigger of the burst if the key keeps being triggered. All
+    the callbacks are called by one background thread.
+
+    Args:
+        window: seconds without any trigger before calling back, 0 to call
+            back at once.
+        callback: called as callback(key, suppressed), suppressed is the
+            number of triggers coalesced into this call.
+        max_delay: upper bound of the delay, 5 windows by default.
+    """
+
+    def __init__(self, window, callback, max_delay=None, name="coalescer"):
+        self.window = window
+        self.max_delay = window * 5 if max_delay is None else max_delay
+        self._callback = callback
+        self._pending = {}
+        self._cond = threading.Condition(threading.Lock())
+        self._stopped = False
+        self._thread = None
+        if window > 0:
+            self._thread = threading.Thread(target=self._run, name=name)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def trigger(self, key):
+        """Record a trigger of key."""
+        if self._thread is None:
+            self._call(key, 0)
+            return
+
+        now = time.time()
+        with self._cond:
+            entry = self._pending.get(key)
+            if entry is None:
+                self._pending[key] = {"first": now,
+                                      "deadline": now + self.window,
+                                      "suppressed": 0}
+                self._cond.notify()
+                return
+            entry["suppressed"] += 1
+            entry["deadline"] = min(now + self.window,
+                                    entry["first"] + self.max_delay)
+
+    def pending(self, key):
+        """Check if there is a callback of key waiting."""
+        with self._cond:
+            return key in self._pending
+
+    def flush(self):
+        """Call back the waiting keys at once."""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        for key, entry in pending.items():
+            self._call(key, entry["suppressed"])
+
+    def stop(self):
+        """Stop the thread, the waiting keys are dropped."""
+        with self._cond:
+            self._stopped = True
+            self._pending = {}
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(1)
+
+    def _call(self, key, suppressed):
+        try:
+            self._callback(key, suppressed)
+        except Exception as e:
+            _logger.info("%s: callback failed: %s" % (key, e))
+            _logger.debug(e, exc_info=True)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.time()
+                    due = [k for k, v in self._pending.items()
+                           if v["deadline"] <= now]
+                    if due:
+                        break
+                    if self._pending:
+                        self._cond.wait(
+                            min(v["deadline"] for v in
+                                self._pending.values()) - now)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+                due = [(k, self._pending.pop(k)["suppressed"]) for k in due]
+            for key, suppressed in due:
+                self._call(key, suppressed)
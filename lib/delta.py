@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import copy
+import logging
+import threading
+
+
+_logger = logging.getLogger("sanji.ethernet.delta")
+
+MODE_FULL = "full"
+MODE_DELTA = "delta"
+
+
+class DeltaPublisher(object):
+    """Publish the events of a resource as the fields changed since the
+    previous event.
+
+    The published fields of each resource are merged into a snapshot. In
+    the "delta" mode, an event only carries the changed fields with the
+    "name", a "version" increased by one per event of the resource and
+    "delta": True; an event without any changed field is not published. The
+    first event of a resource and a resync carry the whole snapshot with
+    "delta": False. A subscriber missing a version should ask for a resync.
+    In the "full" mode, the events are published as given and no snapshot
+    is kept.
+
+    Args:
+        publish: called as publish(resource, data) to publish an event.
+        mode: "full" or "delta".
+    """
+
+    def __init__(self, publish, mode=MODE_FULL):
+        if mode not in (MODE_FULL, MODE_DELTA):
+            raise ValueError("Unknown event mode: %s." % mode)
+        self.mode = mode
+        self._publish = publish
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._snapshots = {}
+        self._versions = {}
+
+    def version(self, resource):
+        """Retrieve the version of the last event of resource, 0 if none."""
+        return self._versions.get(resource, 0)
+
+    def put(self, resource, data):
+        """Publish the event of resource.
+
+        Args:
+            resource: e.g. "/network/interfaces/eth0".
+            data: the fields of the resource, the ones not given are kept
+                as published before.
+
+        Returns:
+            The published data, None if there is nothing changed.
+        """
+        if self.mode == MODE_FULL:
+            self._publish(resource, data)
+            return data
+        with self._resource_lock(resource):
+            snapshot = self._snapshots.get(resource)
+            if snapshot is None:
+                return self._emit(resource, data, False)
+            changed = dict((k, v) for k, v in data.items()
+                           if k not in snapshot or snapshot[k] != v)
+            if not changed:
+                _logger.debug("%s: nothing changed." % resource)
+                return None
+            changed["name"] = data.get("name", snapshot.get("name"))
+            return self._emit(resource, changed, True)
+
+    def resync(self, resource, data=None):
+        """Publish the whole snapshot of resource, even if nothing is
+        changed.
+
+        Args:
+            resource: e.g. "/network/interfaces/eth0".
+            data: the latest fields to be merged into the snapshot, the
+                whole resource in the "full" mode.
+
+        Returns:
+            The published data.
+        """
+        data = data or {}
+        if self.mode == MODE_FULL:
+            self._publish(resource, data)
+            return data
+        with self._resource_lock(resource):
+            return self._emit(resource, data, False)
+
+    def _resource_lock(self, resource):
+        with self._lock:
+            lock = self._locks.get(resource)
+            if lock is None:
+                lock = self._locks[resource] = threading.Lock()
+            return lock
+
+    def _emit(self, resource, data, delta):
+        """Merge data into the snapshot, then publish data if delta, or
+        the whole snapshot otherwise. The resource's lock must be held.
+
+        Only the given fields are copied; the snapshot's values are
+        replaced but never changed in place, so they are shared with the
+        published events.
+        """
+        snapshot = self._snapshots.setdefault(resource, {})
+        snapshot.update(copy.deepcopy(data))
+        version = self._versions.get(resource, 0) + 1
+        self._versions[resource] = version
+        event = dict(data if delta else snapshot, version=version,
+                     delta=delta)
+        self._publish(resource, event)
+        return event
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import time
+import logging
+import threading
+from collections import deque
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+
+_logger = logging.getLogger("sanji.ethernet.executor")
+
+
+class Task(object):
+    """A function submitted to KeyedExecutor.
+
+    Attributes:
+        key: tasks with the same key are executed in order.
+        elapsed: execution time in seconds, None until finished.
+        error: the exception raised by the function, if any.
+    """
+
+    def __init__(self, key, func, args, kwargs):
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.elapsed = None
+        self.error = None
+        self._result = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def run(self):
+        start = time.time()
+        try:
+            self._result = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            _logger.debug(e, exc_info=True)
+            self.error = e
+        finally:
+            self.elapsed = time.time() - start
+            with self._lock:
+                self._done.set()
+                callbacks, self._callbacks = self._callbacks, []
+            for callback in callbacks:
+                self._call(callback)
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            _logger.info("Task callback failed: %s" % e)
+            _logger.debug(e, exc_info=True)
+
+    def add_done_callback(self, callback):
+        """Call callback(task) once the task is finished.
+
+        The callback is called by the thread which finished the task, or at
+        once if the task is already finished.
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Wait until the task is finished.
+
+        Returns:
+            True if finished, False if timed out.
+        """
+        return self._done.wait(timeout)
+
+    def result(self, timeout=None):
+        """Wait and return the result, re-raise the error if any."""
+        self._done.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self._result
+
+
+class KeyedExecutor(object):
+    """A bounded thread pool which serializes the tasks of the same key.
+
+    Tasks with different keys (e.g. interfaces) run concurrently on at most
+    `workers` threads, tasks with the same key run one by one in the order
+    they were submitted.
+    """
+
+    def __init__(self, workers=4, name="executor"):
+        self._ready = Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._threads = []
+        for idx in range(0, max(1, workers)):
+            thread = threading.Thread(target=self._worker,
+                                      name="%s-%d" % (name, idx))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, func, *args, **kwargs):
+        """Schedule func(*args, **kwargs) after the other tasks of key.
+
+        Returns:
+            A Task.
+        """
+        task = Task(key, func, args, kwargs)
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].append(task)
+                return task
+            self._pending[key] = deque()
+        self._ready.put(task)
+        return task
+
+    def after(self, tasks, func, *args, **kwargs):
+        """Schedule func(*args, **kwargs) after all the tasks are finished.
+
+        func is called by the worker which finished the last task, before
+        the worker picks the next task of that key.
+
+        Returns:
+            A Task (without key).
+        """
+        task = Task(None, func, args, kwargs)
+        remaining = [len(tasks)]
+        lock = threading.Lock()
+
+        def finished(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            task.run()
+
+        if not tasks:
+            task.run()
+        for item in tasks:
+            item.add_done_callback(finished)
+        return task
+
+    def busy(self, key):
+        """Check if there is any task of key running or waiting."""
+        with self._lock:
+            return key in self._pending
+
+    def _worker(self):
+        while True:
+            task = self._ready.get()
+            if task is None:
+                return
+            task.run()
+            with self._lock:
+                queue = self._pending[task.key]
+                if queue:
+                    self._ready.put(queue.popleft())
+                else:
+                    self._pending.pop(task.key)
+                    if not self._pending:
+                        self._idle.notify_all()
+
+    def join(self):
+        """Wait until all the submitted tasks are finished."""
+        with self._lock:
+            while self._pending:
+                self._idle.wait()
+
+    def shutdown(self, wait=True):
+        """Stop the workers after the submitted tasks are finished."""
+        with self._lock:
+            pending = [x for queue in self._pending.values() for x in queue]
+        for task in pending:
+            task.wait()
+        for _ in self._threads:
+            self._ready.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import json
+import time
+import logging
+import threading
+
+
+_logger = logging.getLogger("sanji.ethernet.journal")
+
+
+class Journal(object):
+    """An append-only log of the records changed since the last snapshot.
+
+    Each line is a whole record in JSON, so replaying the journal onto any
+    older snapshot results in the latest records; a line torn by a power
+    loss is dropped with the following ones. The owner writes the snapshot
+    and then truncates the journal when `due` returns True (compaction).
+
+    Args:
+        path: the journal file, next to the snapshot.
+        max_bytes: compact once the journal grows beyond this size.
+        max_age: compact once the oldest record is older than this (in
+            seconds).
+    """
+
+    def __init__(self, path, max_bytes=65536, max_age=3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._file = open(path, "a")
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._since = time.time() if self._size else None
+
+    @property
+    def size(self):
+        return self._size
+
+    def append(self, records):
+        """Append the records and flush them to the storage.
+
+        Args:
+            records: a list of dicts with an "id".
+        """
+        if not records:
+            return
+        data = "".join(json.dumps(x, sort_keys=True) + "\n"
+                       for x in records)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size += len(data)
+            if self._since is None:
+                self._since = time.time()
+
+    def replay(self):
+        """Read the records in the journal.
+
+        Returns:
+            The latest version of each record, in the order they were
+            first written.
+        """
+        records = {}
+        order = []
+        with self._lock:
+            with open(self.path) as f:
+                for lineno, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                        key = record["id"]
+                    except (ValueError, TypeError, KeyError):
+                        _logger.info("%s:%d: broken record, the rest of "
+                                     "the journal is dropped." %
+                                     (self.path, lineno))
+                        break
+                    if key not in records:
+                        order.append(key)
+                    records[key] = record
+        return [records[x] for x in order]
+
+    def due(self):
+        """Check if the journal should be compacted."""
+        if self._size >= self.max_bytes:
+            return True
+        return self._since is not None and \
+            time.time() - self._since >= self.max_age
+
+    def truncate(self):
+        """Drop the records, once they are written into the snapshot."""
+        with self._lock:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._size = 0
+            self._since = None
+
+    def close(self):
+        with self._lock:
+            self._file.close()
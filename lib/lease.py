@@ -0,0 +1,282 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import re
+import time
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import calendar
+import logging
+import threading
+
+
+_logger = logging.getLogger("sanji.ethernet.lease")
+
+DEFAULT_PATH = "/var/lib/dhcp"
+LEASE_FILE = "dhclient.%s.leases"
+
+_LEASE_FILE = re.compile(r"^dhclient\.(.+)\.leases$")
+_STATEMENT = re.compile(r"^\s*(option\s+)?([\w-]+)\s+(.*?);\s*(#.*)?$")
+
+# inotify(7)
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_NONBLOCK = os.O_NONBLOCK
+_INOTIFY_EVENT = struct.Struct("=iIII")
+
+# the bytes before the parsed offset, to tell if the file is rewritten
+_TAIL = 64
+
+
+def _expiry(value):
+    """Convert the "expire" value of a lease into seconds since the epoch,
+    None if the lease never expires."""
+    if value.startswith("never"):
+        return None
+    if value.startswith("epoch"):
+        return int(value.split()[1])
+    # "<weekday> yyyy/mm/dd hh:mm:ss" in UTC
+    _, date, clock = value.split()[:3]
+    return calendar.timegm(time.strptime(
+        "%s %s" % (date, clock), "%Y/%m/%d %H:%M:%S"))
+
+
+def parse(text):
+    """Parse the lease blocks written by dhclient.
+
+    Returns:
+        (leases, length), the leases of the complete blocks and the length
+        of text they take. A lease is a dict, for example:
+
+        {"interface": "eth0", "ip": "192.168.31.3", "netmask": "...",
+         "gateway": "192.168.31.254", "dns": ["8.8.8.8"],
+         "expire": 1760000000}
+    """
+    leases = []
+    length = 0
+    lease = None
+    offset = 0
+    for line in text.splitlines(True):
+        offset += len(line)
+        if not line.endswith("\n"):
+            break
+        stripped = line.strip()
+        if lease is None:
+            if stripped.startswith("lease"):
+                lease = {"dns": [], "gateway": "", "expire": None}
+            continue
+        if stripped == "}":
+            if "ip" in lease and "netmask" in lease:
+                leases.append(lease)
+            lease = None
+            length = offset
+            continue
+
+        match = _STATEMENT.match(line)
+        if not match:
+            continue
+        key, value = match.group(2), match.group(3).strip("\"")
+        try:
+            if "interface" == key:
+                lease["interface"] = value
+            elif "fixed-address" == key:
+                lease["ip"] = value
+            elif "subnet-mask" == key:
+                lease["netmask"] = value
+            elif "routers" == key:
+                lease["gateway"] = value.split(",")[0].strip()
+            elif "domain-name-servers" == key:
+                lease["dns"] = [x.strip() for x in value.split(",")]
+            elif "expire" == key:
+                lease["expire"] = _expiry(value)
+        except (ValueError, IndexError) as e:
+            _logger.debug("Cannot parse \"%s\": %s" % (line.strip(), e))
+    return leases, length
+
+
+class _Inotify(object):
+    """The inotify(7) API of libc."""
+
+    def __init__(self, path, mask):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        if libc.inotify_add_watch(self.fd, path, mask) < 0:
+            code = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(code, os.strerror(code))
+
+    def read(self, timeout):
+        """Wait for the events.
+
+        Returns:
+            A list of the file names changed.
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 4096)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        names = []
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            names.append(data[offset:offset + length].rstrip("\0"))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LeaseWatcher(threading.Thread):
+    """Watch the lease files of dhclient, the new leases are parsed as soon
+    as they are written.
+
+    The directory is watched by inotify, or polled every `interval`
+    seconds if inotify is not available. Each file is parsed from where it
+    was parsed last time, unless it is rewritten by dhclient. The leases
+    written before the watcher is started and the expired ones are skipped.
+
+    Args:
+        path: The directory of the lease files, see `lease_file`.
+        callback: Called as callback(iface, lease) with the latest lease of
+            an interface, see parse().
+        interval: Seconds between the polls.
+    """
+
+    def __init__(self, path, callback, interval=1.0):
+        super(LeaseWatcher, self).__init__(name="lease-watcher")
+        self.daemon = True
+        self.path = path
+        self.interval = interval
+        self.mode = None
+        self._callback = callback
+        self._files = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        for name in self._names():
+            self._skip(name)
+
+    def lease_file(self, iface):
+        """The lease file to be given to dhclient (-lf) for an interface."""
+        return os.path.join(self.path, LEASE_FILE % iface)
+
+    def _names(self):
+        try:
+            return [x for x in os.listdir(self.path) if _LEASE_FILE.match(x)]
+        except OSError:
+            return []
+
+    def _skip(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                text = f.read()
+                stat = os.fstat(f.fileno())
+        except (IOError, OSError):
+            return
+        _, length = parse(text)
+        self._files[name] = (stat.st_ino, length, text[:length][-_TAIL:],
+                             len(text))
+
+    def scan(self, name):
+        """Parse the new leases of a lease file.
+
+        Args:
+            name: File name, e.g. "dhclient.eth0.leases".
+
+        Returns:
+            The latest lease, None if there is no new valid lease.
+        """
+        match = _LEASE_FILE.match(name)
+        if not match:
+            return None
+        with self._lock:
+            try:
+                with open(os.path.join(self.path, name)) as f:
+                    ino = os.fstat(f.fileno()).st_ino
+                    inode, offset, tail, _ = \
+                        self._files.get(name, (ino, 0, "", 0))
+                    # rewritten or truncated, parse it from the beginning
+                    f.seek(max(offset - len(tail), 0))
+                    if inode != ino or f.read(len(tail)) != tail:
+                        _logger.debug("%s: rewritten." % name)
+                        offset, tail = 0, ""
+                    f.seek(offset)
+                    text = f.read()
+            except (IOError, OSError):
+                self._files.pop(name, None)
+                return None
+
+            leases, length = parse(text)
+            if length:
+                tail = (tail + text[:length])[-_TAIL:]
+            self._files[name] = (ino, offset + length, tail,
+                                 offset + len(text))
+
+        now = time.time()
+        leases = [x for x in leases if x["expire"] is None or
+                  x["expire"] > now]
+        if not leases:
+            return None
+        lease = leases[-1]
+        iface = lease.get("interface", match.group(1))
+        try:
+            self._callback(iface, lease)
+        except Exception as e:
+            _logger.info("%s: cannot handle the lease: %s" % (iface, e))
+            _logger.debug(e, exc_info=True)
+        return lease
+
+    def run(self):
+        try:
+            inotify = _Inotify(self.path, IN_MODIFY | IN_CLOSE_WRITE |
+                               IN_MOVED_TO | IN_CREATE)
+            self.mode = "inotify"
+        except Exception as e:
+            _logger.info("Cannot watch %s by inotify, poll it instead: %s"
+                         % (self.path, e))
+            inotify = None
+            self.mode = "poll"
+
+        try:
+            while not self._stop_event.is_set():
+                if inotify:
+                    names = set(inotify.read(self.interval))
+                else:
+                    self._stop_event.wait(self.interval)
+                    names = self._changed()
+                for name in sorted(names):
+                    self.scan(name)
+        finally:
+            if inotify:
+                inotify.close()
+
+    def _changed(self):
+        names = []
+        for name in self._names():
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            state = self._files.get(name)
+            if state is None or state[0] != stat.st_ino or \
+                    state[3] != stat.st_size:
+                names.append(name)
+        return names
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(self.interval + 1)
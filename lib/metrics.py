@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import time
+import bisect
+import logging
+import inspect
+import threading
+from functools import wraps
+
+
+_logger = logging.getLogger("sanji.ethernet.metrics")
+
+# upper bounds of the latency buckets in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0)
+
+ROUTE = "route"
+PRIMITIVE = "primitive"
+
+_FAMILIES = {
+    ROUTE: ("method", "resource"),
+    PRIMITIVE: ("primitive",)
+}
+
+_HELP = {
+    ROUTE: "Latency of the request handlers in seconds.",
+    PRIMITIVE: "Latency of the interface and route primitives in seconds."
+}
+
+
+class Histogram(object):
+    """Latencies counted into the buckets, with their sum and count."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"") \
+        .replace("\n", "\\n")
+
+
+def _labels(names, values, extra=None):
+    pairs = ["%s=\"%s\"" % (k, _escape(v)) for k, v in zip(names, values)]
+    if extra:
+        pairs.append("%s=\"%s\"" % extra)
+    return "{%s}" % ",".join(pairs)
+
+
+class Registry(object):
+    """The latency histograms and error counters of the routes and the
+    primitives.
+
+    Args:
+        prefix: prefix of the metric names.
+    """
+
+    def __init__(self, prefix="ethernet", buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._histograms = dict((x, {}) for x in _FAMILIES)
+            self._errors = dict((x, {}) for x in _FAMILIES)
+
+    def observe(self, family, labels, elapsed):
+        """Count a call.
+
+        Args:
+            family: ROUTE or PRIMITIVE.
+            labels: a tuple of the family's label values.
+            elapsed: latency in seconds.
+        """
+        with self._lock:
+            histogram = self._histograms[family].get(labels)
+            if histogram is None:
+                histogram = self._histograms[family][labels] = \
+                    Histogram(self.buckets)
+            histogram.observe(elapsed)
+
+    def error(self, family, labels):
+        """Count a failed call."""
+        with self._lock:
+            errors = self._errors[family]
+            errors[labels] = errors.get(labels, 0) + 1
+
+    def histogram(self, family, labels):
+        """Retrieve the histogram of a route or primitive, None if it is
+        never called."""
+        return self._histograms[family].get(labels)
+
+    def errors(self, family, labels):
+        return self._errors[family].get(labels, 0)
+
+    def render(self):
+        """Render the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for family in sorted(_FAMILIES):
+                names = _FAMILIES[family]
+                name = "%s_%s_duration_seconds" % (self.prefix, family)
+                lines.append("# HELP %s %s" % (name, _HELP[family]))
+                lines.append("# TYPE %s histogram" % name)
+                for labels, hist in sorted(self._histograms[family].items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ("+Inf",),
+                                            hist.counts):
+                        cumulative += count
+                        lines.append("%s_bucket%s %d" % (
+                            name, _labels(names, labels, ("le", bound)),
+                            cumulative))
+                    lines.append("%s_sum%s %.6f" % (
+                        name, _labels(names, labels), hist.sum))
+                    lines.append("%s_count%s %d" % (
+                        name, _labels(names, labels), hist.count))
+
+                name = "%s_%s_errors_total" % (self.prefix, family)
+                lines.append("# HELP %s Failed calls." % name)
+                lines.append("# TYPE %s counter" % name)
+                for labels, count in sorted(self._errors[family].items()):
+                    lines.append("%s%s %d" % (
+                        name, _labels(names, labels), count))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def timed(func, family, labels, registry=REGISTRY):
+    """Wrap func to count its calls, the exceptions raised are counted as
+    errors."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            registry.error(family, labels)
+            raise
+        finally:
+            registry.observe(family, labels, time.time() - start)
+    wrapper._metrics_wrapped = func
+    return wrapper
+
+
+def instrument(obj, names, prefix, registry=REGISTRY):
+    """Replace the functions or methods of a module or class by the timed
+    ones, the ones already replaced are skipped.
+
+    Args:
+        obj: a module or class.
+        names: attribute names of the functions.
+        prefix: e.g. "ip.addr", the primitive is labelled as "ip.addr.name".
+    """
+    for name in names:
+        func = obj.__dict__[name]
+        if hasattr(func, "_metrics_wrapped"):
+            continue
+        setattr(obj, name, timed(func, PRIMITIVE, ("%s.%s" % (prefix, name),),
+                                 registry))
+
+
+def functions(module):
+    """List the public functions defined in a module."""
+    return [name for name, value in inspect.getmembers(module)
+            if inspect.isfunction(value) and not name.startswith("_") and
+            value.__module__ == module.__name__]
+
+
+def instrument_routes(router, registry=REGISTRY):
+    """Replace the request handlers of a sanji router by the timed ones.
+
+    The responses with code 400 or above are counted as errors, along with
+    the exceptions raised by the handlers.
+    """
+    for resource, route in router.routes.items():
+        for handler in route.handlers:
+            callback = handler["callback"]
+            if hasattr(callback, "_metrics_wrapped"):
+                continue
+            labels = (handler["method"], resource)
+            handler["callback"] = _timed_handler(callback, labels, registry)
+
+
+def _timed_handler(callback, labels, registry):
+    def respond(response):
+        def _response(code=200, data=None):
+            if code >= 400:
+                registry.error(ROUTE, labels)
+            return response(code=code, data=data)
+        return _response
+
+    timed_callback = timed(callback, ROUTE, labels, registry)
+
+    # sanji tells the requests' handlers from the events' ones by the
+    # number of arguments
+    if len(inspect.getargspec(callback).args) >= 3:
+        def handler(self, message, response):
+            return timed_callback(self, message, respond(response))
+    else:
+        def handler(self, message):
+            return timed_callback(self, message)
+    handler._metrics_wrapped = callback
+    return handler
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import sys
+import time
+import pstats
+import cProfile
+import inspect
+import logging
+import itertools
+import threading
+
+
+_logger = logging.getLogger("sanji.ethernet.profiler")
+
+MODE_CPROFILE = "cprofile"
+MODE_SAMPLE = "sample"
+MODES = (MODE_CPROFILE, MODE_SAMPLE)
+
+# seconds, the profiling is always bounded
+MAX_DURATION = 300
+
+# the result files started within the same second are told apart
+_sequence = itertools.count(1)
+
+
+class Sampler(threading.Thread):
+    """Sample the stacks of all threads periodically, the samples are
+    counted by the collapsed stacks, e.g. "apply-0;ethernet.py:apply 3".
+
+    Args:
+        interval: seconds between the samples.
+    """
+
+    def __init__(self, interval=0.005):
+        super(Sampler, self).__init__(name="profile-sampler")
+        self.daemon = True
+        self.interval = interval
+        self.stacks = {}
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s:%s" % (
+                        os.path.basename(code.co_filename), code.co_name))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(1)
+
+    def collapsed(self):
+        """Render the samples in the collapsed stack format of the flame
+        graph tools."""
+        return "".join("%s %d\n" % (k, v)
+                       for k, v in sorted(self.stacks.items()))
+
+
+class Profiler(object):
+    """Profile the bundle for a bounded window, then write the results into
+    a directory.
+
+    In the "cprofile" mode, only the calls of the functions wrapped by
+    `wrap` are profiled, each call by its own cProfile.Profile since they
+    run in different threads; the results are merged into one pstats file.
+    In the "sample" mode, all threads are sampled and a collapsed stack
+    file is written.
+
+    Args:
+        path: directory of the result files.
+        mode: "cprofile" or "sample".
+        duration: seconds before stopping automatically, at most
+            MAX_DURATION.
+        on_stop: called without arguments once stopped.
+    """
+
+    def __init__(self, path, mode=MODE_CPROFILE, duration=60, on_stop=None):
+        if mode not in MODES:
+            raise ValueError("Unknown profiling mode: %s." % mode)
+        if not 0 < duration <= MAX_DURATION:
+            raise ValueError("Invalid profiling duration: %s, at most %ds." %
+                             (duration, MAX_DURATION))
+        self.path = path
+        self.mode = mode
+        self.duration = duration
+        self.started = None
+        self.files = []
+        self._on_stop = on_stop
+        self._lock = threading.Lock()
+        self._stats = None
+        self._sampler = None
+        self._timer = None
+
+    @property
+    def running(self):
+        return self.started is not None
+
+    def start(self):
+        with self._lock:
+            if self.started is not None:
+                return
+            self.started = time.time()
+            if self.mode == MODE_SAMPLE:
+                self._sampler = Sampler()
+                self._sampler.start()
+            self._timer = threading.Timer(self.duration, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        _logger.info("Profiling (%s) for %ss." % (self.mode, self.duration))
+
+    def stop(self):
+        """Stop profiling and write the result.
+
+        Returns:
+            A list of the written files.
+        """
+        with self._lock:
+            if self.started is None:
+                return []
+            prefix = os.path.join(self.path, "%s-%d-%d" % (
+                time.strftime("profile-%Y%m%d-%H%M%S",
+                              time.localtime(self.started)),
+                os.getpid(), next(_sequence)))
+            self.started = None
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+            files = []
+            if self._sampler:
+                self._sampler.stop()
+                with open(prefix + ".collapsed", "w") as f:
+                    f.write(self._sampler.collapsed())
+                files.append(prefix + ".collapsed")
+                self._sampler = None
+            if self._stats:
+                self._stats.dump_stats(prefix + ".pstats")
+                files.append(prefix + ".pstats")
+                self._stats = None
+            self.files.extend(files)
+
+        _logger.info("Profiled into %s." % ", ".join(files or ["nothing"]))
+        if self._on_stop:
+            self._on_stop()
+        return files
+
+    def call(self, func, *args, **kwargs):
+        """Call func, profiled if it is in the "cprofile" mode."""
+        if self.mode != MODE_CPROFILE or self.started is None:
+            return func(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                if self.started is not None:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profile)
+                    else:
+                        self._stats.add(profile)
+
+    def wrap(self, func):
+        """Wrap a function, or a sanji request/event handler, to be
+        profiled."""
+        # sanji tells the requests' handlers from the events' ones by the
+        # number of arguments
+        if inspect.isfunction(func) and \
+                len(inspect.getargspec(func).args) == 2:
+            def wrapper(self_, message):
+                return self.call(func, self_, message)
+        elif inspect.isfunction(func):
+            def wrapper(self_, message, response):
+                return self.call(func, self_, message, response)
+        else:
+            def wrapper(*args, **kwargs):
+                return self.call(func, *args, **kwargs)
+        wrapper._profiled = func
+        return wrapper
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import re
+import copy
+import logging
+from ip import ipv4
+
+
+_logger = logging.getLogger("sanji.ethernet.provision")
+
+# "eth0", or a VLAN sub-interface such as "eth0.100"
+IFACE_PATTERN = re.compile(r"^eth(\d+)(?:\.(\d+))?$")
+
+
+def is_ethernet(name):
+    """Check if the interface is managed by this bundle."""
+    return IFACE_PATTERN.match(name) is not None
+
+
+def sort_key(name):
+    """Sort the interfaces by port and VLAN ("eth2" < "eth2.5" < "eth10")."""
+    port, vlan = IFACE_PATTERN.match(name).groups()
+    return (int(port), -1 if vlan is None else int(vlan))
+
+
+class AddressPool(object):
+    """Allocate one subnet per interface from an address pool.
+
+    The n-th interface gets the (first + n)-th subnet of the pool, with the
+    same host part for the address and gateway in every subnet.
+
+    Args:
+        network: the pool, for example "192.168.0.0/16".
+        prefixlen: prefix length of the subnets.
+        host: host part of the interfaces' address.
+        gateway: host part of the gateway, 0 for no gateway.
+        first: index of the first subnet to be allocated.
+
+    Raises:
+        ValueError: invalid pool.
+    """
+
+    def __init__(self, network, prefixlen=24, host=127, gateway=254,
+                 first=0):
+        try:
+            address, length = network.split("/")
+            length = int(length)
+        except ValueError:
+            raise ValueError("Invalid address pool \"%s\"." % network)
+        if not 0 <= length <= prefixlen <= 32:
+            raise ValueError("Invalid address pool \"%s\"." % network)
+        self.network = ipv4.aton(address) & ipv4.mask(length)
+        self.length = length
+        self.prefixlen = prefixlen
+        self.netmask = ipv4.netmask(prefixlen)
+        self.size = 1 << (32 - prefixlen)
+        self.count = (1 << (prefixlen - length)) - first
+        self.host = host
+        self.gateway = gateway
+        self.first = first
+
+    def __len__(self):
+        return max(self.count, 0)
+
+    @classmethod
+    def from_template(cls, template, network=None):
+        """Create the pool around the template's address.
+
+        By default the first interface gets the template's subnet, and the
+        following ones the next subnets in the template's /16 (for a /24
+        template).
+
+        Args:
+            template: the factory record with "ip", "netmask" and "gateway".
+            network: the pool, overrides the default one.
+        """
+        prefixlen = ipv4.prefixlen(template["netmask"])
+        subnet = ipv4.aton(template["ip"]) & ipv4.mask(prefixlen)
+        if network is None:
+            network = "%s/%d" % (ipv4.ntoa(subnet), max(prefixlen - 8, 0))
+        pool = cls(network, prefixlen)
+
+        pool.host = ipv4.aton(template["ip"]) - subnet
+        pool.gateway = 0
+        if template.get("gateway"):
+            gateway = ipv4.aton(template["gateway"])
+            if gateway & ipv4.mask(prefixlen) == subnet:
+                pool.gateway = gateway - subnet
+        if subnet & ipv4.mask(pool.length) == pool.network:
+            pool.first = (subnet - pool.network) // pool.size
+            pool.count -= pool.first
+        return pool
+
+    def address(self, index):
+        """Retrieve the addresses for the index-th interface.
+
+        Returns:
+            A dict with "ip", "netmask", "subnet" and "gateway", or None if
+            the pool is exhausted.
+        """
+        if not 0 <= index < len(self):
+            return None
+        subnet = self.network + (self.first + index) * self.size
+        return {
+            "ip": ipv4.ntoa(subnet + self.host),
+            "netmask": self.netmask,
+            "subnet": ipv4.ntoa(subnet),
+            "gateway": ipv4.ntoa(subnet + self.gateway) if self.gateway
+            else ""
+        }
+
+
+def provision(template, ifaces, links=None, pool=None):
+    """Build the factory configuration of the interfaces.
+
+    The ports ("ethN") keep the id N + 1, the VLAN sub-interfaces get the
+    ids after the ports'. The interfaces beyond the address pool are
+    disabled without any address.
+
+    Args:
+        template: the factory record.
+        ifaces: a list of interfaces name.
+        links: MAC address and link status by interface name, see
+            ip.addr.links().
+        pool: an AddressPool, created from the template if not given.
+
+    Returns:
+        A list of records ordered by id.
+    """
+    links = links or {}
+    if pool is None:
+        pool = AddressPool.from_template(template)
+
+    ifaces = sorted(ifaces, key=sort_key)
+    ids = {}
+    for name in ifaces:
+        port, vlan = IFACE_PATTERN.match(name).groups()
+        if vlan is None:
+            ids[name] = int(port) + 1
+    next_id = max(ids.values() or [0]) + 1
+    for name in ifaces:
+        if name not in ids:
+            ids[name] = next_id
+            next_id += 1
+
+    records = []
+    unaddressed = 0
+    for name in sorted(ifaces, key=lambda x: ids[x]):
+        db = copy.deepcopy(template)
+        db["name"] = name
+        db["id"] = ids[name]
+
+        address = pool.address(db["id"] - 1)
+        if address is None:
+            unaddressed += 1
+            db["enable"] = False
+            address = {"ip": "", "netmask": "", "subnet": "", "gateway": ""}
+        db.update(address)
+
+        link = links.get(name, {})
+        db["status"] = True if link.get("link") == 1 else False
+        db["mac"] = link.get("mac", "")
+        records.append(db)
+
+    if unaddressed:
+        _logger.info("Address pool exhausted, %d interface(s) disabled." %
+                     unaddressed)
+    return records
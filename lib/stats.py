@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+from ip import sysfs
+
+
+_logger = logging.getLogger("sanji.ethernet.stats")
+
+# the counters of the rates
+_RATES = (
+    ("rxBps", "rx_bytes", 8),
+    ("txBps", "tx_bytes", 8),
+    ("rxPps", "rx_packets", 1),
+    ("txPps", "tx_packets", 1)
+)
+
+# the counters read by default, the ones of the rates
+COUNTERS = tuple(x[1] for x in _RATES)
+
+
+class StatsSampler(threading.Thread):
+    """Sample the traffic counters of the interfaces periodically.
+
+    The counters are read from "/sys/class/net/<iface>/statistics", whose
+    files are kept open between the samples, one file per counter and
+    interface. The last `size` samples of each interface are kept in a ring
+    buffer, so the counters and rates are served without reading the
+    kernel.
+
+    Args:
+        ifaces: The interfaces' names.
+        interval: Seconds between the samples.
+        size: Number of samples kept per interface.
+        root: The sysfs directory of the interfaces.
+        counters: The counters' names, only the ones of the rates if None.
+    """
+
+    def __init__(self, ifaces, interval=1.0, size=60, root=sysfs.SYSFS_NET,
+                 counters=None):
+        super(StatsSampler, self).__init__(name="stats-sampler")
+        self.daemon = True
+        counters = counters or COUNTERS
+        self.interval = interval
+        self.size = size
+        self._files = dict(
+            (x, sysfs.Attributes(os.path.join(root, x, "statistics"),
+                                 counters))
+            for x in ifaces)
+        self._samples = dict((x, deque(maxlen=size)) for x in ifaces)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def sample(self):
+        """Take a sample of all interfaces."""
+        for iface, files in self._files.items():
+            try:
+                counters = files.read()
+            except (IOError, OSError) as e:
+                _logger.debug("%s: cannot read the statistics: %s"
+                              % (iface, e))
+                continue
+            with self._lock:
+                self._samples[iface].append((time.time(), counters))
+
+    def samples(self, iface):
+        """The samples of an interface, from the oldest to the latest.
+
+        Returns:
+            A list of (timestamp, counters).
+        """
+        with self._lock:
+            return list(self._samples.get(iface, []))
+
+    def stats(self, iface):
+        """The latest counters and the rates between the last two samples
+        of an interface.
+
+        Returns:
+            None if there is no sample yet, otherwise for example:
+
+            {"timestamp": 1760000000.0, "interval": 1.0,
+             "counters": {"rx_bytes": 1024, ...},
+             "rates": {"rxBps": 8192.0, "txBps": 0.0, "rxPps": 1.0,
+                       "txPps": 0.0}}
+        """
+        with self._lock:
+            samples = self._samples.get(iface)
+            if not samples:
+                return None
+            latest = samples[-1]
+            previous = samples[-2] if len(samples) > 1 else None
+
+        rates = dict((x[0], 0.0) for x in _RATES)
+        interval = 0.0
+        if previous:
+            interval = latest[0] - previous[0]
+        if interval > 0:
+            for name, counter, scale in _RATES:
+                delta = latest[1].get(counter, 0) - \
+                    previous[1].get(counter, 0)
+                # the counters are reset by the driver
+                if delta > 0:
+                    rates[name] = delta * scale / interval
+        return {
+            "timestamp": latest[0],
+            "interval": interval,
+            "counters": latest[1],
+            "rates": rates
+        }
+
+    def run(self):
+        while True:
+            self.sample()
+            if self._stop_event.wait(self.interval):
+                break
+        for files in self._files.values():
+            files.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(self.interval + 1)
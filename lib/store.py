@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+import threading
+
+
+class IndexedStore(object):
+    """Index the interface records of `ModelInitiator.db` by id and name.
+
+    The records are kept in `model.db` (a list) as before, so the file
+    layout and `save_db`/`backup_db` are not affected. Every change of the
+    records must go through `append`, `replace` or `update`, and `reindex`
+    must be called whenever `model.db` is replaced.
+
+    Args:
+        model: a ModelInitiator instance.
+
+    Attributes:
+        version: Increased by every change of the records.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_name = {}
+        self._changed = set()
+        self.version = 0
+        self.reindex()
+
+    @property
+    def lock(self):
+        """The lock held while the records are changed."""
+        return self._lock
+
+    def __iter__(self):
+        return iter(self.model.db)
+
+    def __len__(self):
+        return len(self.model.db)
+
+    def reindex(self):
+        """Rebuild the indexes from `model.db`."""
+        with self._lock:
+            self._by_id = {}
+            self._by_name = {}
+            for record in self.model.db or []:
+                self._index(record)
+            self.version += 1
+
+    def _index(self, record):
+        if "id" in record:
+            self._by_id[record["id"]] = record
+        if "name" in record:
+            self._by_name[record["name"]] = record
+
+    def by_id(self, id):
+        """Retrieve the record by interface id, None if not found."""
+        return self._by_id.get(id)
+
+    def by_name(self, name):
+        """Retrieve the record by interface name, None if not found."""
+        return self._by_name.get(name)
+
+    def append(self, record):
+        """Add a new record to `model.db`."""
+        with self._lock:
+            self.model.db.append(record)
+            self._index(record)
+            self._changed.add(record.get("id"))
+            self.version += 1
+
+    def replace(self, record):
+        """Replace the record with the same id, or add it if not found."""
+        with self._lock:
+            current = self._by_id.get(record["id"])
+            if current is None:
+                return self.append(record)
+            name = current.get("name")
+            current.clear()
+            current.update(record)
+            if self._by_name.get(name) is current and \
+                    current.get("name") != name:
+                self._by_name.pop(name)
+            self._index(current)
+            self._changed.add(record["id"])
+            self.version += 1
+
+    def changed(self):
+        """Retrieve and reset the ids of the records changed since the last
+        call."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            return changed
+
+    def update(self, id, func, *args):
+        """Update a record in place.
+
+        Args:
+            id: interface id.
+            func: called as func(record, *args) to modify the record.
+
+        Returns:
+            The return value of func.
+
+        Raises:
+            KeyError: No such record.
+        """
+        with self._lock:
+            record = self._by_id[id]
+            name = record.get("name")
+            result = func(record, *args)
+            self._changed.add(id)
+            self.version += 1
+            if record.get("name") != name:
+                if self._by_name.get(name) is record:
+                    self._by_name.pop(name)
+                self._index(record)
+            return result
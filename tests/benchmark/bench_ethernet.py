@@ -0,0 +1,516 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Benchmark the Ethernet bundle's handlers with 1 to 1024 interfaces.
+
+The requests and events are dispatched by the bundle's router and the
+responses are published through a Mockup connection, the interfaces are
+provided by a synthetic kernel (no interface is touched and no process is
+forked).
+
+The report gives the latency percentiles, the processes which would be
+forked, the objects retained (garbage collector tracked objects, the cycles
+are not collected while measuring) and, if tracemalloc is available, the
+memory allocated per operation.
+
+Usage:
+
+    python tests/benchmark/bench_ethernet.py -o before.json
+    python tests/benchmark/bench_ethernet.py -o after.json -c before.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+from timeit import default_timer as timer
+from mock import patch
+
+from sanji.connection.mockup import Mockup
+from sanji.message import Message
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../../')
+    import ip.addr
+    import ip.dhcp
+    from ethernet import Ethernet
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+datapath = os.path.realpath("%s/../data" % dirpath)
+
+OPERATIONS = ["get", "get_by_id", "put", "put_by_id", "event_dhcp_info",
+              "event_link_changed", "get_during_put"]
+
+
+class SyntheticKernel(object):
+    """
+    Interfaces kept in memory, replaces the interface related functions of
+    ip.addr and serves as its backend.
+    """
+
+    name = "synthetic"
+
+    def __init__(self, count):
+        self.ifaces = {}
+        for idx in range(0, count):
+            self.ifaces["eth%d" % idx] = {
+                "mac": "02:00:00:00:%02x:%02x" % (idx >> 8, idx & 0xff),
+                "link": True,
+                "up": False,
+                "address": None
+            }
+        self.ops = 0
+
+    def interfaces(self):
+        return ["lo"] + sorted(self.ifaces.keys())
+
+    def ifaddresses(self, iface):
+        if iface not in self.ifaces:
+            raise ValueError("You must specify a valid interface name.")
+        state = self.ifaces[iface]
+        info = {"mac": state["mac"],
+                "link": state["up"] and state["link"],
+                "inet": []}
+        if state["address"]:
+            address, prefix, broadcast = state["address"]
+            subnet, _, _ = ip.ipv4.network(address, prefix)
+            info["inet"].append({"ip": address,
+                                 "netmask": ip.ipv4.netmask(prefix),
+                                 "subnet": subnet,
+                                 "broadcast": broadcast})
+        return info
+
+    def exists(self, iface):
+        return iface in self.ifaces
+
+    def link(self, iface, up):
+        self.ops += 1
+        self.ifaces[iface]["up"] = up
+
+    def configure(self, iface, address=None):
+        self.ops += 1
+        self.ifaces[iface]["address"] = address
+        self.ifaces[iface]["up"] = True
+
+
+class CountingSh(object):
+    """Replaces the sh module, counts the processes which would be forked."""
+
+    def __init__(self):
+        self.calls = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def command(*args, **kwargs):
+            self.calls[name] = self.calls.get(name, 0) + 1
+            return ""
+        return command
+
+    def count(self):
+        return sum(self.calls.values())
+
+
+class FakeProcess(object):
+    """A process which would be forked, it runs until the benchmark is
+    finished."""
+
+    def __init__(self, pid, finished):
+        self.pid = pid
+        self._finished = finished
+
+    def wait(self):
+        self._finished.wait()
+        return 0
+
+
+class CountingSubprocess(object):
+    """Replaces the subprocess module of ip.dhcp, counts the processes which
+    would be forked."""
+
+    def __init__(self):
+        self.calls = {}
+        self.finished = threading.Event()
+        self._pids = iter(xrange(1 << 22, 1 << 23))
+
+    def _count(self, args):
+        name = os.path.basename(args[0])
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def Popen(self, args, **kwargs):
+        self._count(args)
+        return FakeProcess(next(self._pids), self.finished)
+
+    def call(self, args, **kwargs):
+        self._count(args)
+        return 0
+
+    def count(self):
+        return sum(self.calls.values())
+
+
+class BenchConnection(Mockup):
+    """
+    A Mockup connection which keeps the responses, the publishing is
+    acknowledged by acknowledge() at once.
+    """
+
+    def __init__(self):
+        super(BenchConnection, self).__init__()
+        self.published = 0
+        self.responses = {}
+        self._responded = threading.Condition()
+
+    def publish(self, **kwargs):
+        with self._responded:
+            self.published += 1
+            mid = self.published & 0xffff
+            payload = kwargs.get("payload", {})
+            if "sign" in payload:
+                self.responses[payload["id"]] = payload
+                self._responded.notify_all()
+        return mid
+
+    def response(self, id, timeout=10):
+        """Waits for the response of a request."""
+        deadline = timer() + timeout
+        with self._responded:
+            while id not in self.responses and timer() < deadline:
+                self._responded.wait(deadline - timer())
+            return self.responses.pop(id, None)
+
+    def acknowledge(self, bundle):
+        """Resolves the sessions without waiting for the session thread."""
+        def _wait_published(session, no_response=False):
+            bundle._session.resolve(session["message"].id)
+            return session
+        bundle.publish._wait_published = _wait_published
+
+
+class ErrorCounter(logging.Handler):
+    """Counts the errors logged by the dispatcher."""
+
+    def __init__(self):
+        logging.Handler.__init__(self, level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return 0.0
+    rank = int(round(pct / 100.0 * len(samples) + 0.5)) - 1
+    return samples[max(0, min(rank, len(samples) - 1))]
+
+
+def address_of(id, turn):
+    """A static address which differs between two turns."""
+    return "10.%d.%d.%d" % (id >> 8, id & 0xff, 1 + turn % 2)
+
+
+class Benchmark(object):
+
+    def __init__(self, count, iterations, warmup, backend):
+        self.count = count
+        self.iterations = iterations
+        self.warmup = warmup
+        self.backend = backend
+        self.turn = 0
+
+    def request(self, method, resource, data=None, wait=True):
+        message = Message({"id": self.turn, "method": method,
+                           "resource": resource, "data": data})
+        self.bundle._Sanji__dispatch_message(message)
+        if not wait:
+            return
+        resp = self.conn.response(self.turn)
+        if resp is None or resp["code"] != 200:
+            raise ValueError("%s %s: %s" % (method, resource, resp))
+
+    def event(self, method, resource, data=None):
+        message = Message({"code": 200, "method": method,
+                           "resource": resource, "data": data})
+        self.bundle._Sanji__dispatch_event_message(message)
+
+    def settings(self, id):
+        return {"id": id, "enable": True, "enableDhcp": False,
+                "ip": address_of(id, self.turn), "netmask": "255.255.255.0",
+                "gateway": "", "dns": []}
+
+    def op_get(self):
+        self.request("get", "/network/ethernets")
+
+    def op_get_by_id(self):
+        self.request("get",
+                     "/network/ethernets/%d" % (self.turn % self.count + 1))
+
+    def op_put(self):
+        self.request("put", "/network/ethernets",
+                     [self.settings(id) for id in range(1, self.count + 1)])
+        self.bundle.executor.join()
+
+    def op_get_during_put(self):
+        """Only the GET is measured, the settings are applied meanwhile."""
+        self.request("put", "/network/ethernets",
+                     [self.settings(id) for id in range(1, self.count + 1)],
+                     wait=False)
+        self.turn += 1
+        start = timer()
+        self.request("get", "/network/ethernets")
+        elapsed = timer() - start
+        self.bundle.executor.join()
+        self.conn.responses.clear()
+        return elapsed
+
+    def op_put_by_id(self):
+        id = self.turn % self.count + 1
+        self.request("put", "/network/ethernets/%d" % id, self.settings(id))
+        self.bundle.executor.join()
+
+    def op_event_dhcp_info(self):
+        id = self.turn % self.count + 1
+        self.event("put", "/network/interfaces/eth%d" % (id - 1),
+                   {"type": "eth", "ip": address_of(id, self.turn),
+                    "netmask": "255.255.255.0", "gateway": "", "dns": []})
+
+    def op_event_link_changed(self):
+        """The link event is published once debounced, at once here."""
+        self.event("put", "/network/ethernets?name=eth%d" %
+                   (self.turn % self.count), {"link": True})
+        self.bundle.link_coalescer.flush()
+
+    def install(self):
+        """Installs a configuration with a static address per interface."""
+        db = []
+        for id in range(1, self.count + 1):
+            iface = "eth%d" % (id - 1)
+            info = self.settings(id)
+            info.update({"name": iface, "wan": False,
+                         "subnet": ip.ipv4.network(info["ip"], 24)[0],
+                         "mac": self.kernel.ifaces[iface]["mac"],
+                         "status": True})
+            db.append(info)
+        with open("%s/ethernet.json" % datapath, "w") as f:
+            json.dump(db, f)
+
+    def measure(self, name):
+        func = getattr(self, "op_%s" % name)
+        for _ in range(0, self.warmup):
+            self.turn += 1
+            func()
+
+        errors = self.errors.count
+        forks = self.forks()
+        kernel_ops = self.kernel.ops
+        published = self.conn.published
+        samples = []
+
+        gc.collect()
+        gc.disable()
+        objects = len(gc.get_objects())
+        if tracemalloc:
+            tracemalloc.start()
+        try:
+            for _ in range(0, self.iterations):
+                self.turn += 1
+                start = timer()
+                elapsed = func()
+                samples.append(timer() - start if elapsed is None
+                               else elapsed)
+            if tracemalloc:
+                allocated, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            objects = len(gc.get_objects()) - objects
+        finally:
+            gc.enable()
+
+        samples.sort()
+        n = float(self.iterations)
+        result = {
+            "iterations": self.iterations,
+            "mean_ms": sum(samples) / n * 1000,
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p90_ms": percentile(samples, 90) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+            "max_ms": samples[-1] * 1000,
+            "retained_objects_per_op": objects / n,
+            "subprocesses_per_op": (self.forks() - forks) / n,
+            "kernel_ops_per_op": (self.kernel.ops - kernel_ops) / n,
+            "published_per_op": (self.conn.published - published) / n,
+            "errors": self.errors.count - errors
+        }
+        if tracemalloc:
+            result["allocated_kb_per_op"] = allocated / 1024.0 / n
+            result["peak_kb"] = peak / 1024.0
+        return result
+
+    def forks(self):
+        """The processes which would be forked, by the "ip" commands and
+        dhclient."""
+        return self.sh.count() + self.subprocess.count()
+
+    def run(self, operations):
+        self.kernel = SyntheticKernel(self.count)
+        self.sh = CountingSh()
+        self.subprocess = CountingSubprocess()
+        self.errors = ErrorCounter()
+        logging.getLogger("sanji.sdk").addHandler(self.errors)
+
+        # the fake clients are neither signalled nor restarted
+        patches = [patch.object(ip.addr, "sh", self.sh),
+                   patch.object(ip.dhcp, "subprocess", self.subprocess),
+                   patch.object(ip.dhcp, "_alive", lambda pid: False),
+                   patch.object(ip.addr, "_supervisor",
+                                ip.dhcp.Supervisor(restart_delay=None)),
+                   patch.object(ip.addr, "interfaces",
+                                self.kernel.interfaces),
+                   patch.object(ip.addr, "ifaddresses",
+                                self.kernel.ifaddresses)]
+        if "synthetic" == self.backend:
+            patches.append(patch.object(ip.addr, "_backend", self.kernel))
+        else:
+            patches.append(patch.object(ip.addr, "_backend",
+                                        ip.addr.ShBackend()))
+        for item in patches:
+            item.start()
+        cleanup()
+        self.install()
+        try:
+            self.conn = BenchConnection()
+            start = timer()
+            self.bundle = Ethernet(connection=self.conn)
+            self.conn.acknowledge(self.bundle)
+            report = {"startup_s": timer() - start,
+                      "bringup_s": self.bundle.bringup_timings["total"],
+                      "startup_subprocesses": self.forks(),
+                      "operations": {}}
+            for name in operations:
+                report["operations"][name] = self.measure(name)
+            self.bundle.stop()
+            return report
+        finally:
+            self.subprocess.finished.set()
+            logging.getLogger("sanji.sdk").removeHandler(self.errors)
+            for item in reversed(patches):
+                item.stop()
+            cleanup()
+
+
+def cleanup():
+    for name in ["ethernet.json", "ethernet.json.backup"]:
+        try:
+            os.remove("%s/%s" % (datapath, name))
+        except OSError:
+            pass
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=dirpath, stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(base, report):
+    """Prints the latency changes between two reports."""
+    print "%-6s %-20s %10s %10s %8s %10s %10s %8s" % (
+        "ifaces", "operation", "p50 base", "p50", "ratio", "p99 base", "p99",
+        "ratio")
+    for count in sorted(report["results"], key=int):
+        if count not in base["results"]:
+            continue
+        for name in OPERATIONS:
+            try:
+                old = base["results"][count]["operations"][name]
+                new = report["results"][count]["operations"][name]
+            except KeyError:
+                continue
+            print "%-6s %-20s %10.3f %10.3f %8.2f %10.3f %10.3f %8.2f" % (
+                count, name,
+                old["p50_ms"], new["p50_ms"],
+                new["p50_ms"] / old["p50_ms"] if old["p50_ms"] else 0,
+                old["p99_ms"], new["p99_ms"],
+                new["p99_ms"] / old["p99_ms"] if old["p99_ms"] else 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-s", "--scales", default="1,16,128,1024",
+                        help="numbers of interfaces (default: %(default)s)")
+    parser.add_argument("-n", "--iterations", type=int, default=100,
+                        help="iterations per operation (default: "
+                        "%(default)s)")
+    parser.add_argument("-w", "--warmup", type=int, default=5,
+                        help="unmeasured iterations per operation "
+                        "(default: %(default)s)")
+    parser.add_argument("-b", "--backend", default="synthetic",
+                        choices=["synthetic", "sh"],
+                        help="ip.addr backend, \"sh\" counts the \"ip\" "
+                        "commands too (default: %(default)s)")
+    parser.add_argument("-O", "--operations", default=",".join(OPERATIONS),
+                        help="operations to be measured")
+    parser.add_argument("-o", "--output", default="benchmark.json",
+                        help="JSON report (default: %(default)s)")
+    parser.add_argument("-c", "--compare",
+                        help="a previous JSON report to be compared with")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    operations = [x for x in args.operations.split(",") if x]
+    for name in operations:
+        if name not in OPERATIONS:
+            parser.error("unknown operation \"%s\"" % name)
+
+    report = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "host": socket.gethostname(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "backend": args.backend,
+        "iterations": args.iterations,
+        "results": {}
+    }
+    for count in [int(x) for x in args.scales.split(",")]:
+        print "%d interface(s)..." % count
+        bench = Benchmark(count, args.iterations, args.warmup, args.backend)
+        report["results"][str(count)] = bench.run(operations)
+        for name in operations:
+            result = report["results"][str(count)]["operations"][name]
+            print "  %-20s p50 %8.3fms  p99 %8.3fms  %6.1f forks/op" % (
+                name, result["p50_ms"], result["p99_ms"],
+                result["subprocesses_per_op"])
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print "Report written to %s" % args.output
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import time
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib.coalesce import Coalescer
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestCoalescerClass(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.coalescer = None
+
+    def tearDown(self):
+        if self.coalescer:
+            self.coalescer.stop()
+
+    def callback(self, key, suppressed):
+        self.calls.append((key, suppressed, time.time()))
+
+    def wait_calls(self, count, timeout=3):
+        deadline = time.time() + timeout
+        while len(self.calls) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test__trigger__no_window(self):
+        """
+        trigger: called back at once without window
+        """
+        self.coalescer = Coalescer(0, self.callback)
+        self.coalescer.trigger("eth0")
+        self.coalescer.trigger("eth0")
+        self.assertEqual([("eth0", 0), ("eth0", 0)],
+                         [x[:2] for x in self.calls])
+
+    def test__trigger__burst(self):
+        """
+        trigger: a burst is called back once it is settled
+        """
+        self.coalescer = Coalescer(0.1, self.callback)
+        start = time.time()
+        for _ in range(0, 10):
+            self.coalescer.trigger("eth0")
+            self.coalescer.trigger("eth1")
+        self.coalescer.trigger("eth0")
+        self.assertEqual([], self.calls)
+        self.wait_calls(2)
+        time.sleep(0.2)
+        self.assertEqual([("eth0", 10), ("eth1", 9)],
+                         sorted(x[:2] for x in self.calls))
+        self.assertTrue(self.calls[0][2] - start >= 0.1)
+
+    def test__trigger__max_delay(self):
+        """
+        trigger: a key triggered continuously is called back by max_delay
+        """
+        self.coalescer = Coalescer(0.1, self.callback, max_delay=0.3)
+        start = time.time()
+        while time.time() - start < 0.6 and not self.calls:
+            self.coalescer.trigger("eth0")
+            time.sleep(0.02)
+        self.wait_calls(1)
+        self.assertEqual("eth0", self.calls[0][0])
+        self.assertTrue(self.calls[0][2] - start < 0.5)
+
+    def test__flush(self):
+        """
+        flush: call back the waiting keys at once
+        """
+        self.coalescer = Coalescer(10, self.callback)
+        self.coalescer.trigger("eth0")
+        self.coalescer.trigger("eth0")
+        self.assertTrue(self.coalescer.pending("eth0"))
+        self.coalescer.flush()
+        self.assertEqual([("eth0", 1)], [x[:2] for x in self.calls])
+        self.assertFalse(self.coalescer.pending("eth0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
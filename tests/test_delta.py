@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib.delta import DeltaPublisher
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestDeltaPublisherClass(unittest.TestCase):
+
+    def setUp(self):
+        self.published = []
+
+    def publish(self, resource, data):
+        self.published.append((resource, data))
+
+    def test__init__invalid_mode(self):
+        with self.assertRaises(ValueError):
+            DeltaPublisher(self.publish, mode="diff")
+
+    def test__put__full(self):
+        events = DeltaPublisher(self.publish)
+        data = {"name": "eth0", "ip": "192.168.3.127", "status": True}
+        events.put("/network/interfaces/eth0", data)
+        events.put("/network/interfaces/eth0", data)
+        self.assertEqual([("/network/interfaces/eth0", data)] * 2,
+                         self.published)
+        self.assertEqual(0, events.version("/network/interfaces/eth0"))
+        # nothing is kept
+        self.assertEqual({}, events._snapshots)
+
+        events.resync("/network/interfaces/eth0", data)
+        self.assertEqual(("/network/interfaces/eth0", data),
+                         self.published[-1])
+
+    def test__put__delta(self):
+        events = DeltaPublisher(self.publish, mode="delta")
+        events.put("/network/interfaces/eth0",
+                   {"name": "eth0", "ip": "192.168.3.127", "status": True,
+                    "dns": ["8.8.8.8"]})
+        events.put("/network/interfaces/eth0",
+                   {"name": "eth0", "ip": "192.168.3.127", "status": False,
+                    "dns": ["8.8.8.8"]})
+        # nothing changed
+        events.put("/network/interfaces/eth0",
+                   {"name": "eth0", "status": False})
+        events.put("/network/interfaces/eth1", {"name": "eth1"})
+
+        self.assertEqual(3, len(self.published))
+        self.assertEqual(
+            {"name": "eth0", "ip": "192.168.3.127", "status": True,
+             "dns": ["8.8.8.8"], "version": 1, "delta": False},
+            self.published[0][1])
+        self.assertEqual(
+            {"name": "eth0", "status": False, "version": 2, "delta": True},
+            self.published[1][1])
+        self.assertEqual(
+            {"name": "eth1", "version": 1, "delta": False},
+            self.published[2][1])
+        self.assertEqual(2, events.version("/network/interfaces/eth0"))
+
+    def test__put__delta_nested(self):
+        """
+        put: the nested values are compared to the published ones, not to
+        the caller's objects
+        """
+        events = DeltaPublisher(self.publish, mode="delta")
+        data = {"name": "eth0", "dns": ["8.8.8.8"]}
+        events.put("/network/interfaces/eth0", data)
+        data["dns"].append("8.8.4.4")
+        events.put("/network/interfaces/eth0", data)
+        self.assertEqual(["8.8.8.8", "8.8.4.4"], self.published[1][1]["dns"])
+
+    def test__resync(self):
+        events = DeltaPublisher(self.publish, mode="delta")
+        events.put("/network/interfaces/eth0",
+                   {"name": "eth0", "ip": "192.168.3.127", "status": True})
+        events.put("/network/interfaces/eth0",
+                   {"name": "eth0", "status": False})
+        events.resync("/network/interfaces/eth0", {"mac": "78:ac:c0:c1:a8:fe"})
+
+        self.assertEqual(
+            {"name": "eth0", "ip": "192.168.3.127", "status": False,
+             "mac": "78:ac:c0:c1:a8:fe", "version": 3, "delta": False},
+            self.published[2][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,13 @@
 
 import os
 import sys
+import time
 import logging
+import threading
+import subprocess
 import unittest
 from mock import patch
+from mock import Mock
 
 from sanji.connection.mockup import Mockup
 from sanji.message import Message
@@ -14,6 +18,11 @@ from sanji.message import Message
 try:
     sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
     from ethernet import Ethernet
+    from ethernet import merged
+    from lib import channel
+    from lib.coalesce import Coalescer
+    from lib.delta import DeltaPublisher
+    from lib import metrics
 except ImportError as e:
     print os.path.dirname(os.path.realpath(__file__)) + '/../'
     print sys.path
@@ -74,6 +83,11 @@ class TestEthernetClass(unittest.TestCase):
         except OSError:
             pass
 
+        try:
+            os.remove("%s/data/%s.json.journal" % (dirpath, self.name))
+        except OSError:
+            pass
+
     @patch("ethernet.ip.interfaces")
     def test__init__no_iface(self, mock_interfaces):
         """
@@ -122,6 +136,34 @@ class TestEthernetClass(unittest.TestCase):
         self.bundle.load(dirpath, ifaces)
         self.assertEqual(2, len(self.bundle.model.db))
 
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    @patch("ethernet.ip.links")
+    def test__load__factory_vlan(self, mock_links, mock_ifaddresses,
+                                 mock_ifconfig, mock_ifupdown):
+        """
+        load: factory install with a VLAN sub-interface
+        """
+        mock_links.return_value = {
+            "eth0": {"mac": "78:ac:c0:c1:a8:fe", "link": True},
+            "eth0.100": {"mac": "78:ac:c0:c1:a8:fe", "link": True},
+            "eth1": {"mac": "78:ac:c0:c1:a8:ff", "link": False}}
+        os.remove("%s/data/%s.json" % (dirpath, self.name))
+        os.remove("%s/data/%s.json.backup" % (dirpath, self.name))
+
+        self.bundle.load(dirpath, ["eth0.100", "eth1", "eth0"])
+        self.assertFalse(mock_ifaddresses.called)
+        iface = self.bundle.store.by_name("eth0.100")
+        self.assertEqual(3, iface["id"])
+        self.assertEqual("192.168.5.127", iface["ip"])
+        self.assertEqual(True, iface["status"])
+
+        self.bundle.apply(iface)
+        mock_ifconfig.assert_called_once_with(
+            "eth0.100", False, "192.168.5.127", "255.255.255.0",
+            "192.168.5.254")
+
     def test__load__no_conf(self):
         """
         load: no configuration file
@@ -130,6 +172,104 @@ class TestEthernetClass(unittest.TestCase):
         with self.assertRaises(Exception):
             self.bundle.load("%s/mock" % dirpath, [])
 
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__bring_up(self, mock_ifconfig, mock_ifupdown):
+        """
+        bring_up: apply all interfaces and report the timings
+        """
+        timings = self.bundle.bring_up(workers=2)
+        self.assertEqual(2, mock_ifconfig.call_count)
+        self.assertEqual(["eth0", "eth1"], sorted(timings["interfaces"]))
+        self.assertTrue(timings["total"] >= 0)
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__bring_up__error(self, mock_ifconfig, mock_ifupdown):
+        """
+        bring_up: the other interfaces are applied even if one failed
+        """
+        def mock_ifconfig_eth0(iface, *args, **kwargs):
+            if "eth0" == iface:
+                raise ValueError("Device \"eth0\" does not exist.")
+        mock_ifconfig.side_effect = mock_ifconfig_eth0
+
+        with self.assertRaises(ValueError):
+            self.bundle.bring_up()
+        self.assertEqual(2, mock_ifconfig.call_count)
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__bring_up__background(self, mock_ifconfig, mock_ifupdown):
+        """
+        bring_up: applied by the executor, ahead of the later settings
+        """
+        applied = []
+        mock_ifconfig.side_effect = \
+            lambda iface, *args, **kwargs: applied.append(iface)
+
+        task = self.bundle.bring_up(background=True)
+        self.bundle.executor.submit("eth0", applied.append, "put")
+        timings = task.result()
+        self.bundle.executor.join()
+        self.assertEqual(["eth0", "eth1"], sorted(timings["interfaces"]))
+        self.assertLess(applied.index("eth0"), applied.index("put"))
+
+    def test__import(self):
+        """
+        import: the modules not used by every start are imported lazily
+        """
+        script = ("import sys, time; start = time.time(); import ethernet; "
+                  "print time.time() - start; "
+                  "print sorted(x for x in ('sh', 'paho', 'netifaces') "
+                  "if x in sys.modules)")
+        output = subprocess.check_output(
+            [sys.executable, "-c", script], cwd="%s/.." % dirpath)
+        elapsed, modules = output.splitlines()
+        logging.getLogger("sanji.ethernet").info(
+            "imported in %.3fs" % float(elapsed))
+        self.assertEqual("[]", modules)
+
+    @patch("ethernet.ip.interfaces")
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    def test__init__fast_start(self, mock_ifaddresses, mock_ifconfig,
+                               mock_ifupdown, mock_interfaces):
+        """
+        init: fast-start, answer by the loaded configuration while the
+        interfaces are brought up
+        """
+        mock_interfaces.return_value = ["eth0", "eth1"]
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        mock_ifconfig.side_effect = lambda *args, **kwargs: time.sleep(0.5)
+        self.bundle.stop()
+
+        start = time.time()
+        self.bundle = Ethernet(connection=Mockup())
+        normal = time.time() - start
+        self.bundle.stop()
+
+        with patch.dict(os.environ, {"ETHERNET_FAST_START": "1"}):
+            start = time.time()
+            self.bundle = Ethernet(connection=Mockup())
+            fast = time.time() - start
+
+        def resp(code=200, data=None):
+            self.assertEqual(200, code)
+            self.assertEqual(2, len(data))
+        message = Message({"query": {}, "param": {}})
+        self.bundle.get(message, response=resp, test=True)
+        answered = time.time() - start
+
+        logging.getLogger("sanji.ethernet").info(
+            "started in %.3fs, %.3fs in fast-start (answered in %.3fs)" %
+            (normal, fast, answered))
+        self.assertGreaterEqual(normal, 0.5)
+        self.assertLess(answered, 0.5)
+        self.bundle.executor.join()
+        self.assertEqual(4, mock_ifconfig.call_count)
+
     def test__save(self):
         """
         save: tested in init()
@@ -137,6 +277,33 @@ class TestEthernetClass(unittest.TestCase):
         # Already tested in init()
         pass
 
+    @patch("ethernet.ip.ifaddresses")
+    def test__save__journal(self, mock_ifaddresses):
+        """
+        save: changes are appended to the journal and replayed by load
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        with patch.dict(os.environ, {"ETHERNET_JOURNAL": "1"}):
+            self.bundle.load(dirpath, ["eth0", "eth1"])
+
+        with patch.object(self.bundle.model, "save_db") as mock_save_db:
+            for ip in ["192.168.41.3", "192.168.41.4"]:
+                self.bundle.dhcp_info("eth1", {
+                    "ip": ip, "netmask": "255.255.255.0",
+                    "gateway": "192.168.41.254", "dns": []})
+            self.assertFalse(mock_save_db.called)
+        self.assertTrue(self.bundle.journal.size > 0)
+
+        # power loss: the snapshot is not written
+        journal, self.bundle.journal = self.bundle.journal, None
+        journal.close()
+        with patch.dict(os.environ, {"ETHERNET_JOURNAL": "1"}):
+            self.bundle.load(dirpath, ["eth0", "eth1"])
+        self.assertEqual("192.168.41.4", self.bundle.store.by_id(2)["ip"])
+        self.assertEqual(0, self.bundle.journal.size)
+        with open("%s/data/%s.json" % (dirpath, self.name)) as f:
+            self.assertIn("192.168.41.4", f.read())
+
     @patch("ethernet.ip.ifupdown")
     @patch("ethernet.ip.ifconfig")
     def test__apply__iface_down(self, mock_ifconfig, mock_ifupdown):
@@ -196,6 +363,60 @@ class TestEthernetClass(unittest.TestCase):
             mock_ifconfig.side_effect = ValueError
             self.bundle.apply(data)
 
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__apply__no_change(self, mock_ifconfig, mock_ifupdown):
+        """
+        apply: nothing to be applied for the fields stored only
+        """
+        data = dict(self.bundle.store.by_id(1))
+        applied = self.bundle.applied_settings(1)
+        data["dns"] = ["8.8.8.8"]
+        data["wan"] = not data["wan"]
+        self.bundle.apply(data, applied)
+        self.assertFalse(mock_ifupdown.called)
+        self.assertFalse(mock_ifconfig.called)
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__apply__ip_changed(self, mock_ifconfig, mock_ifupdown):
+        """
+        apply: only the address is reconfigured if the IP is changed
+        """
+        data = dict(self.bundle.store.by_id(1))
+        applied = self.bundle.applied_settings(1)
+        data["ip"] = "192.168.31.39"
+        self.bundle.apply(data, applied)
+        self.assertFalse(mock_ifupdown.called)
+        mock_ifconfig.assert_called_once_with(
+            "eth0", False, "192.168.31.39", data["netmask"], data["gateway"])
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__apply__dhcp_unchanged(self, mock_ifconfig, mock_ifupdown):
+        """
+        apply: the address of a dhcp interface is maintained by dhclient
+        """
+        applied = {"enable": True, "enableDhcp": True, "ip": "192.168.31.3"}
+        data = {"id": 1, "enable": True, "enableDhcp": True,
+                "ip": "192.168.31.4"}
+        self.bundle.apply(data, applied)
+        self.assertFalse(mock_ifconfig.called)
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__apply__dhcp_lease_file(self, mock_ifconfig, mock_ifupdown):
+        """
+        apply: dhclient writes the leases to the watched lease file
+        """
+        data = {"id": 2, "name": "eth1", "enable": True, "enableDhcp": True}
+        self.bundle.apply(data)
+        mock_ifconfig.assert_called_once_with(
+            "eth1", True, script="%s/hooks/dhclient-script" %
+            self.bundle.path_root,
+            lease_file="%s/data/dhclient.eth1.leases" % dirpath,
+            env={"ETHERNET_LEASE_WATCH": "1"})
+
     @patch("ethernet.ip.ifaddresses")
     def test__read(self, mock_ifaddresses):
         """
@@ -207,6 +428,44 @@ class TestEthernetClass(unittest.TestCase):
         self.assertEqual(True, data["status"])
         self.assertEqual("78:ac:c0:c1:a8:fe", data["mac"])
 
+    @patch("ethernet.ip.ifaddresses")
+    def test__read__settings_unchanged(self, mock_ifaddresses):
+        """
+        read: the overlays don't modify the stored settings
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+
+        data = self.bundle.read(1, config=False)
+        data["ip"] = "192.168.31.100"
+        record = self.bundle.store.by_id(1)
+        self.assertEqual("192.168.3.127", record["ip"])
+
+    def test__merged(self):
+        """
+        merged: copy-on-write merge
+        """
+        dest = {"id": 1, "dns": ["8.8.8.8"], "opt": {"a": 1, "b": 2}}
+        result = merged(dest, {"opt": {"a": 3}, "ip": "192.168.31.36"})
+        self.assertEqual({"a": 1, "b": 2}, dest["opt"])
+        self.assertNotIn("ip", dest)
+        self.assertEqual({"a": 3, "b": 2}, result["opt"])
+        self.assertIs(dest["dns"], result["dns"])
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__read__cached(self, mock_ifaddresses):
+        """
+        read: live status is cached until invalidated
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+
+        self.bundle.read(1)
+        self.bundle.read(1)
+        self.assertEqual(1, mock_ifaddresses.call_count)
+
+        self.bundle.ifcache.invalidate("eth0")
+        self.bundle.read(1)
+        self.assertEqual(2, mock_ifaddresses.call_count)
+
     @patch("ethernet.ip.ifaddresses")
     def test__read__unknown_iface(self, mock_ifaddresses):
         """
@@ -233,6 +492,87 @@ class TestEthernetClass(unittest.TestCase):
             self.assertEqual(2, len(data))
         self.bundle.get(message=message, response=resp, test=True)
 
+    @patch("ethernet.ip.ifaddresses")
+    def test__get__etag(self, mock_ifaddresses):
+        """
+        get (/network/ethernets?etag=): not modified until the settings or
+        the link status are changed
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+
+        def get(query=None, headers=None):
+            message = Message({"data": {}, "query": query or {},
+                               "param": {}})
+            if headers:
+                message.headers = headers
+            self.bundle.get(message=message, response=resp, test=True)
+            return responses[-1]
+
+        code, data = get({"etag": ""})
+        self.assertEqual(200, code)
+        self.assertEqual(2, len(data["collection"]))
+        etag = data["etag"]
+        self.assertEqual((304, {"etag": etag}), get({"etag": etag}))
+        self.assertEqual((304, {"etag": etag}),
+                         get(headers={"If-None-Match": etag}))
+        self.assertEqual(2, len(get()[1]))
+
+        # settings changed
+        self.bundle.merge_info({"id": 1, "gateway": "192.168.31.254"})
+        code, data = get({"etag": etag})
+        self.assertEqual(200, code)
+        self.assertNotEqual(etag, data["etag"])
+        etag = data["etag"]
+
+        # link changed
+        def link_up(iface):
+            info = mock_ip_ifaddresses(iface)
+            info["link"] = True
+            return info
+        mock_ifaddresses.side_effect = link_up
+        self.bundle.ifcache.invalidate("eth1")
+        code, data = get({"etag": etag})
+        self.assertEqual(200, code)
+        self.assertTrue(data["collection"][1]["status"])
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    def test__get__etag__put(self, mock_ifaddresses, mock_ifconfig,
+                             mock_ifupdown):
+        """
+        get (/network/ethernets?etag=): modified by a PUT in between
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        self.bundle.publish.event.put = lambda resource, data: None
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+
+        def get(etag):
+            message = Message({"data": {}, "query": {"etag": etag},
+                               "param": {}})
+            self.bundle.get(message=message, response=resp, test=True)
+            return responses[-1]
+
+        etag = get("")[1]["etag"]
+        message = Message({"data": {"id": 1, "enable": True,
+                                    "enableDhcp": False,
+                                    "ip": u"192.168.31.45"},
+                           "query": {}, "param": {"id": 1}})
+        self.bundle.put_by_id(message, response=resp, test=True)
+        self.bundle.executor.join()
+        self.assertEqual(200, responses[-1][0])
+
+        code, data = get(etag)
+        self.assertEqual(200, code)
+        self.assertEqual("192.168.31.45", data["collection"][0]["ip"])
+
     @patch("ethernet.ip.ifaddresses")
     def test__get__by_id(self, mock_ifaddresses):
         """
@@ -338,6 +678,28 @@ class TestEthernetClass(unittest.TestCase):
         message.data.append({"id": 0, "enable": True})
         self.bundle.put(message, response=resp, test=True)
 
+    def test__schema_validate__ip(self):
+        """
+        schema_validate: IP address, netmask and gateway are validated
+        """
+        count = Ethernet.validate_stats["count"]
+        data = {"id": 1, "enable": True, "enableDhcp": False,
+                "ip": "192.168.31.36", "netmask": "255.255.255.0",
+                "gateway": "", "dns": ["8.8.8.8"]}
+        Ethernet.schema_validate(Message({"data": dict(data)}))
+
+        for key, value in [("ip", "192.168.31.256"), ("ip", "192.168.31"),
+                           ("netmask", "255.0.255.0"),
+                           ("gateway", "192.168.a.1")]:
+            invalid = dict(data)
+            invalid[key] = value
+            with self.assertRaises(KeyError):
+                Ethernet.schema_validate(Message({"data": invalid}))
+
+        with self.assertRaises(KeyError):
+            Ethernet.schema_validate(Message({"data": [data, {"id": 2}]}))
+        self.assertEqual(count + 6, Ethernet.validate_stats["count"])
+
     # @patch("ethernet.time.sleep")
     @patch("ethernet.ip.ifupdown")
     @patch("ethernet.ip.ifconfig")
@@ -345,7 +707,8 @@ class TestEthernetClass(unittest.TestCase):
     def test__put__partial_success(self, mock_ifaddresses, mock_ifconfig,
                                    mock_ifupdown):
         """
-        put (/network/ethernets): one interface is not exist
+        put (/network/ethernets): one interface does not exist and another
+        one cannot be applied, the results are responded once applied
         "data": [
             {
                 "id": 1,
@@ -354,6 +717,10 @@ class TestEthernetClass(unittest.TestCase):
             {
                 "id": 2,
                 ...
+            },
+            {
+                "id": 3,
+                ...
             }
         ]
         """
@@ -362,21 +729,40 @@ class TestEthernetClass(unittest.TestCase):
         self.bundle.publish.put = mock_put
         self.bundle.publish.event.put = mock_put
 
-        # case: one interface is not exist (bulk); exist one will be updated
+        def mock_ifconfig_eth1(iface, *args, **kwargs):
+            if "eth1" == iface:
+                raise ValueError("Device \"eth1\" does not exist.")
+        mock_ifconfig.side_effect = mock_ifconfig_eth1
+
         message = Message({"data": [], "query": {}, "param": {}})
+        responses = []
 
-        # always true for response reply before apply the settings
         def resp(code=200, data=None):
-            self.assertEqual(200, code)
+            responses.append((code, data))
         message.data.append(
             {"id": 1,
              "enable": True,
              "enableDhcp": False,
              "ip": u"192.168.31.36"})
+        message.data.append(
+            {"id": 2,
+             "enable": True,
+             "enableDhcp": False,
+             "ip": u"192.168.41.36"})
         message.data.append({"id": 3, "enable": True, "enableDhcp": False})
         self.bundle.put(message, response=resp, test=True)
+        self.bundle.executor.join()
+
+        self.assertEqual(1, len(responses))
+        code, data = responses[0]
+        self.assertEqual(207, code)
+        self.assertEqual([(1, 200), (2, 500), (3, 404)],
+                         [(x["id"], x["code"]) for x in data])
+        self.assertIn("eth1", data[1]["message"])
+        self.assertEqual("No such device.", data[2]["message"])
         data = self.bundle.read(1, config=True)
         self.assertEqual("192.168.31.36", data["ip"])
+        self.assertNotEqual("192.168.41.36", self.bundle.read(2)["ip"])
 
     @patch("ethernet.ip.ifupdown")
     @patch("ethernet.ip.ifconfig")
@@ -446,12 +832,43 @@ class TestEthernetClass(unittest.TestCase):
             pass
         self.bundle.publish.event.put = mock_event_put
         self.bundle.put(message, response=resp, test=True)
+        self.bundle.executor.join()
 
         data = self.bundle.read(1, config=True)
         self.assertEqual("192.168.31.37", data["ip"])
         data = self.bundle.read(2, config=True)
         self.assertEqual("192.168.41.37", data["ip"])
 
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    def test__submit_bulk(self, mock_ifconfig, mock_ifupdown):
+        """
+        submit_bulk: save once, report the result of each item
+        """
+        def mock_event_put(resource, data):
+            pass
+        self.bundle.publish.event.put = mock_event_put
+
+        def mock_ifconfig_eth1(iface, *args, **kwargs):
+            if "eth1" == iface:
+                raise ValueError("Device \"eth1\" does not exist.")
+        mock_ifconfig.side_effect = mock_ifconfig_eth1
+
+        items = [
+            {"id": 1, "enable": True, "enableDhcp": False,
+             "ip": "192.168.31.38"},
+            {"id": 2, "enable": True, "enableDhcp": False,
+             "ip": "192.168.41.38"},
+            {"id": 3, "enable": True, "enableDhcp": False}]
+        with patch.object(self.bundle.model, "save_db") as mock_save_db:
+            results = self.bundle.submit_bulk(items).result()
+            self.assertEqual(1, mock_save_db.call_count)
+
+        self.assertEqual([200, 500, 404], [x["code"] for x in results])
+        self.assertEqual("192.168.31.38", self.bundle.store.by_id(1)["ip"])
+        self.assertNotEqual("192.168.41.38",
+                            self.bundle.store.by_id(2)["ip"])
+
     # @patch("ethernet.time.sleep")
     @patch("ethernet.ip.ifupdown")
     @patch("ethernet.ip.ifconfig")
@@ -476,10 +893,10 @@ class TestEthernetClass(unittest.TestCase):
             pass
         self.bundle.publish.put = mock_put
 
+        responses = []
+
         def resp(code=200, data=None):
-            self.assertEqual(200, code)
-            self.assertEqual(True, data["enable"])
-            self.assertEqual("192.168.31.39", data["ip"])
+            responses.append((code, data))
         message = Message({"data": {}, "query": {}, "param": {}})
         message.param["id"] = 1
         message.data["id"] = 1
@@ -491,6 +908,13 @@ class TestEthernetClass(unittest.TestCase):
             pass
         self.bundle.publish.event.put = mock_event_put
         self.bundle.put(message, response=resp, test=True)
+        self.bundle.executor.join()
+
+        self.assertEqual(1, len(responses))
+        code, data = responses[0]
+        self.assertEqual(200, code)
+        self.assertEqual(True, data["enable"])
+        self.assertEqual("192.168.31.39", data["ip"])
 
     # @patch("ethernet.time.sleep")
     @patch("ethernet.ip.ifupdown")
@@ -557,16 +981,556 @@ class TestEthernetClass(unittest.TestCase):
             pass
         self.bundle.publish.put = mock_put
 
+        responses = []
+
         def resp(code=200, data=None):
-            self.assertEqual(404, code)
+            responses.append(code)
         message.data["id"] = 1
         message.data["enable"] = False
         message.data["enableDhcp"] = False
         message.data["ip"] = u"192.168.31.40"
         self.bundle.put_by_id(message, response=resp, test=True)
+        self.bundle.executor.join()
+        self.assertEqual([404], responses)
         data = self.bundle.read(1, config=True)
         self.assertEqual("192.168.31.40", data["ip"])
 
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    def test__put_by_id__queued(self, mock_ifaddresses, mock_ifconfig,
+                                mock_ifupdown):
+        """
+        put_by_id (/network/ethernets/1): a PUT queued behind another one is
+        staged on the settings stored by the previous one
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        self.bundle.publish.event.put = lambda resource, data: None
+        release = threading.Event()
+        mock_ifconfig.side_effect = lambda *args, **kwargs: release.wait(5)
+
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+        for data in [{"ip": u"10.0.0.5", "netmask": u"255.255.255.0"},
+                     {"netmask": u"255.255.0.0"}]:
+            data.update({"id": 1, "enable": True, "enableDhcp": False})
+            message = Message({"data": data, "query": {}, "param": {"id": 1}})
+            self.bundle.put_by_id(message, response=resp, test=True)
+        release.set()
+        self.bundle.executor.join()
+
+        self.assertEqual([200, 200], [x[0] for x in responses])
+        self.assertEqual(("10.0.0.5", "255.255.0.0"),
+                         (responses[1][1]["ip"], responses[1][1]["netmask"]))
+        data = self.bundle.store.by_id(1)
+        self.assertEqual(("10.0.0.5", "255.255.0.0", "10.0.0.0",
+                          "10.0.255.255"),
+                         (data["ip"], data["netmask"], data["subnet"],
+                          data["broadcast"]))
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    def test__put_by_id__apply_failed(self, mock_ifaddresses, mock_ifconfig,
+                                      mock_ifupdown):
+        """
+        put_by_id (/network/ethernets/1): the settings are not stored if
+        they cannot be applied, and are applied again by the next PUT
+        """
+        self.bundle.publish.event.put = lambda resource, data: None
+        mock_ifconfig.side_effect = [IOError("ifconfig failed"), None]
+        version = self.bundle.store.version
+
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append(code)
+        for _ in range(0, 2):
+            message = Message({"data": {"id": 1, "enable": True,
+                                        "enableDhcp": False,
+                                        "ip": u"192.168.31.44",
+                                        "netmask": u"255.255.255.0"},
+                               "query": {}, "param": {"id": 1}})
+            self.bundle.put_by_id(message, response=resp, test=True)
+            self.bundle.executor.join()
+            if not responses[-1] == 200:
+                self.assertNotEqual("192.168.31.44",
+                                    self.bundle.store.by_id(1)["ip"])
+                self.assertEqual(version, self.bundle.store.version)
+
+        self.assertEqual([404, 200], responses)
+        self.assertEqual(2, mock_ifconfig.call_count)
+        data = self.bundle.store.by_id(1)
+        self.assertEqual("192.168.31.44", data["ip"])
+        self.assertEqual("192.168.31.255", data["broadcast"])
+        self.assertEqual("static", data["mode"])
+        self.assertLess(version, self.bundle.store.version)
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    def test__put_by_id__name(self, mock_ifaddresses, mock_ifconfig,
+                              mock_ifupdown):
+        """
+        put_by_id (/network/ethernets/1): the "name" is dropped, the
+        interface is neither renamed nor another one configured
+        """
+        self.bundle.publish.event.put = lambda resource, data: None
+        message = Message({"data": {"id": 1, "name": "eth1", "enable": True,
+                                    "enableDhcp": False,
+                                    "ip": u"192.168.31.43"},
+                           "query": {}, "param": {"id": 1}})
+        self.bundle.put_by_id(message, response=lambda **kw: None,
+                              test=True)
+        self.bundle.executor.join()
+        self.assertEqual("eth0", self.bundle.store.by_id(1)["name"])
+        self.assertEqual(1, self.bundle.store.by_name("eth0")["id"])
+        self.assertEqual("eth0", mock_ifconfig.call_args[0][0])
+
+    @patch("ethernet.ip.ifupdown")
+    @patch("ethernet.ip.ifconfig")
+    @patch("ethernet.ip.ifaddresses")
+    def test__put_by_id__non_blocking(self, mock_ifaddresses, mock_ifconfig,
+                                      mock_ifupdown):
+        """
+        put_by_id (/network/ethernets/1): reads are served while applying
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        self.bundle.publish.event.put = lambda resource, data: None
+        applying = threading.Event()
+        release = threading.Event()
+
+        def mock_ifconfig_slow(iface, *args, **kwargs):
+            applying.set()
+            release.wait(5)
+        mock_ifconfig.side_effect = mock_ifconfig_slow
+
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append(code)
+        for ip in ["192.168.31.41", "192.168.31.42"]:
+            message = Message({"data": {"enable": True, "enableDhcp": False,
+                                        "ip": ip},
+                               "query": {}, "param": {"id": 1}})
+            self.bundle.put_by_id(message, response=resp, test=True)
+        self.assertTrue(applying.wait(5))
+        self.assertEqual([], responses)
+
+        def get_resp(code=200, data=None):
+            responses.append(code)
+            self.assertEqual(2, len(data))
+        message = Message({"data": {}, "query": {}, "param": {}})
+        self.bundle.get(message=message, response=get_resp, test=True)
+        self.assertEqual([200], responses)
+        self.assertTrue(self.bundle.executor.busy("eth0"))
+
+        release.set()
+        self.bundle.executor.join()
+        self.assertEqual([200, 200, 200], responses)
+        self.assertEqual(2, mock_ifconfig.call_count)
+        self.assertEqual("192.168.31.42", mock_ifconfig.call_args[0][2])
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__event_link_changed(self, mock_ifaddresses):
+        """
+        event_link_changed (/network/ethernets?name=eth1): link changed
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        self.assertEqual(False, self.bundle.read(2)["status"])
+
+        published = []
+
+        def mock_event_put(resource, data):
+            self.assertEqual("/network/interfaces/eth1", resource)
+            self.assertEqual(True, data["status"])
+            published.append(data)
+        self.bundle.publish.event.put = mock_event_put
+
+        mock_ifaddresses.side_effect = None
+        mock_ifaddresses.return_value = {
+            "mac": "78:ac:c0:c1:a8:ff", "link": True, "inet": []}
+        message = Message({"data": {"link": True}, "query": {"name": "eth1"},
+                           "param": {}})
+        self.bundle.event_link_changed(message, test=True)
+        self.assertTrue(self.bundle.link_coalescer.pending("eth1"))
+        self.bundle.link_coalescer.flush()
+        self.assertEqual(1, len(published))
+        self.assertEqual(0, published[0]["suppressed"])
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__event_link_changed__flapping(self, mock_ifaddresses):
+        """
+        event_link_changed (/network/ethernets?name=eth1): flaps coalesced
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        published = []
+
+        def mock_event_put(resource, data):
+            published.append(data)
+        self.bundle.publish.event.put = mock_event_put
+        self.bundle.link_coalescer.stop()
+        self.bundle.link_coalescer = Coalescer(0.2, self.bundle.publish_link)
+
+        message = Message({"data": {}, "query": {"name": "eth1"},
+                           "param": {}})
+        for _ in range(0, 100):
+            self.bundle.event_link_changed(message, test=True)
+        message.query["name"] = "eth9"
+        self.bundle.event_link_changed(message, test=True)
+        self.assertEqual([], published)
+
+        for _ in range(0, 30):
+            if published:
+                break
+            time.sleep(0.1)
+        time.sleep(0.3)
+        self.assertEqual(1, len(published))
+        self.assertEqual(99, published[0]["suppressed"])
+        self.assertEqual("eth1", published[0]["name"])
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__on_channel_event__link(self, mock_ifaddresses):
+        """
+        on_channel_event: link changed
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        published = []
+
+        def mock_event_put(resource, data):
+            published.append(resource)
+        self.bundle.publish.event.put = mock_event_put
+
+        self.bundle.on_channel_event(
+            {"event": "link", "name": "eth1", "link": "1"})
+        self.bundle.link_coalescer.flush()
+        self.assertEqual(["/network/interfaces/eth1"], published)
+
+    def test__on_channel_event__dhcp(self):
+        """
+        on_channel_event: lease information is merged and published
+        """
+        published = []
+
+        def mock_event_put(resource, data):
+            published.append(data)
+        self.bundle.publish.event.put = mock_event_put
+
+        with patch.object(self.bundle.model, "save_db") as mock_save_db:
+            event = {"event": "dhcp", "name": "eth1", "ip": "192.168.41.3",
+                     "netmask": "255.255.255.0", "gateway": "192.168.41.254",
+                     "dns": "8.8.8.8 8.8.4.4"}
+            self.bundle.on_channel_event(event)
+            # lease renewed without any change
+            self.bundle.on_channel_event(event)
+            self.assertEqual(1, mock_save_db.call_count)
+
+        data = self.bundle.store.by_id(2)
+        self.assertEqual("192.168.41.3", data["ip"])
+        self.assertEqual("192.168.41.0", data["subnet"])
+        self.assertEqual(["8.8.8.8", "8.8.4.4"], data["dns"])
+        self.assertEqual("dhcp", published[0]["mode"])
+
+    def test__get_stats(self):
+        """
+        get_stats (/network/ethernets/1/stats): served by the samples
+        """
+        self.bundle.stats = Mock()
+        self.bundle.stats.stats.return_value = {
+            "timestamp": 100.0, "interval": 1.0,
+            "counters": {"rx_bytes": 1024},
+            "rates": {"rxBps": 8192.0, "txBps": 0.0, "rxPps": 1.0,
+                      "txPps": 0.0}}
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+        for id in ("1", "9"):
+            message = Message({"query": {}, "param": {"id": id}})
+            self.bundle.get_stats(message, response=resp, test=True)
+
+        self.bundle.stats.stats.assert_called_once_with("eth0")
+        self.assertEqual(200, responses[0][0])
+        self.assertEqual(1, responses[0][1]["id"])
+        self.assertEqual("eth0", responses[0][1]["name"])
+        self.assertEqual(8192.0, responses[0][1]["rates"]["rxBps"])
+        self.assertEqual(404, responses[1][0])
+
+    def test__get_stats__disabled(self):
+        """
+        get_stats (/network/ethernets/1/stats): disabled by default
+        """
+        self.assertIsNone(self.bundle.stats)
+
+        def resp(code=200, data=None):
+            self.assertEqual(404, code)
+        message = Message({"query": {}, "param": {"id": "1"}})
+        self.bundle.get_stats(message, response=resp, test=True)
+
+    @patch("ethernet.ip.get_supervisor")
+    def test__get_dhclients(self, mock_supervisor):
+        """
+        get_dhclients (/network/ethernets/dhclients): the clients' state
+        """
+        state = [{"name": "eth1", "state": "running", "pid": 1234,
+                  "started": 1760000000, "restarts": 0, "returncode": None}]
+        mock_supervisor.return_value.state.return_value = state
+
+        def resp(code=200, data=None):
+            self.assertEqual(200, code)
+            self.assertEqual(state, data)
+        message = Message({"query": {}, "param": {}})
+        self.bundle.get_dhclients(message, response=resp, test=True)
+
+    def test__get_metrics__disabled(self):
+        """
+        get_metrics (/network/ethernets/metrics): disabled by default
+        """
+        def resp(code=200, data=None):
+            self.assertEqual(404, code)
+        message = Message({"query": {}, "param": {}})
+        self.bundle.get_metrics(message, response=resp, test=True)
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__get_metrics(self, mock_ifaddresses):
+        """
+        get_metrics (/network/ethernets/metrics): the routes are timed
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        self.bundle.instrument(metrics.Registry())
+
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+        for resource in ("/network/ethernets/1", "/network/ethernets/3",
+                         "/network/ethernets/metrics"):
+            message = Message({"resource": resource, "method": "get",
+                               "query": {}, "param": {}})
+            for result in self.bundle.router.dispatch(message):
+                for handler in result["handlers"]:
+                    handler["callback"](self.bundle, result["message"], resp)
+
+        self.assertEqual([200, 404, 200], [x[0] for x in responses])
+        text = responses[2][1]
+        # "metrics" is matched by ":id" as well
+        self.assertIn(
+            "ethernet_route_duration_seconds_count{method=\"get\","
+            "resource=\"/network/ethernets/:id\"} 3", text)
+        self.assertIn(
+            "ethernet_route_errors_total{method=\"get\","
+            "resource=\"/network/ethernets/:id\"} 1", text)
+
+    def test__put_by_id__sub_resources(self):
+        """
+        put_by_id (/network/ethernets/metrics): the sub-resources without
+        a handler of the method are answered by 405
+        """
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+        for method, name in [("put", "metrics"), ("put", "dhclients"),
+                             ("get", "resync")]:
+            message = Message({"resource": "/network/ethernets/%s" % name,
+                               "method": method, "data": {}, "query": {},
+                               "param": {}})
+            for result in self.bundle.router.dispatch(message):
+                for handler in result["handlers"]:
+                    handler["callback"](self.bundle, result["message"], resp)
+        self.assertEqual([405, 405, 405], [x[0] for x in responses])
+
+        # answered by their own handlers only
+        del responses[:]
+        self.bundle.get_by_id(Message({"param": {"id": "dhclients"}}),
+                              response=resp, test=True)
+        message = Message({"data": {}, "param": {"id": "profile"}})
+        self.bundle.put_by_id(message, response=resp, test=True)
+        self.assertEqual([], responses)
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__put_profile(self, mock_ifaddresses):
+        """
+        put_profile (/network/ethernets/profile): the routes are profiled
+        until disabled
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        responses = []
+
+        def resp(code=200, data=None):
+            responses.append((code, data))
+        # unbounded
+        message = Message({"data": {"enable": True, "mode": "cprofile",
+                                    "duration": 0},
+                           "query": {}, "param": {}})
+        self.bundle.put_profile(message, response=resp, test=True)
+        self.assertEqual(400, responses.pop()[0])
+
+        message = Message({"data": {"enable": True, "mode": "cprofile",
+                                    "duration": 60},
+                           "query": {}, "param": {}})
+        self.bundle.put_profile(message, response=resp, test=True)
+        self.assertEqual(200, responses[0][0])
+        self.assertEqual(True, responses[0][1]["enable"])
+
+        message = Message({"resource": "/network/ethernets/1",
+                           "method": "get", "query": {}, "param": {}})
+        for result in self.bundle.router.dispatch(message):
+            for handler in result["handlers"]:
+                handler["callback"](self.bundle, result["message"], resp)
+        self.assertEqual(200, responses[1][0])
+
+        # in progress
+        message = Message({"data": {"enable": True, "mode": "sample"},
+                           "query": {}, "param": {}})
+        self.bundle.put_profile(message, response=resp, test=True)
+        self.assertEqual(400, responses[2][0])
+
+        message = Message({"data": {"enable": False}, "query": {},
+                           "param": {}})
+        self.bundle.put_profile(message, response=resp, test=True)
+        self.assertEqual(False, responses[3][1]["enable"])
+        self.assertEqual(1, len(responses[3][1]["files"]))
+        self.assertIsNone(self.bundle._profile_hooks)
+        self.assertNotIn("apply", self.bundle.__dict__)
+
+        path = "%s/data/%s" % (dirpath, responses[3][1]["files"][0])
+        self.assertTrue(os.path.exists(path))
+        os.remove(path)
+
+    def test__put_profile__invalid(self):
+        """
+        put_profile (/network/ethernets/profile): unknown mode
+        """
+        def resp(code=200, data=None):
+            self.assertEqual(400, code)
+        message = Message({"data": {"enable": True, "mode": "perf"},
+                           "query": {}, "param": {}})
+        self.bundle.put_profile(message, response=resp, test=True)
+        self.assertIsNone(self.bundle.profiler)
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__publish_link__delta(self, mock_ifaddresses):
+        """
+        publish_link: only the changed fields are published in delta mode
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        published = []
+
+        def mock_event_put(resource, data):
+            published.append(data)
+        self.bundle.publish.event.put = mock_event_put
+        self.bundle.events = DeltaPublisher(
+            lambda resource, data: self.bundle.publish.event.put(
+                resource, data=data), mode="delta")
+
+        self.bundle.publish_link("eth1")
+        self.assertEqual(False, published[0]["delta"])
+        self.assertEqual(False, published[0]["status"])
+        self.assertIn("mac", published[0])
+
+        mock_ifaddresses.side_effect = None
+        mock_ifaddresses.return_value = {
+            "mac": "78:ac:c0:c1:a8:ff", "link": True, "inet": []}
+        self.bundle.publish_link("eth1")
+        self.assertEqual(
+            {"name": "eth1", "status": True, "version": 2, "delta": True},
+            published[1])
+
+    @patch("ethernet.ip.ifaddresses")
+    def test__post_resync(self, mock_ifaddresses):
+        """
+        post_resync (/network/ethernets/resync): whole status published
+        """
+        mock_ifaddresses.side_effect = mock_ip_ifaddresses
+        published = []
+
+        def mock_event_put(resource, data):
+            published.append((resource, data))
+        self.bundle.publish.event.put = mock_event_put
+        self.bundle.events = DeltaPublisher(
+            lambda resource, data: self.bundle.publish.event.put(
+                resource, data=data), mode="delta")
+
+        def resp(code=200, data=None):
+            self.assertEqual(200, code)
+            self.assertEqual(["eth0", "eth1"], data["interfaces"])
+        message = Message({"data": {}, "query": {}, "param": {}})
+        self.bundle.post_resync(message, response=resp, test=True)
+        self.assertEqual(["/network/interfaces/eth0",
+                          "/network/interfaces/eth1"],
+                         [x[0] for x in published])
+        self.assertEqual(False, published[1][1]["delta"])
+        self.assertEqual("eth", published[1][1]["type"])
+
+        def resp_eth1(code=200, data=None):
+            self.assertEqual(200, code)
+            self.assertEqual(["eth1"], data["interfaces"])
+        message = Message({"data": {"name": "eth1"}, "query": {},
+                           "param": {}})
+        self.bundle.post_resync(message, response=resp_eth1, test=True)
+        self.assertEqual(2, published[2][1]["version"])
+
+        def resp_404(code=200, data=None):
+            self.assertEqual(404, code)
+        message = Message({"data": {"name": "eth9"}, "query": {},
+                           "param": {}})
+        self.bundle.post_resync(message, response=resp_404, test=True)
+
+    def test__on_lease(self):
+        """
+        on_lease: the lease written by dhclient is merged and published
+        """
+        published = []
+
+        def mock_event_put(resource, data):
+            published.append((resource, data))
+        self.bundle.publish.event.put = mock_event_put
+
+        path = self.bundle.lease_watcher.lease_file("eth1")
+        try:
+            with open(path, "w") as f:
+                f.write("lease {\n"
+                        "  interface \"eth1\";\n"
+                        "  fixed-address 192.168.41.3;\n"
+                        "  option subnet-mask 255.255.255.0;\n"
+                        "  option routers 192.168.41.254;\n"
+                        "  option domain-name-servers 8.8.8.8;\n"
+                        "}\n")
+            for _ in range(0, 50):
+                if published:
+                    break
+                time.sleep(0.05)
+        finally:
+            os.remove(path)
+
+        data = self.bundle.store.by_id(2)
+        self.assertEqual("192.168.41.3", data["ip"])
+        self.assertEqual("192.168.41.0", data["subnet"])
+        self.assertEqual(["8.8.8.8"], data["dns"])
+        self.assertEqual("/network/interfaces/eth1", published[0][0])
+        self.assertEqual("192.168.41.254", published[0][1]["gateway"])
+
+    def test__channel(self):
+        """
+        channel: events sent to the socket are handled
+        """
+        received = []
+        path = "%s/data/test.sock" % dirpath
+        ch = channel.EventChannel(path, received.append)
+        ch.start()
+        try:
+            channel.send({"event": "link", "name": "eth0"}, path)
+            for _ in range(0, 50):
+                if received:
+                    break
+                time.sleep(0.1)
+        finally:
+            ch.stop()
+        self.assertEqual([{"event": "link", "name": "eth0"}], received)
+
     def test__event_dhcp_info__invalid_json(self):
         """
         event_dhcp_info (/network/interfaces/:iface): invalid json schema
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib.executor import KeyedExecutor
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestKeyedExecutorClass(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = KeyedExecutor(workers=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test__submit__same_key(self):
+        """
+        submit: tasks of the same key run in order, one at a time
+        """
+        history = []
+        running = []
+
+        def job(idx):
+            running.append(idx)
+            self.assertEqual(1, len(running))
+            time.sleep(0.01)
+            history.append(idx)
+            running.remove(idx)
+
+        tasks = [self.executor.submit("eth0", job, x) for x in range(0, 5)]
+        for task in tasks:
+            task.result(timeout=5)
+        self.assertEqual(range(0, 5), history)
+
+    def test__submit__other_keys(self):
+        """
+        submit: tasks of different keys run concurrently
+        """
+        barrier = threading.Event()
+        blocked = self.executor.submit("eth0", barrier.wait, 5)
+        task = self.executor.submit("eth1", lambda: "eth1")
+        self.assertEqual("eth1", task.result(timeout=5))
+        self.assertFalse(blocked.done())
+        barrier.set()
+        self.assertTrue(blocked.wait(5))
+
+    def test__result__error(self):
+        """
+        result: the error of the task is raised
+        """
+        def job():
+            raise ValueError("failed")
+        task = self.executor.submit("eth0", job)
+        with self.assertRaises(ValueError):
+            task.result(timeout=5)
+        self.assertTrue(task.elapsed >= 0)
+
+    def test__after(self):
+        """
+        after: run once all the tasks are finished
+        """
+        barrier = threading.Event()
+        tasks = [self.executor.submit("eth0", barrier.wait, 5),
+                 self.executor.submit("eth1", lambda: "eth1")]
+        task = self.executor.after(
+            tasks, lambda: [x.result() for x in tasks])
+        tasks[1].wait(5)
+        self.assertFalse(task.done())
+        barrier.set()
+        self.assertEqual([True, "eth1"], task.result(timeout=5))
+        self.assertEqual(None, self.executor.after([], lambda: None).result())
+
+    def test__join(self):
+        """
+        join: wait until all the tasks are finished
+        """
+        history = []
+        for idx in range(0, 8):
+            self.executor.submit("eth%d" % (idx % 2), time.sleep, 0.01)
+            self.executor.submit("eth%d" % (idx % 2), history.append, idx)
+        self.executor.join()
+        self.assertEqual(8, len(history))
+        self.assertFalse(self.executor.busy("eth0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import socket
+import unittest
+from mock import patch
+from mock import Mock
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from ip import addr
+    from ip import netlink
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestNetlinkClass(unittest.TestCase):
+
+    def test__rtattr(self):
+        """
+        rtattr: pack and unpack with padding
+        """
+        data = netlink.rtattr(netlink.IFA_LABEL, "eth0\0")
+        data += netlink.rtattr(netlink.IFA_LOCAL,
+                               socket.inet_aton("192.168.31.36"))
+        self.assertEqual(0, len(data) % 4)
+        attrs = netlink.parse_rtattrs(data)
+        self.assertEqual("eth0\0", attrs[netlink.IFA_LABEL])
+        self.assertEqual("192.168.31.36",
+                         socket.inet_ntoa(attrs[netlink.IFA_LOCAL]))
+
+    def test__configure(self):
+        """
+        configure: flush and add in one transaction without bringing the
+        link up, an address already removed is ignored
+        """
+        nl = netlink.Netlink.__new__(netlink.Netlink)
+        nl.transaction = Mock(return_value=[
+            netlink.NetlinkError(99, "Cannot assign requested address"),
+            []])
+        nl.configure(2, [("192.168.31.36", 24)],
+                     ("192.168.31.37", 24, "192.168.31.255"), False, "eth0")
+        self.assertEqual(1, nl.transaction.call_count)
+        requests = nl.transaction.call_args[0][0]
+        self.assertEqual([netlink.RTM_DELADDR, netlink.RTM_NEWADDR],
+                         [x[0] for x in requests])
+
+    def test__addresses(self):
+        """
+        addresses: only the addresses labelled by the interface
+        """
+        def addr(index, ip, label):
+            return netlink.ifaddrmsg(index, ip, 24, label=label)
+        nl = netlink.Netlink.__new__(netlink.Netlink)
+        nl.dump = Mock(return_value=[
+            addr(2, "192.168.31.36", "eth0"),
+            addr(2, "192.168.31.99", "eth0:1"),
+            addr(3, "192.168.41.36", "eth1")])
+        self.assertEqual([("192.168.31.36", 24)],
+                         nl.addresses(2, label="eth0"))
+        self.assertEqual(2, len(nl.addresses(2)))
+
+    def test__backend_configure(self):
+        """
+        NetlinkBackend.configure: the aliases are kept, the link is left as
+        it is
+        """
+        backend = addr.NetlinkBackend.__new__(addr.NetlinkBackend)
+        backend._nl = Mock()
+        backend._nl.addresses.return_value = [("192.168.31.36", 24)]
+        with patch("ip.addr.netlink.ifindex", return_value=2):
+            backend.configure("eth0", ("192.168.31.37", 24,
+                                       "192.168.31.255"))
+        backend._nl.addresses.assert_called_once_with(2, label="eth0")
+        backend._nl.configure.assert_called_once_with(
+            2, [("192.168.31.36", 24)],
+            ("192.168.31.37", 24, "192.168.31.255"), False, label="eth0")
+
+    def test__configure__error(self):
+        """
+        configure: the kernel rejects the new address
+        """
+        nl = netlink.Netlink.__new__(netlink.Netlink)
+        nl.transaction = Mock(return_value=[
+            netlink.NetlinkError(17, "File exists"), []])
+        with self.assertRaises(netlink.NetlinkError):
+            nl.configure(2, [], ("192.168.31.37", 24, "192.168.31.255"))
+
+
+class TestAddrBackend(unittest.TestCase):
+
+    def tearDown(self):
+        addr._backend = None
+
+    def test__set_backend__unknown(self):
+        """
+        set_backend: unknown backend
+        """
+        with self.assertRaises(ValueError):
+            addr.set_backend("ioctl")
+
+    @patch("ip.addr.netlink.Netlink")
+    def test__get_backend__fallback(self, mock_netlink):
+        """
+        get_backend: fall back to "sh" if netlink is not available
+        """
+        mock_netlink.side_effect = socket.error
+        self.assertEqual("sh", addr.get_backend().name)
+
+    @patch("ip.addr.dhclient")
+    @patch("ip.addr.netlink.ifindex")
+    def test__ifconfig__no_iface(self, mock_ifindex, mock_dhclient):
+        """
+        ifconfig: no such interface
+        """
+        mock_ifindex.return_value = None
+        addr._backend = addr.NetlinkBackend.__new__(addr.NetlinkBackend)
+        with self.assertRaises(ValueError):
+            addr.ifconfig("eth9", False, "192.168.31.36")
+        self.assertFalse(mock_dhclient.called)
+
+    @patch("ip.addr.get_supervisor")
+    def test__dhclient(self, mock_supervisor):
+        """
+        dhclient: started by the supervisor with the lease file and the
+        script's variables
+        """
+        supervisor = mock_supervisor.return_value
+        addr.dhclient("eth0", True, "/hooks/dhclient-script",
+                      "/var/lib/dhcp/dhclient.eth0.leases",
+                      {"ETHERNET_LEASE_WATCH": "1"})
+        supervisor.start.assert_called_once_with(
+            "eth0", "/hooks/dhclient-script",
+            "/var/lib/dhcp/dhclient.eth0.leases",
+            {"ETHERNET_LEASE_WATCH": "1"})
+        addr.dhclient("eth0", False)
+        supervisor.stop.assert_called_once_with("eth0")
+
+    @patch("ip.addr.get_supervisor")
+    @patch("ip.addr.netlink.ifindex")
+    def test__ifconfig__dhcp_running(self, mock_ifindex, mock_supervisor):
+        """
+        ifconfig: the address of a running dhclient is kept
+        """
+        mock_ifindex.return_value = 2
+        addr._backend = addr.NetlinkBackend.__new__(addr.NetlinkBackend)
+        addr._backend.configure = Mock()
+        supervisor = mock_supervisor.return_value
+        supervisor.running.return_value = True
+
+        addr.ifconfig("eth0", True, script="/hooks/dhclient-script")
+        supervisor.running.assert_called_once_with(
+            "eth0", "/hooks/dhclient-script", None, None)
+        self.assertFalse(addr._backend.configure.called)
+        self.assertFalse(supervisor.stop.called)
+        self.assertFalse(supervisor.start.called)
+
+    @patch("ip.addr._link_state")
+    @patch("ip.addr.netifaces.ifaddresses")
+    def test__ifaddresses(self, mock_ifaddresses, mock_link_state):
+        """
+        ifaddresses: the link state is read by the kept sysfs files
+        """
+        mock_ifaddresses.return_value = {
+            addr.netifaces.AF_LINK: [{"addr": "78:ac:c0:c1:a8:fe"}],
+            addr.netifaces.AF_INET: [{"addr": "192.168.31.36",
+                                      "netmask": "255.255.255.0",
+                                      "broadcast": "192.168.31.255"}]}
+        mock_link_state.link.return_value = True
+
+        info = addr.ifaddresses("eth0")
+        mock_link_state.link.assert_called_once_with("eth0")
+        self.assertTrue(info["link"])
+        self.assertEqual("78:ac:c0:c1:a8:fe", info["mac"])
+        self.assertEqual("192.168.31.0", info["inet"][0]["subnet"])
+
+    @patch("ip.addr.netlink.Netlink")
+    def test__links(self, mock_netlink):
+        """
+        links: all interfaces by one dump
+        """
+        def link(index, name, mac, operstate, carrier):
+            return netlink.ifinfomsg(index) + \
+                netlink.rtattr(netlink.IFLA_IFNAME, name + "\0") + \
+                netlink.rtattr(netlink.IFLA_ADDRESS, mac) + \
+                netlink.rtattr(netlink.IFLA_OPERSTATE, chr(operstate)) + \
+                netlink.rtattr(netlink.IFLA_CARRIER, chr(carrier))
+
+        mock_netlink.return_value.dump.return_value = [
+            link(2, "eth0", "\x78\xac\xc0\xc1\xa8\xfe", 6, 1),
+            link(3, "eth1", "\x78\xac\xc0\xc1\xa8\xff", 2, 0)]
+        self.assertEqual(
+            {"eth0": {"mac": "78:ac:c0:c1:a8:fe", "link": True},
+             "eth1": {"mac": "78:ac:c0:c1:a8:ff", "link": False}},
+            addr.links())
+        self.assertEqual(1, mock_netlink.return_value.dump.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import unittest
+from mock import patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from ip import cache
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestIfaddrCacheClass(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = cache.IfaddrCache(ttl=60)
+
+    @patch("ip.cache.addr.ifaddresses")
+    def test__get(self, mock_ifaddresses):
+        """
+        get: read once until invalidated
+        """
+        mock_ifaddresses.side_effect = lambda x: {"name": x, "link": True}
+        self.assertEqual({"name": "eth0", "link": True},
+                         self.cache.get("eth0"))
+        self.cache.get("eth0")
+        self.assertEqual(1, mock_ifaddresses.call_count)
+
+        self.cache.invalidate("eth0")
+        self.cache.get("eth0")
+        self.cache.invalidate()
+        self.cache.get("eth0")
+        self.assertEqual(3, mock_ifaddresses.call_count)
+
+    @patch("ip.cache.addr.ifaddresses")
+    def test__get__invalidated_while_reading(self, mock_ifaddresses):
+        """
+        get: a result read before an invalidation is not cached
+        """
+        def ifaddresses(iface):
+            # the link goes up while the previous state is read
+            if mock_ifaddresses.call_count == 1:
+                self.cache.invalidate(iface)
+            elif mock_ifaddresses.call_count == 2:
+                self.cache.invalidate()
+            return {"name": iface, "link": mock_ifaddresses.call_count > 2}
+        mock_ifaddresses.side_effect = ifaddresses
+
+        self.assertFalse(self.cache.get("eth0")["link"])
+        self.assertFalse(self.cache.get("eth0")["link"])
+        self.assertTrue(self.cache.get("eth0")["link"])
+        self.assertTrue(self.cache.get("eth0")["link"])
+        self.assertEqual(3, mock_ifaddresses.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
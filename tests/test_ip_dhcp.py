@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from ip import dhcp
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class FakeProcess(object):
+
+    pids = iter(range(40000, 50000))
+
+    def __init__(self, *args, **kwargs):
+        self.args = args[0]
+        self.pid = next(self.pids)
+        self.exited = threading.Event()
+        self.returncode = None
+
+    def wait(self):
+        self.exited.wait()
+        return self.returncode
+
+    def exit(self, returncode):
+        self.returncode = returncode
+        self.exited.set()
+
+
+class TestSupervisorClass(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.pid_file = patch("ip.dhcp.PID_FILE",
+                              os.path.join(self.path, "dhclient-%s.pid"))
+        self.pid_file.start()
+        self.processes = []
+
+        def popen(*args, **kwargs):
+            process = FakeProcess(*args, **kwargs)
+            self.processes.append(process)
+            return process
+        self.popen = patch("ip.dhcp.subprocess.Popen", side_effect=popen)
+        self.popen.start()
+        self.call = patch("ip.dhcp.subprocess.call")
+        self.mock_call = self.call.start()
+        self.kill = patch("ip.dhcp.os.kill")
+        self.kill.start()
+        self.supervisor = dhcp.Supervisor(restart_delay=0.05)
+
+    def tearDown(self):
+        self.supervisor.restart_delay = None
+        for process in self.processes:
+            process.exit(0)
+        self.kill.stop()
+        self.call.stop()
+        self.popen.stop()
+        self.pid_file.stop()
+        shutil.rmtree(self.path)
+
+    def _wait(self, condition):
+        for _ in range(0, 50):
+            if condition():
+                break
+            time.sleep(0.02)
+
+    def test__start(self):
+        """
+        start: the running client is reused for the same configuration
+        """
+        self.assertTrue(self.supervisor.start("eth0", "/hooks/script"))
+        self.assertFalse(self.supervisor.start("eth0", "/hooks/script"))
+        self.assertEqual(1, len(self.processes))
+        self.assertEqual(
+            ["dhclient", "-d", "-nw", "-pf", dhcp.PID_FILE % "eth0",
+             "-sf", "/hooks/script", "eth0"], self.processes[0].args)
+        self.assertFalse(self.mock_call.called)
+
+        # restarted for another configuration
+        self.assertTrue(self.supervisor.start(
+            "eth0", "/hooks/script", "/leases/dhclient.eth0.leases",
+            {"ETHERNET_LEASE_WATCH": "1"}))
+        self.assertEqual(2, len(self.processes))
+        self.mock_call.assert_called_once_with(
+            ["dhclient", "-r", "-pf", dhcp.PID_FILE % "eth0", "eth0"])
+        self.assertEqual(["-lf", "/leases/dhclient.eth0.leases",
+                          "-e", "ETHERNET_LEASE_WATCH=1", "eth0"],
+                         self.processes[1].args[-5:])
+        self.assertEqual(self.processes[1].pid,
+                         self.supervisor.state("eth0")["pid"])
+
+    def test__stop(self):
+        """
+        stop: the lease is released, nothing is forked without a client
+        """
+        self.assertFalse(self.supervisor.stop("eth1"))
+        self.assertFalse(self.mock_call.called)
+
+        self.supervisor.start("eth1")
+        self.assertTrue(self.supervisor.stop("eth1"))
+        self.assertEqual(1, self.mock_call.call_count)
+        self.assertIsNone(self.supervisor.state("eth1"))
+        self.assertFalse(self.supervisor.running("eth1"))
+
+    def test__reap(self):
+        """
+        reap: an exited client is restarted
+        """
+        self.supervisor.start("eth0")
+        self.processes[0].exit(2)
+        self._wait(lambda: len(self.processes) > 1)
+
+        state = self.supervisor.state("eth0")
+        self.assertEqual("running", state["state"])
+        self.assertEqual(1, state["restarts"])
+        self.assertEqual(self.processes[1].pid, state["pid"])
+
+    def test__reap__stopped(self):
+        """
+        reap: a stopped client is not restarted
+        """
+        self.supervisor.start("eth0")
+        process = self.processes[0]
+        self.supervisor.stop("eth0")
+        process.exit(0)
+        time.sleep(0.1)
+        self.assertEqual(1, len(self.processes))
+        self.assertEqual([], self.supervisor.state())
+
+    @patch("ip.dhcp._cmdline")
+    def test__running__adopted(self, mock_cmdline):
+        """
+        running: the client left by a previous supervisor is adopted
+        """
+        with open(dhcp.PID_FILE % "eth0", "w") as f:
+            f.write("%d\n" % os.getpid())
+        mock_cmdline.return_value = self.supervisor.args("eth0", "/script")
+
+        self.assertTrue(self.supervisor.running("eth0", "/script"))
+        self.assertFalse(self.supervisor.start("eth0", "/script"))
+        self.assertEqual([], self.processes)
+        self.assertEqual(os.getpid(), self.supervisor.state("eth0")["pid"])
+
+
+if __name__ == "__main__":
+    unittest.main()
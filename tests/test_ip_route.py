@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import errno
+import struct
+import unittest
+from mock import patch
+from mock import Mock
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from ip import route
+    from ip import netlink
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+def rtmsg(dest=None, prefixlen=0, index=None, gateway=None, prefsrc=None,
+          metric=None):
+    payload = netlink.rtmsg(dest, prefixlen, index, gateway, prefsrc)
+    if metric is not None:
+        payload += netlink.rtattr(netlink.RTA_PRIORITY,
+                                  struct.pack("=I", metric))
+    return payload
+
+
+class TestRouteTableClass(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch("ip.route.netlink.ifnames")
+        self.addCleanup(patcher.stop)
+        patcher.start().return_value = {2: "eth0", 3: "eth1"}
+        patcher = patch("ip.route.netlink.ifindex")
+        self.addCleanup(patcher.stop)
+        patcher.start().side_effect = \
+            lambda x: {"eth0": 2, "eth1": 3}.get(x)
+
+        self.nl = Mock()
+        self.nl.dump.return_value = [
+            rtmsg(None, 0, 2, gateway="192.168.31.254"),
+            rtmsg(None, 0, 3, gateway="192.168.4.254", metric=100),
+            rtmsg("192.168.31.0", 24, 2, prefsrc="192.168.31.36"),
+            rtmsg("192.168.4.0", 24, 3, prefsrc="192.168.4.127"),
+            rtmsg("10.0.0.0", 8, 3, gateway="192.168.4.1")]
+        self.table = route.RouteTable()
+        self.table._nl = self.nl
+
+    def test__load(self):
+        """
+        load: one dump, indexed by device, destination and default route
+        """
+        # routes of the local table are not listed
+        local = bytearray(rtmsg("192.168.31.36", 32, 2))
+        local[4] = 255
+        self.nl.dump.return_value.append(str(local))
+
+        self.assertEqual(
+            [{"default": "192.168.31.254", "dev": "eth0"},
+             {"default": "192.168.4.254", "dev": "eth1"},
+             {"dest": "192.168.31.0/24", "src": "192.168.31.36",
+              "dev": "eth0"},
+             {"dest": "192.168.4.0/24", "src": "192.168.4.127",
+              "dev": "eth1"},
+             {"dest": "10.0.0.0/8", "src": "192.168.4.1", "dev": "eth1"}],
+            self.table.routes())
+        self.assertEqual(
+            {"default": "192.168.31.254", "dev": "eth0"},
+            self.table.default())
+        self.assertEqual(
+            ["default", "192.168.4.0/24", "10.0.0.0/8"],
+            [x.get("dest", "default") for x in self.table.by_dev("eth1")])
+        self.assertEqual([], self.table.by_dest("172.16.0.0/12"))
+        self.assertEqual(1, self.nl.dump.call_count)
+
+    def test__update(self):
+        """
+        update: applied by route notifications, loaded again after links
+        or addresses are changed
+        """
+        self.table.load()
+        self.table.update(netlink.RTM_DELROUTE, rtmsg(None, 0, 2))
+        self.table.update(netlink.RTM_NEWROUTE,
+                          rtmsg("172.16.0.0", 12, 2, gateway="192.168.31.1"))
+        self.assertEqual("192.168.4.254", self.table.default()["default"])
+        self.assertEqual(["192.168.31.0/24", "172.16.0.0/12"],
+                         [x["dest"] for x in self.table.by_dev("eth0")])
+        self.assertEqual(1, self.nl.dump.call_count)
+
+        self.table.update(netlink.RTM_DELADDR, "")
+        self.table.routes()
+        self.assertEqual(2, self.nl.dump.call_count)
+
+    def test__add(self):
+        """
+        add: one transaction for all rules
+        """
+        self.nl.transaction.return_value = [
+            [], netlink.NetlinkError(errno.EEXIST, "File exists"), []]
+        self.table.load()
+        with self.assertRaises(netlink.NetlinkError):
+            self.table.add([
+                {"dest": "172.16.0.0/12", "dev": "eth0", "src": ""},
+                {"dest": "192.168.4.0/24", "dev": "eth1",
+                 "src": "192.168.4.127"},
+                {"dest": "default", "dev": "", "src": "192.168.31.1"}])
+        self.assertEqual(1, self.nl.transaction.call_count)
+        self.assertEqual([{"dest": "172.16.0.0/12", "dev": "eth0"}],
+                         self.table.by_dest("172.16.0.0/12"))
+        self.assertEqual(
+            [{"default": "192.168.31.1"},
+             {"default": "192.168.4.254", "dev": "eth1"}],
+            self.table.by_dest("default"))
+
+    def test__add__no_device(self):
+        """
+        add: device does not exist
+        """
+        with self.assertRaises(ValueError):
+            self.table.add([{"dest": "default", "dev": "eth9",
+                             "src": "192.168.31.1"}])
+        self.assertEqual(0, self.nl.transaction.call_count)
+
+    def test__delete(self):
+        """
+        delete: one transaction, the rules not found are ignored
+        """
+        self.nl.transaction.return_value = [
+            [], netlink.NetlinkError(errno.ESRCH, "No such process")]
+        self.table.load()
+        self.table.delete(["default", "172.16.0.0/12"])
+        self.assertEqual(1, self.nl.transaction.call_count)
+        self.assertEqual("192.168.4.254", self.table.default()["default"])
+
+    def test__delete__host(self):
+        """
+        delete: a /32 rule is found with or without the prefix length
+        """
+        self.nl.transaction.return_value = [[], []]
+        self.table.load()
+        self.table.add([{"dest": "10.1.1.1/32", "dev": "eth0", "src": ""},
+                        {"dest": "10.1.1.2", "dev": "eth0", "src": ""}])
+        self.assertEqual([{"dest": "10.1.1.1", "dev": "eth0"}],
+                         self.table.by_dest("10.1.1.1/32"))
+        self.assertEqual([{"dest": "10.1.1.2", "dev": "eth0"}],
+                         self.table.by_dest("10.1.1.2"))
+
+        self.table.delete(["10.1.1.1/32", "10.1.1.2"])
+        self.assertEqual([], self.table.by_dest("10.1.1.1"))
+        self.assertEqual([], self.table.by_dest("10.1.1.2/32"))
+        self.assertEqual(["192.168.31.0/24"],
+                         [x["dest"] for x in self.table.by_dev("eth0")
+                          if "dest" in x])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import errno
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from ip import sysfs
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestLinkStateClass(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("eth0", "up", 1)
+        self.write("eth1", "down")
+        self.link_state = sysfs.LinkState(self.root)
+
+    def tearDown(self):
+        self.link_state.close()
+        shutil.rmtree(self.root)
+
+    def write(self, iface, operstate, carrier=None):
+        path = os.path.join(self.root, iface)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        with open(os.path.join(path, "operstate"), "w") as f:
+            f.write("%s\n" % operstate)
+        # the carrier of a down interface cannot be read
+        if carrier is None:
+            carrier = "invalid"
+        with open(os.path.join(path, "carrier"), "w") as f:
+            f.write("%s\n" % carrier)
+
+    def test__link(self):
+        """
+        link: the files are opened once and re-read
+        """
+        self.assertTrue(self.link_state.link("eth0"))
+        self.assertFalse(self.link_state.link("eth1"))
+        self.assertFalse(self.link_state.link("eth9"))
+
+        self.write("eth0", "up", 0)
+        with patch("ip.sysfs.os.open") as mock_open:
+            self.assertFalse(self.link_state.link("eth0"))
+            self.assertFalse(mock_open.called)
+
+    def test__link__recreated(self):
+        """
+        link: the files of a removed interface are opened again
+        """
+        self.assertTrue(self.link_state.link("eth0"))
+        real = sysfs.pread
+        errors = [OSError(errno.ENODEV, os.strerror(errno.ENODEV))]
+
+        def pread(fd, *args):
+            if errors:
+                raise errors.pop()
+            return real(fd, *args)
+        self.write("eth0", "lowerlayerdown", 0)
+        with patch("ip.sysfs.pread", side_effect=pread):
+            self.assertFalse(self.link_state.link("eth0"))
+
+        # removed
+        shutil.rmtree(os.path.join(self.root, "eth0"))
+        errors.append(OSError(errno.ENODEV, os.strerror(errno.ENODEV)))
+        with patch("ip.sysfs.pread", side_effect=pread):
+            self.assertFalse(self.link_state.link("eth0"))
+        self.assertNotIn("eth0", self.link_state._attrs)
+
+    def test__links(self):
+        """
+        links: all interfaces, the removed ones are forgotten
+        """
+        self.assertEqual({"eth0": True, "eth1": False},
+                         self.link_state.links())
+        shutil.rmtree(os.path.join(self.root, "eth1"))
+        self.assertEqual({"eth0": True}, self.link_state.links())
+        self.assertEqual(["eth0"], self.link_state._attrs.keys())
+        self.assertEqual({"eth1": False}, self.link_state.links(["eth1"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import random
+import unittest
+import ipcalc
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from ip import ipv4
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+def ipcalc_network(address, netmask):
+    net = ipcalc.Network("%s/%s" % (address, netmask))
+    return str(net.network()), str(net.broadcast()), net.mask
+
+
+class TestIPv4CrossCheck(unittest.TestCase):
+    """
+    The results must be identical to ipcalc.
+    """
+
+    def setUp(self):
+        self.random = random.Random(20171128)
+
+    def random_address(self):
+        return ".".join(str(self.random.randint(0, 255)) for _ in range(4))
+
+    def test__network__prefix(self):
+        """
+        network: all prefix lengths, as int and digits
+        """
+        for _ in range(0, 20):
+            address = self.random_address()
+            for prefix in range(0, 33):
+                self.assertEqual(ipcalc_network(address, prefix),
+                                 ipv4.network(address, prefix))
+                self.assertEqual(ipcalc_network(address, str(prefix)),
+                                 ipv4.network(address, str(prefix)))
+
+    def test__network__netmask(self):
+        """
+        network: all dotted-quad netmasks
+        """
+        for _ in range(0, 20):
+            address = self.random_address()
+            for prefix in range(0, 33):
+                netmask = ipv4.netmask(prefix)
+                self.assertEqual(
+                    str(ipcalc.Network("0.0.0.0/%d" % prefix).netmask()),
+                    netmask)
+                self.assertEqual(ipcalc_network(address, netmask),
+                                 ipv4.network(address, netmask))
+
+    def test__network__non_contiguous(self):
+        """
+        network: non-contiguous netmasks are handled as ipcalc does
+        """
+        for netmask in ["255.0.255.0", "0.255.255.0", "255.255.0.255",
+                        "128.0.0.1"]:
+            self.assertEqual(ipcalc_network("10.1.2.3", netmask),
+                             ipv4.network("10.1.2.3", netmask))
+
+    def test__network__random(self):
+        """
+        network: random addresses and random netmasks
+        """
+        for _ in range(0, 2000):
+            address = self.random_address()
+            netmask = self.random_address()
+            self.assertEqual(ipcalc_network(address, netmask),
+                             ipv4.network(address, netmask))
+
+    def test__network__invalid(self):
+        """
+        network: invalid input raises ValueError as ipcalc does
+        """
+        for address, netmask in [("10.1.2.3", "33"), ("10.1.2.3", "abc"),
+                                 ("a.b.c.d", "24"), ("10.1.2.3", " 24")]:
+            with self.assertRaises(ValueError):
+                ipcalc_network(address, netmask)
+            with self.assertRaises(ValueError):
+                ipv4.network(address, netmask)
+
+    def test__memoize(self):
+        """
+        memoize: least recently used results are dropped
+        """
+        calls = []
+
+        @ipv4.memoize(maxsize=2)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        self.assertEqual(2, double(1))
+        self.assertEqual(4, double(2))
+        self.assertEqual(2, double(1))
+        self.assertEqual(6, double(3))
+        self.assertEqual(2, double(1))
+        self.assertEqual(4, double(2))
+        self.assertEqual([1, 2, 3, 2], calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib.journal import Journal
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestJournalClass(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = "%s/ethernet.json.journal" % self.tmpdir
+        self.journal = Journal(self.path, max_bytes=1024, max_age=3600)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test__replay(self):
+        """
+        replay: the latest version of each record
+        """
+        self.journal.append([{"id": 2, "ip": "192.168.4.1"}])
+        self.journal.append([{"id": 1, "ip": "192.168.3.1"},
+                             {"id": 2, "ip": "192.168.4.2"}])
+        self.journal.close()
+
+        self.journal = Journal(self.path)
+        self.assertEqual([{"id": 2, "ip": "192.168.4.2"},
+                          {"id": 1, "ip": "192.168.3.1"}],
+                         self.journal.replay())
+        self.assertTrue(self.journal.size > 0)
+
+    def test__replay__torn(self):
+        """
+        replay: a torn record and the following ones are dropped
+        """
+        self.journal.append([{"id": 1, "ip": "192.168.3.1"}])
+        with open(self.path, "a") as f:
+            f.write('{"id": 1, "ip": "192.16')
+            f.write('\n{"id": 2, "ip": "192.168.4.1"}\n')
+        self.assertEqual([{"id": 1, "ip": "192.168.3.1"}],
+                         self.journal.replay())
+
+    def test__due(self):
+        """
+        due: by size or age
+        """
+        self.assertFalse(self.journal.due())
+        self.journal.append([{"id": 1, "data": "x" * 512}])
+        self.assertFalse(self.journal.due())
+        self.journal.append([{"id": 1, "data": "x" * 512}])
+        self.assertTrue(self.journal.due())
+
+        self.journal.truncate()
+        self.assertFalse(self.journal.due())
+        self.assertEqual([], self.journal.replay())
+        self.journal.max_age = 0
+        self.journal.append([{"id": 1}])
+        self.assertTrue(self.journal.due())
+
+
+if __name__ == "__main__":
+    unittest.main()
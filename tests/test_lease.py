@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib import lease
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+LEASE = """lease {
+  interface "%s";
+  fixed-address %s;
+  option subnet-mask 255.255.255.0;
+  option routers 192.168.31.254,192.168.31.253;
+  option domain-name-servers 8.8.8.8,8.8.4.4;
+  option domain-name "moxa.com";
+  renew 2 2037/01/01 00:00:00;
+  rebind 2 2037/01/01 00:00:00;
+  expire %s;
+}
+"""
+
+
+def lease_block(ip, iface="eth0", expire="4 2037/01/01 00:00:00"):
+    return LEASE % (iface, ip, expire)
+
+
+class TestParse(unittest.TestCase):
+
+    def test__parse(self):
+        """
+        parse: the complete blocks only
+        """
+        text = "default-duid \"\\000\\001\";\n" + \
+            lease_block("192.168.31.3") + \
+            lease_block("192.168.31.4", expire="never")
+        partial = lease_block("192.168.31.5")[:-10]
+        leases, length = lease.parse(text + partial)
+
+        self.assertEqual(len(text), length)
+        self.assertEqual(2, len(leases))
+        self.assertEqual(
+            {"interface": "eth0", "ip": "192.168.31.3",
+             "netmask": "255.255.255.0", "gateway": "192.168.31.254",
+             "dns": ["8.8.8.8", "8.8.4.4"], "expire": 2114380800},
+            leases[0])
+        self.assertEqual(None, leases[1]["expire"])
+
+    def test__parse__epoch(self):
+        """
+        parse: "db-time-format local" writes the seconds since the epoch
+        """
+        text = lease_block("192.168.31.3").replace(
+            "expire 4 2037/01/01 00:00:00;",
+            "expire epoch 1700000000; # Tue Nov 14 22:13:20 2023")
+        leases, _ = lease.parse(text)
+        self.assertEqual(1700000000, leases[0]["expire"])
+
+
+class TestLeaseWatcherClass(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.leases = []
+        self.watcher = None
+
+    def tearDown(self):
+        if self.watcher:
+            self.watcher.stop()
+        shutil.rmtree(self.path)
+
+    def callback(self, iface, info):
+        self.leases.append((iface, info["ip"]))
+
+    def write(self, text, mode="a", iface="eth0"):
+        with open(os.path.join(self.path, lease.LEASE_FILE % iface),
+                  mode) as f:
+            f.write(text)
+
+    def test__scan(self):
+        """
+        scan: the leases before the watcher are skipped, the new ones are
+        parsed incrementally
+        """
+        name = lease.LEASE_FILE % "eth0"
+        self.write(lease_block("192.168.31.3"))
+        self.watcher = lease.LeaseWatcher(self.path, self.callback)
+        self.assertEqual(os.path.join(self.path, name),
+                         self.watcher.lease_file("eth0"))
+        self.assertIsNone(self.watcher.scan(name))
+
+        block = lease_block("192.168.31.4")
+        self.write(block[:20])
+        self.assertIsNone(self.watcher.scan(name))
+        self.write(block[20:])
+        self.assertEqual("192.168.31.4", self.watcher.scan(name)["ip"])
+        self.assertIsNone(self.watcher.scan(name))
+
+        # expired
+        self.write(lease_block("192.168.31.5", expire="epoch 1"))
+        self.assertIsNone(self.watcher.scan(name))
+        self.assertEqual([("eth0", "192.168.31.4")], self.leases)
+
+    def test__scan__rewritten(self):
+        """
+        scan: dhclient rewrites the lease file
+        """
+        name = lease.LEASE_FILE % "eth1"
+        self.watcher = lease.LeaseWatcher(self.path, self.callback)
+        self.write(lease_block("192.168.31.3", "eth1"), iface="eth1")
+        self.watcher.scan(name)
+        self.write(lease_block("192.168.41.3", "eth1") +
+                   lease_block("192.168.41.4", "eth1"), "w", iface="eth1")
+        self.watcher.scan(name)
+        self.assertEqual([("eth1", "192.168.31.3"), ("eth1", "192.168.41.4")],
+                         self.leases)
+
+    def _wait(self, count):
+        for _ in range(0, 50):
+            if len(self.leases) >= count:
+                break
+            time.sleep(0.05)
+
+    def test__run(self):
+        """
+        run: the leases are taken as soon as they are written
+        """
+        self.watcher = lease.LeaseWatcher(self.path, self.callback)
+        self.watcher.start()
+        time.sleep(0.1)
+        start = time.time()
+        self.write(lease_block("192.168.31.3"))
+        self._wait(1)
+        self.assertEqual("inotify", self.watcher.mode)
+        self.assertEqual([("eth0", "192.168.31.3")], self.leases)
+        self.assertLess(time.time() - start, 0.5)
+
+    @patch("lib.lease._Inotify")
+    def test__run__poll(self, mock_inotify):
+        """
+        run: poll the files without inotify
+        """
+        mock_inotify.side_effect = OSError(38, "Function not implemented")
+        self.watcher = lease.LeaseWatcher(self.path, self.callback, 0.1)
+        self.watcher.start()
+        self.write(lease_block("192.168.31.3"))
+        self._wait(1)
+        self.assertEqual("poll", self.watcher.mode)
+        self.assertEqual([("eth0", "192.168.31.3")], self.leases)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import types
+import unittest
+
+from sanji.router import Router
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib import metrics
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestRegistryClass(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry(buckets=(0.001, 0.01))
+
+    def test__observe(self):
+        """
+        observe: counted into the bucket of the upper bound
+        """
+        for value in (0.0005, 0.001, 0.005, 1):
+            self.registry.observe(metrics.PRIMITIVE, ("ip.addr.ifconfig",),
+                                  value)
+        hist = self.registry.histogram(metrics.PRIMITIVE,
+                                       ("ip.addr.ifconfig",))
+        self.assertEqual([2, 1, 1], hist.counts)
+        self.assertEqual(4, hist.count)
+        self.assertAlmostEqual(1.0065, hist.sum)
+
+    def test__render(self):
+        """
+        render: Prometheus text format, the buckets are cumulative
+        """
+        labels = ("get", "/network/ethernets")
+        self.registry.observe(metrics.ROUTE, labels, 0.0005)
+        self.registry.observe(metrics.ROUTE, labels, 0.5)
+        self.registry.error(metrics.ROUTE, labels)
+
+        lines = self.registry.render().splitlines()
+        self.assertIn("# TYPE ethernet_route_duration_seconds histogram",
+                      lines)
+        self.assertIn(
+            "ethernet_route_duration_seconds_bucket{method=\"get\","
+            "resource=\"/network/ethernets\",le=\"0.01\"} 1", lines)
+        self.assertIn(
+            "ethernet_route_duration_seconds_bucket{method=\"get\","
+            "resource=\"/network/ethernets\",le=\"+Inf\"} 2", lines)
+        self.assertIn(
+            "ethernet_route_duration_seconds_count{method=\"get\","
+            "resource=\"/network/ethernets\"} 2", lines)
+        self.assertIn(
+            "ethernet_route_errors_total{method=\"get\","
+            "resource=\"/network/ethernets\"} 1", lines)
+        self.assertIn("# TYPE ethernet_primitive_errors_total counter",
+                      lines)
+
+    def test__instrument(self):
+        """
+        instrument: the exceptions are counted as errors, only wrapped once
+        """
+        module = types.ModuleType("fake")
+
+        def ifupdown(iface, up):
+            if iface == "eth9":
+                raise ValueError("No such device.")
+        ifupdown.__module__ = "fake"
+        module.ifupdown = ifupdown
+        module._private = ifupdown
+
+        self.assertEqual(["ifupdown"], metrics.functions(module))
+        metrics.instrument(module, ["ifupdown"], "ip.addr", self.registry)
+        metrics.instrument(module, ["ifupdown"], "ip.addr", self.registry)
+        module.ifupdown("eth0", True)
+        with self.assertRaises(ValueError):
+            module.ifupdown("eth9", True)
+
+        labels = ("ip.addr.ifupdown",)
+        self.assertEqual(
+            2, self.registry.histogram(metrics.PRIMITIVE, labels).count)
+        self.assertEqual(1, self.registry.errors(metrics.PRIMITIVE, labels))
+
+    def test__instrument_routes(self):
+        """
+        instrument_routes: the error responses are counted, the handlers
+        keep their number of arguments
+        """
+        def get(self, message, response):
+            response(code=404, data={"message": "No such device."})
+
+        def event(self, message):
+            pass
+
+        router = Router()
+        router.get("/network/ethernets/:id", get)
+        router.put("/network/ethernets", event)
+        metrics.instrument_routes(router, self.registry)
+        metrics.instrument_routes(router, self.registry)
+
+        codes = []
+        handler = router.routes["/network/ethernets/:id"].handlers[0]
+        handler["callback"](None, None, lambda code, data: codes.append(code))
+        handler = router.routes["/network/ethernets"].handlers[0]
+        handler["callback"](None, None)
+
+        self.assertEqual([404], codes)
+        labels = ("get", "/network/ethernets/:id")
+        self.assertEqual(
+            1, self.registry.histogram(metrics.ROUTE, labels).count)
+        self.assertEqual(1, self.registry.errors(metrics.ROUTE, labels))
+        self.assertEqual(1, self.registry.histogram(
+            metrics.ROUTE, ("put", "/network/ethernets")).count)
+
+
+if __name__ == "__main__":
+    unittest.main()
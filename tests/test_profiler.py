@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import time
+import pstats
+import shutil
+import tempfile
+import threading
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib import profiler
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+def busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class TestProfilerClass(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test__init__invalid_mode(self):
+        with self.assertRaises(ValueError):
+            profiler.Profiler(self.path, mode="perf")
+
+    def test__init__invalid_duration(self):
+        for duration in [0, -1, profiler.MAX_DURATION + 1]:
+            with self.assertRaises(ValueError):
+                profiler.Profiler(self.path, duration=duration)
+
+    def test__stop__files(self):
+        """
+        stop: the files of the profilings started in the same second are
+        not overwritten
+        """
+        files = []
+        for _ in range(0, 2):
+            prof = profiler.Profiler(self.path, mode="sample", duration=60)
+            prof.start()
+            prof.started = 1760000000.0
+            files.extend(prof.stop())
+        self.assertEqual(2, len(set(files)))
+        self.assertEqual(2, len(os.listdir(self.path)))
+
+    def test__cprofile(self):
+        """
+        cprofile: the wrapped calls of all threads are merged
+        """
+        prof = profiler.Profiler(self.path, duration=60)
+
+        def handler(self, message, response):
+            busy(0.01)
+            response(message)
+        wrapped = prof.wrap(handler)
+        # not profiled before started
+        wrapped(None, 1, lambda x: None)
+
+        prof.start()
+        responses = []
+        threads = [threading.Thread(target=wrapped,
+                                    args=(None, x, responses.append))
+                   for x in range(0, 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        files = prof.stop()
+
+        self.assertEqual([0, 1, 2], sorted(responses))
+        self.assertEqual(1, len(files))
+        self.assertTrue(files[0].endswith(".pstats"))
+        stats = pstats.Stats(files[0])
+        calls = [v[1] for k, v in stats.stats.items() if k[2] == "handler"]
+        self.assertEqual([3], calls)
+        self.assertEqual([], prof.stop())
+
+    def test__sample(self):
+        """
+        sample: the stacks of all threads are collapsed
+        """
+        prof = profiler.Profiler(self.path, mode="sample", duration=0.3)
+        stopped = threading.Event()
+        prof._on_stop = stopped.set
+        prof.start()
+        thread = threading.Thread(target=busy, args=(0.2,), name="busy")
+        thread.start()
+        thread.join()
+        stopped.wait(2)
+
+        self.assertFalse(prof.running)
+        self.assertEqual(1, len(prof.files))
+        with open(prof.files[0]) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(
+            [x for x in lines if x.startswith("busy;") and
+             "test_profiler.py:busy " in x])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib.provision import AddressPool
+    from lib.provision import provision
+    from lib.provision import sort_key
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+TEMPLATE = {
+    "wan": False,
+    "ip": "192.168.3.127",
+    "netmask": "255.255.255.0",
+    "subnet": "192.168.3.0",
+    "gateway": "192.168.3.254",
+    "dns": [],
+    "enable": True,
+    "enableDhcp": False
+}
+
+
+class TestAddressPool(unittest.TestCase):
+
+    def test__from_template(self):
+        """
+        from_template: same addressing as the previous factory install
+        """
+        pool = AddressPool.from_template(TEMPLATE)
+        self.assertEqual(
+            {"ip": "192.168.3.127", "netmask": "255.255.255.0",
+             "subnet": "192.168.3.0", "gateway": "192.168.3.254"},
+            pool.address(0))
+        self.assertEqual("192.168.4.127", pool.address(1)["ip"])
+        self.assertEqual("192.168.255.127", pool.address(252)["ip"])
+        self.assertEqual(None, pool.address(253))
+        self.assertEqual(253, len(pool))
+
+    def test__from_template__network(self):
+        """
+        from_template: configured pool
+        """
+        pool = AddressPool.from_template(TEMPLATE, "10.0.0.0/8")
+        self.assertEqual(65536, len(pool))
+        self.assertEqual(
+            {"ip": "10.4.1.127", "netmask": "255.255.255.0",
+             "subnet": "10.4.1.0", "gateway": "10.4.1.254"},
+            pool.address(1025))
+
+    def test__invalid(self):
+        """
+        AddressPool: invalid pool
+        """
+        with self.assertRaises(ValueError):
+            AddressPool("10.0.0.0")
+        with self.assertRaises(ValueError):
+            AddressPool("10.0.0.0/25", 24)
+        with self.assertRaises(ValueError):
+            AddressPool("10.0.0/8")
+
+
+class TestProvision(unittest.TestCase):
+
+    def test__sort_key(self):
+        """
+        sort_key: by port then VLAN
+        """
+        self.assertEqual(
+            ["eth0", "eth0.5", "eth0.100", "eth2", "eth10"],
+            sorted(["eth10", "eth0.100", "eth2", "eth0", "eth0.5"],
+                   key=sort_key))
+
+    def test__provision(self):
+        """
+        provision: ports keep their ids, VLANs follow
+        """
+        links = {"eth0": {"mac": "78:ac:c0:c1:a8:fe", "link": True}}
+        records = provision(TEMPLATE, ["eth1", "eth0.100", "eth0"], links)
+        self.assertEqual([(1, "eth0"), (2, "eth1"), (3, "eth0.100")],
+                         [(x["id"], x["name"]) for x in records])
+        self.assertEqual("192.168.3.127", records[0]["ip"])
+        self.assertEqual("192.168.5.254", records[2]["gateway"])
+        self.assertEqual("78:ac:c0:c1:a8:fe", records[0]["mac"])
+        self.assertEqual(True, records[0]["status"])
+        self.assertEqual("", records[1]["mac"])
+        self.assertEqual(False, records[1]["status"])
+        self.assertEqual([], records[0]["dns"])
+        self.assertIsNot(records[0]["dns"], records[1]["dns"])
+
+    def test__provision__exhausted(self):
+        """
+        provision: interfaces beyond the pool are disabled
+        """
+        ifaces = ["eth%d" % x for x in range(0, 1024)]
+        records = provision(TEMPLATE, ifaces)
+        self.assertEqual(1024, len(records))
+        self.assertEqual(True, records[252]["enable"])
+        self.assertEqual("192.168.255.127", records[252]["ip"])
+        self.assertEqual(False, records[253]["enable"])
+        self.assertEqual("", records[253]["ip"])
+
+        pool = AddressPool.from_template(TEMPLATE, "10.0.0.0/8")
+        records = provision(TEMPLATE, ifaces, pool=pool)
+        self.assertEqual("10.3.255.127", records[1023]["ip"])
+        self.assertEqual(True, records[1023]["enable"])
+
+
+if __name__ == "__main__":
+    unittest.main()
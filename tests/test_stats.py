@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from mock import patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib import stats
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+class TestStatsSamplerClass(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.write("eth0", rx_bytes=0, tx_bytes=0, rx_packets=0,
+                   tx_packets=0)
+        self.sampler = stats.StatsSampler(["eth0", "eth1"], interval=0.05,
+                                          size=3, root=self.root)
+
+    def tearDown(self):
+        self.sampler.stop()
+        shutil.rmtree(self.root)
+
+    def write(self, iface, **counters):
+        path = os.path.join(self.root, iface, "statistics")
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name, value in counters.items():
+            with open(os.path.join(path, name), "w") as f:
+                f.write("%d\n" % value)
+
+    @patch("lib.stats.time.time")
+    def test__stats(self, mock_time):
+        """
+        stats: the rates between the last two samples
+        """
+        self.assertIsNone(self.sampler.stats("eth0"))
+        mock_time.return_value = 100.0
+        self.sampler.sample()
+        self.assertEqual({"rxBps": 0.0, "txBps": 0.0, "rxPps": 0.0,
+                          "txPps": 0.0}, self.sampler.stats("eth0")["rates"])
+
+        # the files are kept open and re-read
+        self.write("eth0", rx_bytes=2000, tx_bytes=500, rx_packets=20,
+                   tx_packets=4)
+        mock_time.return_value = 102.0
+        self.sampler.sample()
+        data = self.sampler.stats("eth0")
+        self.assertEqual(102.0, data["timestamp"])
+        self.assertEqual(2.0, data["interval"])
+        self.assertEqual(2000, data["counters"]["rx_bytes"])
+        self.assertEqual({"rxBps": 8000.0, "txBps": 2000.0, "rxPps": 10.0,
+                          "txPps": 2.0}, data["rates"])
+
+        # no such interface
+        self.assertIsNone(self.sampler.stats("eth1"))
+
+    def test__samples(self):
+        """
+        samples: only the latest ones are kept
+        """
+        for value in range(0, 5):
+            self.write("eth0", rx_bytes=value)
+            self.sampler.sample()
+        self.assertEqual([2, 3, 4], [x[1]["rx_bytes"]
+                                     for x in self.sampler.samples("eth0")])
+
+    def test__sample__counters(self):
+        """
+        sample: only the counters of the rates are opened by default
+        """
+        self.write("eth0", rx_errors=0, multicast=0)
+        self.sampler.sample()
+        self.assertEqual(["rx_bytes", "rx_packets", "tx_bytes", "tx_packets"],
+                         sorted(self.sampler.samples("eth0")[0][1]))
+
+        sampler = stats.StatsSampler(["eth0"], root=self.root,
+                                     counters=["rx_errors"])
+        sampler.sample()
+        self.assertEqual({"rx_errors": 0}, sampler.samples("eth0")[0][1])
+        sampler._files["eth0"].close()
+
+    def test__run(self):
+        """
+        run: sampled periodically, an interface is sampled once it appears
+        """
+        self.sampler.start()
+        self.write("eth1", rx_bytes=1, tx_bytes=0, rx_packets=1,
+                   tx_packets=0)
+        for _ in range(0, 50):
+            if len(self.sampler.samples("eth0")) == 3 and \
+                    self.sampler.samples("eth1"):
+                break
+            self.sampler._stop_event.wait(0.02)
+        data = self.sampler.stats("eth1")
+        self.assertEqual(1, data["counters"]["rx_bytes"])
+        self.assertEqual(3, len(self.sampler.samples("eth0")))
+
+
+if __name__ == "__main__":
+    unittest.main()
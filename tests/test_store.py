@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+
+import os
+import sys
+import unittest
+from mock import Mock
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + '/../')
+    from lib.store import IndexedStore
+except ImportError as e:
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+
+def rename(record, name):
+    record["name"] = name
+
+
+class TestIndexedStoreClass(unittest.TestCase):
+
+    def setUp(self):
+        self.model = Mock()
+        self.model.db = [{"id": 1, "name": "eth0"}, {"id": 2, "name": "eth1"}]
+        self.store = IndexedStore(self.model)
+
+    def test__by_id(self):
+        """
+        by_id: lookup by interface id
+        """
+        self.assertIs(self.model.db[1], self.store.by_id(2))
+        self.assertEqual(None, self.store.by_id(3))
+
+    def test__append(self):
+        """
+        append: the new record is indexed
+        """
+        self.store.append({"id": 3, "name": "eth0.100"})
+        self.assertEqual(3, len(self.model.db))
+        self.assertEqual(3, self.store.by_name("eth0.100")["id"])
+
+    def test__update(self):
+        """
+        update: the name index follows the renamed record
+        """
+        self.store.update(1, rename, "eth9")
+        self.assertEqual(None, self.store.by_name("eth0"))
+        self.assertEqual(1, self.store.by_name("eth9")["id"])
+
+    def test__update__unknown(self):
+        """
+        update: no such record
+        """
+        with self.assertRaises(KeyError):
+            self.store.update(3, rename, "eth9")
+
+    def test__replace(self):
+        """
+        replace: the record is replaced in place, or added
+        """
+        record = self.store.by_id(1)
+        self.store.replace({"id": 1, "name": "eth9", "ip": "192.168.3.1"})
+        self.assertIs(record, self.store.by_id(1))
+        self.assertEqual("192.168.3.1", record["ip"])
+        self.assertEqual(None, self.store.by_name("eth0"))
+        self.assertIs(record, self.store.by_name("eth9"))
+
+        self.store.replace({"id": 3, "name": "eth2"})
+        self.assertEqual(3, len(self.model.db))
+
+    def test__changed(self):
+        """
+        changed: ids of the changed records since the last call
+        """
+        self.assertEqual(set(), self.store.changed())
+        self.store.update(2, rename, "eth9")
+        self.store.append({"id": 3, "name": "eth2"})
+        self.assertEqual(set([2, 3]), self.store.changed())
+        self.assertEqual(set(), self.store.changed())
+
+    def test__version(self):
+        """
+        version: increased by every change
+        """
+        version = self.store.version
+        self.store.update(2, rename, "eth9")
+        self.store.replace({"id": 3, "name": "eth2"})
+        self.assertEqual(version + 2, self.store.version)
+        self.store.changed()
+        self.assertEqual(version + 2, self.store.version)
+
+
+if __name__ == "__main__":
+    unittest.main()